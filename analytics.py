@@ -0,0 +1,319 @@
+"""
+ที่เก็บข้อมูลวิเคราะห์แบบคอลัมน์ในหน่วยความจำ (NumPy)
+
+โหลดยอดสรุประดับ (วันที่, ประเภท, หมวดหมู่) ครั้งเดียวเป็นอาร์เรย์เรียงตามวันที่:
+    dates   int32  วันที่แบบ ordinal
+    types   int8   0 = income, 1 = expense
+    cats    int16  รหัสหมวดหมู่ (ชื่อเก็บใน categories)
+    counts  int64  จำนวนรายการ
+    totals  int64  ยอดเงิน (สตางค์)
+
+ข้อมูลเท่ากับ daily_totals ซึ่งเป็นผลรวมของ entries อยู่แล้ว ทุกรายงาน (KPI, กราฟ, แยกหมวดหมู่,
+ผลรวมช่วงวันที่) จึงตอบได้จากอาร์เรย์ชุดนี้ด้วย searchsorted + bincount โดยไม่ต้องอ่านฐานข้อมูล
+
+ผลรวมช่วงวันที่ใด ๆ (/api/range-summary) ใช้ Fenwick tree ต่อ (ประเภท, หมวดหมู่) และต่อประเภทรวมทุกหมวด
+สร้างจากอาร์เรย์เมื่อถูกเรียกครั้งแรก ช่วงหนึ่งช่วงใช้ prefix sum สองครั้ง และแก้ไขทีละวันได้ใน O(log n)
+
+หลัง commit ที่เขียน entries จะได้ delta จาก rollup.on_commit มาแก้อาร์เรย์ทันที (แถวใหม่แทรกตามลำดับวันที่)
+ทุกครั้งที่อ่านจะเทียบ data_version.generation กับรุ่นของอาร์เรย์ ถ้าไม่ตรง (worker อื่นเขียน
+หรือมีการล้าง/สร้างตารางสรุปใหม่) จะโหลดใหม่ทั้งหมด
+
+ปิดได้ด้วย ANALYTICS_STORE=0 (รายงานจะกลับไปใช้ SQL บน daily_totals)
+"""
+
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+from models import DailyTotal
+import rollup
+
+ANALYTICS_STORE = os.environ.get('ANALYTICS_STORE', '1') != '0'
+# จำนวนวันที่เผื่อไว้หลังวันนี้ใน Fenwick tree ก่อนต้องสร้างใหม่
+RANGE_INDEX_SLACK_DAYS = int(os.environ.get('RANGE_INDEX_SLACK_DAYS', 366))
+
+TYPES = ('income', 'expense')
+TYPE_CODES = {t: i for i, t in enumerate(TYPES)}
+
+
+class FenwickTree:
+    """Fenwick tree ของ (count, total_satang) รายวัน ตั้งแต่วัน base (ordinal) จำนวน size วัน"""
+
+    def __init__(self, base, daily):
+        # daily: int64 shape (2, size) แถวแรกเป็น count แถวที่สองเป็นยอดสตางค์ของแต่ละวัน
+        self.base = base
+        self.size = daily.shape[1]
+        prefix = np.zeros((2, self.size + 1), np.int64)
+        np.cumsum(daily, axis=1, out=prefix[:, 1:])
+        i = np.arange(1, self.size + 1)
+        # tree[i] = ผลรวมของช่วง (i - lowbit(i), i] สร้างจาก prefix sum ได้ในครั้งเดียว
+        self.tree = np.zeros_like(prefix)
+        self.tree[:, 1:] = prefix[:, i] - prefix[:, i - (i & -i)]
+
+    def contains(self, ordinal):
+        return self.base <= ordinal < self.base + self.size
+
+    def add(self, ordinal, count, total):
+        i = ordinal - self.base + 1
+        tree = self.tree
+        while i <= self.size:
+            tree[0, i] += count
+            tree[1, i] += total
+            i += i & -i
+
+    def prefix(self, ordinal):
+        """(count, total) ตั้งแต่ base ถึงวัน ordinal"""
+        i = min(max(ordinal - self.base + 1, 0), self.size)
+        count = total = 0
+        tree = self.tree
+        while i > 0:
+            count += int(tree[0, i])
+            total += int(tree[1, i])
+            i -= i & -i
+        return count, total
+
+    def range(self, start, end):
+        c1, t1 = self.prefix(end)
+        c0, t0 = self.prefix(start - 1)
+        return c1 - c0, t1 - t0
+
+
+class ColumnStore:
+    """อาร์เรย์คอลัมน์ของยอดรายวัน พร้อม query แบบ vectorized (ยอดเงินเป็นสตางค์ทั้งหมด)"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = None
+        self.loads = 0
+        self.patches = 0
+        self.categories = []
+        self.codes = {}
+        self.ranges = None  # {(type_code, cat_code หรือ None): FenwickTree} สร้างเมื่อใช้ครั้งแรก
+        self._set_columns(np.empty(0, np.int32), np.empty(0, np.int8), np.empty(0, np.int16),
+                          np.empty(0, np.int64), np.empty(0, np.int64))
+
+    def _set_columns(self, dates, types, cats, counts, totals):
+        self.dates, self.types, self.cats, self.counts, self.totals = dates, types, cats, counts, totals
+
+    def _code(self, category):
+        code = self.codes.get(category)
+        if code is None:
+            code = self.codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def load(self, rows, generation):
+        """rows: (date, type, category, count, total_satang) เรียงตามวันที่"""
+        with self.lock:
+            self.categories, self.codes = [], {}
+            n = len(rows)
+            self._set_columns(
+                np.fromiter((r[0].toordinal() for r in rows), np.int32, n),
+                np.fromiter((TYPE_CODES[r[1]] for r in rows), np.int8, n),
+                np.fromiter((self._code(r[2]) for r in rows), np.int16, n),
+                np.fromiter((r[3] for r in rows), np.int64, n),
+                np.fromiter((r[4] for r in rows), np.int64, n),
+            )
+            self.ranges = None
+            self.generation = generation
+            self.loads += 1
+
+    def invalidate(self):
+        with self.lock:
+            self.generation = None
+
+    def _find(self, ordinal, type_code, cat_code):
+        lo = np.searchsorted(self.dates, ordinal, 'left')
+        hi = np.searchsorted(self.dates, ordinal, 'right')
+        for i in range(lo, hi):
+            if self.types[i] == type_code and self.cats[i] == cat_code:
+                return i
+        return -1
+
+    def apply(self, deltas, versions):
+        """
+        แก้อาร์เรย์ด้วย delta {(date, type, category): [count, total_satang]} ที่ commit แล้ว
+        ใช้เฉพาะเมื่อ versions[0] ตรงกับรุ่นที่ถืออยู่ ถ้ามีรุ่นขาดหายไปจะทิ้งข้อมูลให้โหลดใหม่
+        """
+        with self.lock:
+            if self.generation is None or versions is None:
+                self.generation = None
+                return
+            before, after = versions
+            if after <= self.generation:
+                return  # โหลดมาหลัง commit นี้แล้ว
+            if before != self.generation:
+                self.generation = None
+                return
+            new_rows = []
+            for (d, t, c), (count, total) in deltas.items():
+                if count == 0 and total == 0:
+                    continue
+                ordinal, type_code, cat_code = d.toordinal(), TYPE_CODES[t], self._code(c)
+                self._update_ranges(ordinal, type_code, cat_code, count, total)
+                i = self._find(ordinal, type_code, cat_code)
+                if i >= 0:
+                    self.counts[i] += count
+                    self.totals[i] += total
+                else:
+                    new_rows.append((ordinal, type_code, cat_code, count, total))
+            if new_rows:
+                new_rows.sort()
+                columns = list(zip(*new_rows))
+                at = np.searchsorted(self.dates, np.array(columns[0], np.int32), 'right')
+                self._set_columns(*(np.insert(old, at, np.array(values, old.dtype))
+                                    for old, values in zip(
+                                        (self.dates, self.types, self.cats, self.counts, self.totals), columns)))
+            self.generation = after
+            self.patches += 1
+
+    def _build_ranges(self):
+        dates = self.dates
+        base = int(dates[0]) if len(dates) else date.today().toordinal()
+        last = max(int(dates[-1]) if len(dates) else base, date.today().toordinal())
+        size = last - base + 1 + RANGE_INDEX_SLACK_DAYS
+        offsets = dates.astype(np.int64) - base
+        n = len(self.categories) + 1
+        keys = self.types.astype(np.int64) * n + self.cats
+        ranges = {}
+        for type_code in range(len(TYPES)):
+            is_type = self.types == type_code
+            ranges[(type_code, None)] = self._tree(base, size, offsets[is_type],
+                                                   self.counts[is_type], self.totals[is_type])
+        for key in np.unique(keys):
+            keep = keys == key
+            ranges[(int(key // n), int(key % n))] = self._tree(base, size, offsets[keep],
+                                                               self.counts[keep], self.totals[keep])
+        self.ranges = ranges
+
+    @staticmethod
+    def _tree(base, size, offsets, counts, totals):
+        daily = np.zeros((2, size), np.int64)
+        np.add.at(daily[0], offsets, counts)
+        np.add.at(daily[1], offsets, totals)
+        return FenwickTree(base, daily)
+
+    def _update_ranges(self, ordinal, type_code, cat_code, count, total):
+        if self.ranges is None:
+            return
+        overall = self.ranges[(type_code, None)]
+        if not overall.contains(ordinal):
+            self.ranges = None  # วันที่อยู่นอกช่วงของ tree สร้างใหม่ตอนใช้ครั้งถัดไป
+            return
+        tree = self.ranges.get((type_code, cat_code))
+        if tree is None:
+            tree = self.ranges[(type_code, cat_code)] = FenwickTree(overall.base, np.zeros((2, overall.size), np.int64))
+        tree.add(ordinal, count, total)
+        overall.add(ordinal, count, total)
+
+    def range_summary(self, start, end, category=None):
+        """{type: (count, total_satang)} ระหว่าง start ถึง end ด้วย prefix sum สองครั้งต่อประเภท"""
+        with self.lock:
+            if self.ranges is None:
+                self._build_ranges()
+            cat_code = None
+            if category is not None:
+                cat_code = self.codes.get(category, -1)
+            result = {}
+            for type_code, t in enumerate(TYPES):
+                tree = self.ranges.get((type_code, cat_code))
+                result[t] = tree.range(start.toordinal(), end.toordinal()) if tree else (0, 0)
+        return result
+
+    def _range(self, start, end):
+        lo = np.searchsorted(self.dates, start.toordinal(), 'left')
+        hi = np.searchsorted(self.dates, end.toordinal(), 'right')
+        return slice(lo, hi)
+
+    def range_totals(self, start, end, category=None):
+        """{type: (count, total_satang)} ระหว่าง start ถึง end (รวมปลายทั้งสองด้าน)"""
+        with self.lock:
+            r = self._range(start, end)
+            types, counts, totals = self.types[r], self.counts[r], self.totals[r]
+            if category is not None:
+                code = self.codes.get(category)
+                keep = self.cats[r] == (code if code is not None else -1)
+                types, counts, totals = types[keep], counts[keep], totals[keep]
+            count_by_type = np.bincount(types, weights=counts, minlength=len(TYPES))
+            total_by_type = np.bincount(types, weights=totals, minlength=len(TYPES))
+        return {t: (int(count_by_type[i]), int(total_by_type[i])) for i, t in enumerate(TYPES)}
+
+    def series(self, bucket_starts, start, end):
+        """
+        ยอดต่อช่วง {type: [total_satang, ...]} โดย bucket_starts คือวันแรกของแต่ละช่วง (เรียงจากเก่าไปใหม่)
+        นับเฉพาะวันที่ start ถึง end ช่วงแรกที่เริ่มก่อน start จึงถูกตัดให้เริ่มที่ start
+        """
+        starts = np.fromiter((b.toordinal() for b in bucket_starts), np.int64, len(bucket_starts))
+        with self.lock:
+            r = self._range(start, end)
+            bucket = np.searchsorted(starts, self.dates[r], 'right') - 1
+            types, totals = self.types[r], self.totals[r]
+            result = {}
+            for i, t in enumerate(TYPES):
+                keep = types == i
+                sums = np.bincount(bucket[keep], weights=totals[keep], minlength=len(starts))
+                result[t] = [int(v) for v in sums]
+        return result
+
+    def category_totals(self, start, end, type=None):
+        """[(category, type, count, total_satang), ...] ของหมวดหมู่ที่มีรายการในช่วง"""
+        with self.lock:
+            r = self._range(start, end)
+            types, cats = self.types[r], self.cats[r]
+            n = len(self.categories)
+            # รวม type กับ category เป็นคีย์เดียวแล้ว bincount ครั้งเดียว
+            key = types.astype(np.int64) * n + cats
+            count_sums = np.bincount(key, weights=self.counts[r], minlength=len(TYPES) * n)
+            total_sums = np.bincount(key, weights=self.totals[r], minlength=len(TYPES) * n)
+            categories = list(self.categories)
+        result = []
+        for k in np.flatnonzero(count_sums):
+            t = TYPES[k // n]
+            if type is None or t == type:
+                result.append((categories[k % n], t, int(count_sums[k]), int(total_sums[k])))
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': ANALYTICS_STORE,
+                'generation': self.generation,
+                'rows': int(len(self.dates)),
+                'categories': len(self.categories),
+                'bytes': int(sum(a.nbytes for a in (self.dates, self.types, self.cats, self.counts, self.totals))),
+                'range_trees': len(self.ranges) if self.ranges is not None else 0,
+                'loads': self.loads,
+                'patches': self.patches,
+            }
+
+
+store = ColumnStore()
+
+
+@rollup.on_commit
+def _patch_store(deltas, versions):
+    if deltas is None:
+        store.invalidate()
+    else:
+        store.apply(deltas, versions)
+
+
+def current(s):
+    """store ที่ตรงกับข้อมูลรุ่นล่าสุดในฐานข้อมูล (โหลดใหม่ถ้าจำเป็น) หรือ None ถ้าปิดใช้งาน"""
+    if not ANALYTICS_STORE:
+        return None
+    generation = rollup.current_generation(s)
+    with store.lock:
+        if store.generation != generation:
+            rows = s.query(DailyTotal.date, DailyTotal.type, DailyTotal.category,
+                           DailyTotal.count, DailyTotal.total_satang).order_by(DailyTotal.date).all()
+            # ถ้ามี commit แทรกระหว่างอ่าน แถวอาจใหม่กว่ารุ่นที่อ่านไว้ ให้โหลดใหม่รอบหน้า
+            consistent = rollup.current_generation(s) == generation
+            store.load(rows, generation if consistent else None)
+    return store
+
+
+def stats():
+    return store.stats()
@@ -1,43 +1,109 @@
 import os
-from flask import Flask, render_template, redirect, url_for, flash, request, send_file, jsonify
+import click
+from flask import Flask, Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
-from sqlalchemy import create_engine
+from sqlalchemy import tuple_, select
 from sqlalchemy.orm import sessionmaker, scoped_session
-from datetime import datetime, date
-import io, csv
-import pandas as pd
+from datetime import datetime, date, timedelta
+import io, csv, base64, codecs
+from urllib.parse import quote
 
-from models import Base, User, Entry
-from forms import LoginForm, EntryForm, INCOME_CHOICES, EXPENSE_CHOICES
+from models import User, Entry, ImportJob, Category
+import rollup
+import reports
+import migrations
+import bulk_loader
+import import_jobs
+import cache
+import user_cache
+import database
+import money
+import search
+import categories
+import metrics
+import profiler
 
 # Database setup  
 # For Railway deployment, use persistent volume or PostgreSQL
+# ตั้งค่า pool และ pragma ของ SQLite ได้จาก environment (ดู database.py)
+# engine ถูกสร้างเมื่อเรียก create_app() ครั้งแรก (import โมดูลนี้ไม่แตะฐานข้อมูล)
+# route ใช้ Session ซึ่งผูกกับ engine ตอนนั้น engine และ Session ใช้ร่วมกันทุก app ใน process
 DB_URL = os.environ.get('DATABASE_URL')
-if DB_URL:
-    # Production: Use PostgreSQL on Railway
-    engine = create_engine(DB_URL, connect_args={})
-else:
-    # Development: Use SQLite
-    DB_PATH = os.path.join(os.path.dirname(__file__), 'business.db')
-    engine = create_engine(f'sqlite:///{DB_PATH}', connect_args={"check_same_thread": False})
+DB_PATH = os.path.join(os.path.dirname(__file__), 'business.db')
 
-Session = scoped_session(sessionmaker(bind=engine))
+engine = None
+Session = scoped_session(sessionmaker())
 
-# Flask app setup
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.config['WTF_CSRF_ENABLED'] = False  # ปิด CSRF ชั่วคราวเพื่อทดสอบ
+# route ทั้งหมดอยู่ใน blueprint นี้ create_app() สร้าง Flask app ใหม่แล้ว register
+# (cli_group=None ให้คำสั่ง flask db-upgrade ฯลฯ อยู่ระดับบนสุดเหมือนเดิม)
+bp = Blueprint('main', __name__, cli_group=None)
+
+def shutdown_session(exc=None):
+    """คืน connection ของ session ประจำ request เข้า pool (rollback ถ้า request ล้มเหลว)"""
+    if exc is not None:
+        Session.rollback()
+    Session.remove()
 
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.login_view = 'login'
-login_manager.init_app(app)
+login_manager.login_view = 'main.login'
+
+@bp.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """สร้างตาราง daily_totals ใหม่จาก entries: flask --app app_main rebuild-rollup"""
+    s = Session()
+    rows = rollup.rebuild_daily_totals(s)
+    s.close()
+    print(f"✅ สร้าง daily_totals ใหม่เรียบร้อย ({rows} แถว)")
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """รัน migration ที่ยังไม่ได้ทำ: flask --app app_main db-upgrade"""
+    done = migrations.upgrade(engine)
+    print(f"✅ ทำ migration เพิ่ม {len(done)} รายการ")
+
+@bp.cli.command('db-status')
+def db_status_command():
+    """แสดงสถานะ migration ทั้งหมด"""
+    for version, name, applied_at in migrations.status(engine):
+        mark = f"✅ {applied_at:%Y-%m-%d %H:%M}" if applied_at else "⏳ ยังไม่ได้ทำ"
+        print(f"{version:>4}  {mark}  {name}")
+
+@bp.cli.command('db-check')
+def db_check_command():
+    """ตรวจว่าดัชนีที่ประกาศใน models.py มีอยู่ในฐานข้อมูลจริงครบหรือไม่"""
+    missing = migrations.missing_indexes(engine)
+    if not missing:
+        print("✅ ดัชนีครบตามที่ประกาศไว้")
+        return
+    for table, name in missing:
+        print(f"❌ ไม่พบดัชนี {name} บนตาราง {table}")
+    raise SystemExit(1)
+
+@bp.cli.command('analytics-check')
+@click.option('--days', default=400, help='จำนวนวันย้อนหลังที่ตรวจ')
+def analytics_check_command(days):
+    """ตรวจว่าที่เก็บคอลัมน์ให้ยอดต่อช่วงเท่ากับ SQL (รวมช่วงที่เริ่มกลางสัปดาห์/เดือน/ปี)"""
+    today = date.today()
+    s = Session()
+    mismatches = []
+    # วันเริ่มที่ไม่ตรงกับต้นสัปดาห์/เดือน/ปี
+    for start in (today - timedelta(days=days), date(today.year - 1, 2, 15), date(today.year - 1, 7, 3)):
+        mismatches += reports.check_store(s, start, today)
+    s.close()
+    if not mismatches:
+        print("✅ ที่เก็บคอลัมน์ตรงกับ SQL")
+        return
+    for granularity, bucket, t, got, expected in mismatches:
+        print(f"❌ {granularity} {bucket} {t}: store {got} / SQL {expected} สตางค์")
+    raise SystemExit(1)
 
 # User wrapper class for Flask-Login
 class FlaskUser:
     def __init__(self, user):
-        self._u = user
+        # เก็บ snapshot แทน ORM object เพื่อไม่ให้ต้อง lazy load หลัง session ถูกปิด
+        self._u = user_cache.UserSnapshot.from_user(user)
     def get_id(self):
         return str(self._u.id)
     @property
@@ -62,16 +128,21 @@ class FlaskUser:
 @login_manager.user_loader
 def load_user(user_id):
     try:
+        # รุ่นของตารางผู้ใช้ในฐานข้อมูล: ปิดบัญชี/ลดสิทธิ์จาก worker อื่นมีผลทันที
         s = Session()
+        generation = user_cache.current_generation(s)
+        snapshot = user_cache.get(int(user_id), generation)
+        if snapshot:
+            return FlaskUser(snapshot)
         user = s.query(User).get(int(user_id))
         if user:
-            return FlaskUser(user)
+            return FlaskUser(user_cache.remember(user, generation))
         return None
     except Exception as e:
         print(f"Error loading user: {e}")
         return None
 
-@app.route('/test')
+@bp.route('/test')
 def test():
     try:
         s = Session()
@@ -102,7 +173,7 @@ def test():
         <p><a href="/simple-login">เข้าสู่ระบบ</a></p>
         '''
 
-@app.route('/simple-login', methods=['GET', 'POST'])
+@bp.route('/simple-login', methods=['GET', 'POST'])
 def simple_login():
     if request.method == 'POST':
         username = request.form.get('username', 'admin')
@@ -112,9 +183,9 @@ def simple_login():
         s = Session()
         user = s.query(User).filter_by(username=username).first()
         if user and check_password_hash(user.password_hash, password):
-            login_user(FlaskUser(user))
+            login_user(FlaskUser(user_cache.remember(user, user_cache.current_generation(s))))
             print("SIMPLE LOGIN: Success")
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             print("SIMPLE LOGIN: Failed")
             return '''<h1>Login Failed</h1><p><a href="/simple-login">Try again</a></p>'''
@@ -137,7 +208,7 @@ def simple_login():
     <p><a href="/test">กลับหน้าทดสอบ</a></p>
     '''
 
-@app.route('/login', methods=['GET','POST'])
+@bp.route('/login', methods=['GET','POST'])
 def login():
     try:
         if request.method == 'POST':
@@ -155,23 +226,24 @@ def login():
                     print(f"DEBUG: Stored hash: {user.password_hash}")
                     print(f"DEBUG: Password check: {check_password_hash(user.password_hash, password)}")
                 if user and check_password_hash(user.password_hash, password):
-                    login_user(FlaskUser(user))
+                    login_user(FlaskUser(user_cache.remember(user, user_cache.current_generation(s))))
                     flash('เข้าสู่ระบบสำเร็จ')
                     print("DEBUG: Login successful, redirecting to dashboard")
-                    return redirect(url_for('dashboard'))
+                    return redirect(url_for('main.dashboard'))
                 flash('ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง')
                 print("DEBUG: Login failed")
-                return redirect(url_for('login'))
+                return redirect(url_for('main.login'))
         
         # สำหรับ GET request หรือใช้ WTForm
+        from forms import LoginForm
         form = LoginForm()
         if form.validate_on_submit():
             s = Session()
             user = s.query(User).filter_by(username=form.username.data).first()
             if user and check_password_hash(user.password_hash, form.password.data):
-                login_user(FlaskUser(user))
+                login_user(FlaskUser(user_cache.remember(user, user_cache.current_generation(s))))
                 flash('เข้าสู่ระบบสำเร็จ')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
             flash('ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง')
         
         return render_template('login.html', form=form)
@@ -183,183 +255,286 @@ def login():
         <p><a href="/test">ทดสอบเซิร์ฟเวอร์</a></p>
         '''
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login'))
+
+# อายุ cache ฝั่งเบราว์เซอร์ (วินาที) ค่าเริ่มต้น 0 = ถามเซิร์ฟเวอร์ทุกครั้งด้วย If-None-Match แล้วได้ 304 ถ้าข้อมูลไม่เปลี่ยน
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 0))
+
+def with_validators(response, etag):
+    """ใส่ ETag และ Cache-Control ให้ response ของข้อมูลที่ต้อง login (private)"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={HTTP_CACHE_MAX_AGE}'
+    return response
+
+def not_modified(etag):
+    """response 304 ถ้าเบราว์เซอร์มีข้อมูลรุ่นนี้อยู่แล้ว ไม่เช่นนั้น None"""
+    if etag in request.if_none_match:
+        return with_validators(Response(status=304), etag)
+    return None
+
+def cached_dashboard_payload(s):
+    today = date.today()
+    return cache.get_or_compute(s, 'dashboard', {'today': today.isoformat()},
+                                lambda: reports.dashboard_payload(s, today))
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     try:
         s = Session()
-        # Quick sums: today, this month, this year
-        today = date.today()
-        month_start = date(today.year, today.month, 1)
-        year_start = date(today.year, 1, 1)
-
-        def sums_between(start, end):
-            incomes = s.query(Entry).filter(Entry.date >= start, Entry.date <= end, Entry.type=='income').all()
-            expenses = s.query(Entry).filter(Entry.date >= start, Entry.date <= end, Entry.type=='expense').all()
-            inc_sum = sum(e.amount for e in incomes)
-            exp_sum = sum(e.amount for e in expenses)
-            return inc_sum, exp_sum, inc_sum - exp_sum
-
-        t_inc, t_exp, t_net = sums_between(today, today)
-        m_inc, m_exp, m_net = sums_between(month_start, today)
-        y_inc, y_exp, y_net = sums_between(year_start, today)
-
-        # Chart data: last 7 days aggregated
-        dates = []
-        for i in range(6, -1, -1):
-            try:
-                d = today.replace(day=today.day - i)
-                dates.append(d)
-            except ValueError:
-                # Handle month boundary
-                import calendar
-                prev_month = today.month - 1 if today.month > 1 else 12
-                prev_year = today.year if today.month > 1 else today.year - 1
-                last_day = calendar.monthrange(prev_year, prev_month)[1]
-                d = date(prev_year, prev_month, last_day - (i - today.day))
-                dates.append(d)
-        
-        dates = sorted(dates)
-        labels = [d.strftime('%Y-%m-%d') for d in dates]
-        chart_incomes = []
-        chart_expenses = []
-        for d in labels:
-            inc, exp, _ = sums_between(date.fromisoformat(d), date.fromisoformat(d))
-            chart_incomes.append(inc)
-            chart_expenses.append(exp)
-
-        return render_template('dashboard.html',
-                               t_inc=t_inc, t_exp=t_exp, t_net=t_net,
-                               m_inc=m_inc, m_exp=m_exp, m_net=m_net,
-                               y_inc=y_inc, y_exp=y_exp, y_net=y_net,
-                               labels=labels, chart_incomes=chart_incomes, chart_expenses=chart_expenses)
+        # KPI, กราฟ 7 วัน, เดือน/ปีที่มีข้อมูล และกราฟเดือนปัจจุบัน ฝังมากับหน้าเว็บในครั้งเดียว
+        payload = cached_dashboard_payload(s)
+        s.close()
+        return render_template('dashboard.html', payload=payload, **payload['kpis'])
     except Exception as e:
         return f'<h1>Dashboard Error</h1><p>{str(e)}</p><p><a href="/test">ทดสอบเซิร์ฟเวอร์</a></p>'
 
-@app.route('/api/chart-data')
+@bp.route('/api/dashboard')
+@login_required
+def dashboard_api():
+    try:
+        s = Session()
+        payload = cached_dashboard_payload(s)
+        s.close()
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/aggregate')
+@login_required
+def aggregate():
+    """ยอดรายรับ/รายจ่ายตามช่วงเวลา: ?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month|year"""
+    try:
+        today = date.today()
+        start = date.fromisoformat(request.args.get('from', date(today.year, today.month, 1).isoformat()))
+        end = date.fromisoformat(request.args.get('to', today.isoformat()))
+        granularity = request.args.get('granularity', 'day')
+    except ValueError:
+        return jsonify({'error': 'รูปแบบวันที่ต้องเป็น YYYY-MM-DD'}), 400
+
+    try:
+        s = Session()
+        result = cache.get_or_compute(
+            s, 'aggregate', {'from': start.isoformat(), 'to': end.isoformat(), 'granularity': granularity},
+            lambda: reports.aggregate_series(s, start, end, granularity))
+        s.close()
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/category-breakdown')
+@login_required
+def category_breakdown():
+    """ยอดแยกตามหมวดหมู่: ?from=YYYY-MM-DD&to=YYYY-MM-DD&type=income|expense"""
+    try:
+        today = date.today()
+        start = date.fromisoformat(request.args.get('from', date(today.year, today.month, 1).isoformat()))
+        end = date.fromisoformat(request.args.get('to', today.isoformat()))
+        entry_type = request.args.get('type') or None
+    except ValueError:
+        return jsonify({'error': 'รูปแบบวันที่ต้องเป็น YYYY-MM-DD'}), 400
+
+    try:
+        s = Session()
+        params = {'from': start.isoformat(), 'to': end.isoformat(), 'type': entry_type}
+        categories = cache.get_or_compute(s, 'category-breakdown', params,
+                                          lambda: reports.category_breakdown(s, start, end, entry_type))
+        s.close()
+        return jsonify(dict(params, categories=categories))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/range-summary')
+@login_required
+def range_summary():
+    """ยอดรวมช่วงวันที่ใด ๆ: ?from=YYYY-MM-DD&to=YYYY-MM-DD&type=income|expense&category=..."""
+    try:
+        today = date.today()
+        start = date.fromisoformat(request.args.get('from', date(today.year, today.month, 1).isoformat()))
+        end = date.fromisoformat(request.args.get('to', today.isoformat()))
+    except ValueError:
+        return jsonify({'error': 'รูปแบบวันที่ต้องเป็น YYYY-MM-DD'}), 400
+
+    try:
+        s = Session()
+        # ไม่ผ่าน cache: ช่วงวันที่มีได้ไม่จำกัดและการคำนวณใช้แค่ prefix sum สองครั้ง
+        result = reports.range_summary(s, start, end, request.args.get('type') or None,
+                                       request.args.get('category') or None)
+        s.close()
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/chart-data')
 @login_required
 def chart_data():
     try:
         selected_month = request.args.get('month', date.today().month, type=int)
         selected_year = request.args.get('year', date.today().year, type=int)
-        
+        reports.check_month(selected_year, selected_month)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # ดึงยอดรายวันทั้งเดือนด้วย query เดียว (หรือตอบ 304 ถ้าข้อมูลไม่เปลี่ยน)
         s = Session()
-        
-        # คำนวณจำนวนวันในเดือนที่เลือก
-        import calendar
-        days_in_month = calendar.monthrange(selected_year, selected_month)[1]
-        
-        # สร้างรายการวันทั้งเดือน
-        dates = []
-        labels = []
-        chart_incomes = []
-        chart_expenses = []
-        
-        for day in range(1, days_in_month + 1):
-            target_date = date(selected_year, selected_month, day)
-            dates.append(target_date)
-            labels.append(f"{day}/{selected_month}")
-            
-            # ดึงข้อมูลรายวัน
-            daily_incomes = s.query(Entry).filter(
-                Entry.date == target_date,
-                Entry.type == 'income'
-            ).all()
-            
-            daily_expenses = s.query(Entry).filter(
-                Entry.date == target_date, 
-                Entry.type == 'expense'
-            ).all()
-            
-            inc_sum = sum(e.amount for e in daily_incomes)
-            exp_sum = sum(e.amount for e in daily_expenses)
-            
-            chart_incomes.append(inc_sum)
-            chart_expenses.append(exp_sum)
-        
+        params = {'year': selected_year, 'month': selected_month}
+        generation = rollup.current_generation(s)
+        etag = cache.etag('chart-data', params, generation)
+        cached_response = not_modified(etag)
+        if cached_response:
+            s.close()
+            return cached_response
+        result = cache.get_or_compute(s, 'chart-data', params,
+                                      lambda: reports.month_chart(s, selected_year, selected_month),
+                                      generation=generation)
         s.close()
-        
-        return jsonify({
-            'labels': labels,
-            'incomes': chart_incomes,
-            'expenses': chart_expenses,
-            'month': selected_month,
-            'year': selected_year
-        })
+        return with_validators(jsonify(result), etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/available-months')
+@bp.route('/api/available-months')
 @login_required 
 def available_months():
     try:
         s = Session()
-        # ดึงข้อมูลเดือน/ปีที่มีข้อมูลในฐานข้อมูล
-        entries = s.query(Entry).all()
-        months_years = set()
-        
-        for entry in entries:
-            months_years.add((entry.date.year, entry.date.month))
-        
+        generation = rollup.current_generation(s)
+        etag = cache.etag('available-months', {}, generation)
+        cached_response = not_modified(etag)
+        if cached_response:
+            s.close()
+            return cached_response
+        # ดึงข้อมูลเดือน/ปีที่มีข้อมูลจากตารางสรุป daily_totals
+        available = cache.get_or_compute(s, 'available-months', {}, lambda: reports.available_periods(s),
+                                         generation=generation)
         s.close()
         
-        # จัดเรียงและแปลงเป็น list
-        available = sorted(list(months_years), reverse=True)
-        
-        return jsonify({
-            'available': [{'year': year, 'month': month} for year, month in available]
-        })
+        return with_validators(jsonify({'available': available}), etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/entries')
+def encode_cursor(e):
+    """token สำหรับแบ่งหน้าแบบ keyset จาก (created_at, id) ของรายการ"""
+    raw = f"{e.created_at.isoformat()}|{e.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    created_at, entry_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(entry_id)
+
+def search_filters():
+    """คำค้นและตัวกรองจาก query string: (q, from, to, type, page) วันที่ผิดรูปแบบจะเกิด ValueError"""
+    start = request.args.get('from') or None
+    end = request.args.get('to') or None
+    return (
+        request.args.get('q', '').strip(),
+        date.fromisoformat(start) if start else None,
+        date.fromisoformat(end) if end else None,
+        request.args.get('type') or None,
+        max(request.args.get('page', 1, type=int), 1),
+    )
+
+@bp.route('/api/search')
+@login_required
+def search_api():
+    """ค้นหารายการ: ?q=คำค้น&from=YYYY-MM-DD&to=YYYY-MM-DD&type=income|expense&page=1"""
+    try:
+        q, start, end, entry_type, page = search_filters()
+        s = Session()
+        result = search.search(s, q, start, end, entry_type, page)
+        items = [{'id': e.id, 'date': e.date.isoformat(), 'type': e.type, 'category': e.category,
+                  'description': e.description, 'amount': e.amount} for e in result['items']]
+        s.close()
+        return jsonify(dict(result, items=items))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/entries')
 @login_required
 def entries():
     try:
-        page = int(request.args.get('page', 1))
+        page = max(int(request.args.get('page', 1)), 1)  # ใช้แสดงผลเท่านั้น
         per_page = 20  # เพิ่มจำนวนรายการต่อหน้า
+        after = request.args.get('after')
+        before = request.args.get('before')
         s = Session()
-        total = s.query(Entry).count()
         
-        # Debug logging
-        print(f"📊 ENTRIES ROUTE DEBUG:")
-        print(f"   Total entries in DB: {total}")
-        print(f"   Page: {page}, Per page: {per_page}")
+        # มีคำค้น: แสดงผลค้นหาเรียงตามความเกี่ยวข้อง แบ่งหน้าด้วยเลขหน้า
+        if request.args.get('q', '').strip():
+            try:
+                q, start, end, entry_type, page = search_filters()
+                result = search.search(s, q, start, end, entry_type, page, per_page)
+            except ValueError as e:
+                flash(str(e), 'warning')
+                return redirect(url_for('main.entries'))
+            s.close()
+            return render_template('entries.html', items=result['items'], page=result['page'], per_page=per_page,
+                                   search=dict(request.args, page=result['page']), has_next=result['has_next'])
+        total = rollup.total_entries(s)
         
-        # เปลี่ยนเป็นเรียงตาม created_at ล่าสุดก่อน แล้วค่อย date
-        items = s.query(Entry).order_by(Entry.created_at.desc(), Entry.date.desc()).offset((page-1)*per_page).limit(per_page).all()
+        # เรียงตาม created_at ล่าสุดก่อน แบ่งหน้าด้วย cursor (created_at, id) แทน OFFSET
+        key = tuple_(Entry.created_at, Entry.id)
+        q = s.query(Entry)
+        try:
+            if before:
+                q = q.filter(key > decode_cursor(before)).order_by(Entry.created_at.asc(), Entry.id.asc())
+            else:
+                if after:
+                    q = q.filter(key < decode_cursor(after))
+                q = q.order_by(Entry.created_at.desc(), Entry.id.desc())
+        except ValueError:
+            return redirect(url_for('main.entries'))
+        items = q.limit(per_page + 1).all()
+        has_more = len(items) > per_page
+        items = items[:per_page]
+        if before:
+            items.reverse()
         
-        print(f"   Items retrieved: {len(items)}")
-        if items:
-            print(f"   Latest item: ID:{items[0].id} | {items[0].date} | {items[0].category}")
+        if before:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = bool(after), has_more
+        if not has_prev:
+            page = 1
+        next_cursor = encode_cursor(items[-1]) if items and has_next else None
+        prev_cursor = encode_cursor(items[0]) if items and has_prev else None
         
         # Flash message แสดงจำนวนรายการทั้งหมด
         if request.args.get('imported'):
             flash(f'✅ แสดงรายการทั้งหมด {total} รายการ (รายการใหม่อยู่ด้านบนสุด)', 'info')
         
         s.close()
-        return render_template('entries.html', items=items, page=page, per_page=per_page, total=total)
+        return render_template('entries.html', items=items, page=page, per_page=per_page, total=total,
+                               next_cursor=next_cursor, prev_cursor=prev_cursor)
     except Exception as e:
         print(f"❌ ENTRIES ROUTE ERROR: {str(e)}")
         return f'<h1>Entries Error</h1><p>{str(e)}</p>'
 
-@app.route('/entry/new', methods=['GET','POST'])
+@bp.route('/entry/new', methods=['GET','POST'])
 @login_required
 def entry_new():
+    from forms import EntryForm, INCOME_CHOICES, EXPENSE_CHOICES
     try:
         form = EntryForm()
         # Populate category choices depending on type
@@ -372,61 +547,68 @@ def entry_new():
                 category = form.category.data
             if form.validate_on_submit():
                 s = Session()
-                e = Entry(date=form.date.data, type=form.type.data, category=category,
-                          description=form.description.data, amount=float(form.amount.data), created_by=int(current_user.get_id()))
+                e = Entry(date=form.date.data, type=form.type.data,
+                          category_id=categories.resolve(s, form.type.data, category),
+                          description=form.description.data, amount_satang=money.to_satang(form.amount.data), created_by=int(current_user.get_id()))
                 s.add(e)
+                rollup.record_insert(s, e)
                 s.commit()
                 flash('บันทึกเรียบร้อย')
-                return redirect(url_for('entries'))
+                return redirect(url_for('main.entries'))
         # Default choices show income categories
         form.category.choices = INCOME_CHOICES
         return render_template('entry_form.html', form=form)
     except Exception as e:
         return f'<h1>New Entry Error</h1><p>{str(e)}</p>'
 
-@app.route('/entry/<int:id>/edit', methods=['GET','POST'])
+@bp.route('/entry/<int:id>/edit', methods=['GET','POST'])
 @login_required
 def entry_edit(id):
+    from forms import EntryForm, INCOME_CHOICES, EXPENSE_CHOICES
     try:
         s = Session()
         e = s.query(Entry).get(id)
         if not e:
             flash('ไม่พบรายการ')
-            return redirect(url_for('entries'))
+            return redirect(url_for('main.entries'))
         form = EntryForm(obj=e)
         # Populate choices
         form.category.choices = INCOME_CHOICES if e.type=='income' else EXPENSE_CHOICES
         if form.validate_on_submit():
+            old = rollup.snapshot(e)
             e.date = form.date.data
             e.type = form.type.data
-            e.category = form.custom_category.data if form.custom_category.data else form.category.data
+            e.category_id = categories.resolve(
+                s, e.type, form.custom_category.data if form.custom_category.data else form.category.data)
             e.description = form.description.data
-            e.amount = float(form.amount.data)
+            e.amount_satang = money.to_satang(form.amount.data)
+            rollup.record_update(s, old, e)
             s.commit()
             flash('แก้ไขเรียบร้อย')
-            return redirect(url_for('entries'))
+            return redirect(url_for('main.entries'))
         return render_template('entry_form.html', form=form, entry=e)
     except Exception as e:
         return f'<h1>Edit Entry Error</h1><p>{str(e)}</p>'
 
-@app.route('/entry/<int:id>/delete', methods=['POST'])
+@bp.route('/entry/<int:id>/delete', methods=['POST'])
 @login_required
 def entry_delete(id):
     try:
         s = Session()
         e = s.query(Entry).get(id)
         if e:
+            rollup.record_delete(s, e)
             s.delete(e)
             s.commit()
             flash('✅ ลบรายการแล้ว', 'success')
         else:
             flash('❌ ไม่พบรายการที่ต้องการลบ', 'error')
-        return redirect(url_for('entries'))
+        return redirect(url_for('main.entries'))
     except Exception as e:
         flash(f'❌ เกิดข้อผิดพลาดในการลบ: {str(e)}', 'error')
-        return redirect(url_for('entries'))
+        return redirect(url_for('main.entries'))
 
-@app.route('/delete_all_entries', methods=['POST'])
+@bp.route('/delete_all_entries', methods=['POST'])
 @login_required
 def delete_all_entries():
     try:
@@ -439,33 +621,84 @@ def delete_all_entries():
         else:
             # ลบรายการทั้งหมด
             s.query(Entry).delete()
+            rollup.clear(s)
             s.commit()
             flash(f'✅ ลบรายการทั้งหมดแล้ว ({count:,} รายการ)', 'success')
         
-        return redirect(url_for('entries'))
+        return redirect(url_for('main.entries'))
     except Exception as e:
         flash(f'❌ เกิดข้อผิดพลาดในการลบข้อมูลทั้งหมด: {str(e)}', 'error')
-        return redirect(url_for('entries'))
+        return redirect(url_for('main.entries'))
 
-@app.route('/export/csv')
+EXPORT_BATCH = 1000
+
+def export_filters():
+    """ตัวกรองของ /export/csv จาก query string: from, to (YYYY-MM-DD), type, category"""
+    conds = []
+    if request.args.get('from'):
+        conds.append(Entry.date >= date.fromisoformat(request.args['from']))
+    if request.args.get('to'):
+        conds.append(Entry.date <= date.fromisoformat(request.args['to']))
+    if request.args.get('type'):
+        if request.args['type'] not in ('income', 'expense'):
+            raise ValueError('type ต้องเป็น income หรือ expense')
+        conds.append(Entry.type == request.args['type'])
+    if request.args.get('category'):
+        # อ่านชื่อจากตาราง categories ใน query เดียวกัน หมวดหมู่ที่ worker อื่นเพิ่งสร้างจึงกรองได้ทันที
+        conds.append(Entry.category_id.in_(select(Category.id).where(Category.name == request.args['category'])))
+    return conds
+
+@bp.route('/export/csv')
 @login_required
 def export_csv():
     try:
-        s = Session()
-        items = s.query(Entry).order_by(Entry.date.desc()).all()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['date','type','category','description','amount'])
-        for it in items:
-            writer.writerow([it.date.isoformat(), it.type, it.category, it.description, it.amount])
-        output.seek(0)
-        return send_file(io.BytesIO(output.getvalue().encode('utf-8-sig')),
-                         mimetype='text/csv', as_attachment=True, download_name='รายการธุรกิจ.csv')
-    except Exception as e:
-        flash(f'❌ เกิดข้อผิดพลาดในการส่งออก: {str(e)}', 'error')
-        return redirect(url_for('import_csv'))
+        conds = export_filters()
+    except ValueError as e:
+        flash(f'❌ ตัวกรองไม่ถูกต้อง: {str(e)}', 'error')
+        return redirect(url_for('main.import_csv'))
+
+    # ไฟล์เดิมถ้าไม่มีการเขียนข้อมูลตั้งแต่ดาวน์โหลดครั้งก่อน
+    s = Session()
+    params = {k: request.args.get(k, '') for k in ('from', 'to', 'type', 'category')}
+    etag = cache.etag('export-csv', params, rollup.current_generation(s))
+    s.close()
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    def generate():
+        # ใช้ session แยกและ yield_per เพื่ออ่านทีละชุด (server-side cursor บน PostgreSQL)
+        s = Session.session_factory()
+        try:
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(['date','type','category','description','amount'])
+            yield codecs.BOM_UTF8 + output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+
+            q = s.query(Entry.date, Entry.type, Entry.category_id, Entry.description, Entry.amount_satang) \
+                 .filter(*conds).order_by(Entry.date.desc(), Entry.id.desc()).yield_per(EXPORT_BATCH)
+            n = 0
+            for it in q:
+                writer.writerow([it.date.isoformat(), it.type, categories.name_of(it.category_id, s), it.description,
+                                 money.format_baht(it.amount_satang)])
+                n += 1
+                if n % EXPORT_BATCH == 0:
+                    yield output.getvalue().encode('utf-8')
+                    output.seek(0)
+                    output.truncate()
+            if output.tell():
+                yield output.getvalue().encode('utf-8')
+        finally:
+            s.close()
+
+    filename = 'รายการธุรกิจ.csv'
+    return with_validators(Response(stream_with_context(generate()), mimetype='text/csv', headers={
+        'Content-Disposition': f"attachment; filename=export.csv; filename*=UTF-8''{quote(filename)}"
+    }), etag)
 
-@app.route('/download/sample-csv')
+@bp.route('/download/sample-csv')
 def download_sample_csv():
     """ดาวน์โหลดไฟล์ตัวอย่าง CSV"""
     try:
@@ -494,16 +727,16 @@ def download_sample_csv():
                          download_name='ตัวอย่างข้อมูล.csv')
     except Exception as e:
         flash(f'❌ ไม่สามารถสร้างไฟล์ตัวอย่างได้: {str(e)}', 'error')
-        return redirect(url_for('import_csv'))
+        return redirect(url_for('main.import_csv'))
 
-@app.route('/simple-import')
+@bp.route('/simple-import')
 def simple_import():
     """หน้า CSV import แบบง่าย (ไม่ต้อง login)"""
     print("📄 Simple Import page accessed")
     with open('simple_import.html', 'r', encoding='utf-8') as f:
         return f.read()
 
-@app.route('/import/csv', methods=['GET', 'POST'])
+@bp.route('/import/csv', methods=['GET', 'POST'])
 @login_required  
 def import_csv():
     if request.method == 'GET':
@@ -523,7 +756,7 @@ def import_csv():
             print("❌ ERROR: No 'file' key in request.files")
             print(f"❓ Available keys: {list(request.files.keys())}")
             flash('❌ ไม่พบไฟล์ในคำขอ - โปรดลองอีกครั้ง', 'error')
-            return redirect(url_for('import_csv'))
+            return redirect(url_for('main.import_csv'))
         
         uploaded_file = request.files['file']
         print(f"📄 Uploaded file: {uploaded_file.filename}")
@@ -532,114 +765,59 @@ def import_csv():
         if not uploaded_file or uploaded_file.filename == '':
             print("❌ ERROR: No file selected or empty filename")
             flash('❌ กรุณาเลือกไฟล์ CSV', 'error')
-            return redirect(url_for('import_csv'))
+            return redirect(url_for('main.import_csv'))
         
-        # 2. อ่านไฟล์ (รองรับ UTF-8 และ UTF-8-BOM)
-        try:
-            file_content = uploaded_file.read().decode('utf-8-sig')
-        except:
-            file_content = uploaded_file.read().decode('utf-8')
-        
-        # 3. แยกบรรทัด
-        lines = [line.strip() for line in file_content.strip().split('\n') if line.strip()]
-        
-        if len(lines) < 2:
-            flash('❌ ไฟล์ต้องมีอย่างน้อย 2 บรรทัด (header + ข้อมูล)', 'error')
-            return redirect(url_for('import_csv'))
-        
-        # 4. อ่าน header
-        headers = [h.strip().lower() for h in lines[0].split(',')]
-        
-        if 'date' not in headers or 'amount' not in headers:
-            flash('❌ ไฟล์ต้องมีคอลัมน์ "date" และ "amount"', 'error')
-            return redirect(url_for('import_csv'))
+        mode = request.form.get('mode', bulk_loader.DEFAULT_MODE)
+        if mode not in bulk_loader.MODES:
+            flash('❌ โหมดการนำเข้าไม่ถูกต้อง', 'error')
+            return redirect(url_for('main.import_csv'))
         
-        date_idx = headers.index('date')
-        amount_idx = headers.index('amount')
-        category_idx = headers.index('category') if 'category' in headers else None
-        description_idx = headers.index('description') if 'description' in headers else None
+        # 2. อ่านและตรวจไฟล์ด้วย import engine (pandas โหลดเมื่อมีการนำเข้าครั้งแรก)
+        import import_engine
+        try:
+            frame, errors = import_engine.parse_csv(uploaded_file.read())
+        except import_engine.ImportFormatError as e:
+            flash(f'❌ {str(e)}', 'error')
+            return redirect(url_for('main.import_csv'))
         
-        # 5. ประมวลผลข้อมูล
         session = Session()
-        success_count = 0
-        error_count = 0
+        error_count = len(errors)
+        for err in errors:
+            print(f"บรรทัด {err['line']}: {err['message']}")
         
-        for i, line in enumerate(lines[1:], start=2):
-            try:
-                # แยกคอลัมน์
-                values = [v.strip() for v in line.split(',')]
-                
-                if len(values) <= max(date_idx, amount_idx):
-                    error_count += 1
-                    print(f"บรรทัด {i}: จำนวนคอลัมน์ไม่ถูกต้อง")
-                    continue
-                
-                # วันที่
-                date_str = values[date_idx]
-                entry_date = None
-                
-                # ลองหลายรูปแบบ
-                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']:
-                    try:
-                        entry_date = datetime.strptime(date_str, fmt).date()
-                        break
-                    except:
-                        continue
-                
-                if not entry_date:
-                    error_count += 1
-                    print(f"บรรทัด {i}: รูปแบบวันที่ไม่ถูกต้อง: {date_str}")
-                    continue
-                
-                # จำนวนเงิน
-                amount_str = values[amount_idx].replace(',', '')  # ลบคอมม่า
-                amount = float(amount_str)
-                
-                # ประเภท
-                entry_type = 'income' if amount >= 0 else 'expense'
-                amount = abs(amount)
-                
-                # หมวดหมู่และรายละเอียด
-                category = values[category_idx] if category_idx and len(values) > category_idx else 'อื่นๆ'
-                description = values[description_idx] if description_idx and len(values) > description_idx else ''
-                
-                # บันทึกข้อมูล
-                new_entry = Entry(
-                    date=entry_date,
-                    type=entry_type,
-                    category=category,
-                    description=description,
-                    amount=amount,
-                    created_by=int(current_user.get_id())
-                )
-                
-                session.add(new_entry)
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                print(f"บรรทัด {i}: Error - {str(e)}")
-                continue
-        
-        # 6. บันทึกการเปลี่ยนแปลง
+        # 3. บันทึกเป็นชุดด้วย bulk loader (แถวที่เคยนำเข้าแล้วจัดการตาม mode)
+        try:
+            report = bulk_loader.load_entries(session, import_engine.iter_rows(frame), int(current_user.get_id()),
+                                              mode=mode)
+        except bulk_loader.DuplicateImportError as e:
+            session.close()
+            flash(f'❌ {str(e)}', 'error')
+            return redirect(url_for('main.import_csv'))
+        success_count = report.inserted
+        error_count += report.rejected
+        for err in report.errors:
+            print(f"บรรทัด {err['line']}: {err['message']}")
         if success_count > 0:
-            session.commit()
-            flash(f'✅ นำเข้า CSV สำเร็จ {success_count} รายการ' + (f' (ข้าม {error_count} รายการ)' if error_count > 0 else ''), 'success')
+            flash(f'✅ {import_jobs.summary_message(report)}' + (f' (ข้าม {error_count} รายการ)' if error_count > 0 else ''), 'success')
             session.close()
             # Redirect พร้อม parameter เพื่อแสดงข้อความแจ้งเตือน
-            return redirect(url_for('entries', imported=1))
+            return redirect(url_for('main.entries', imported=1))
         else:
+            if report.skipped:
+                flash(f'ℹ️ ไม่มีรายการใหม่ ข้ามรายการที่เคยนำเข้าแล้ว {report.skipped} รายการ', 'info')
+                session.close()
+                return redirect(url_for('main.entries'))
             flash(f'❌ ไม่สามารถนำเข้าข้อมูลได้ (ข้าม {error_count} รายการ)', 'error')
             session.close()
-            return redirect(url_for('import_csv'))
+            return redirect(url_for('main.import_csv'))
         
     except Exception as e:
         print(f"Import CSV Error: {str(e)}")
         flash(f'❌ เกิดข้อผิดพลาด: {str(e)}', 'error')
-        return redirect(url_for('import_csv'))
+        return redirect(url_for('main.import_csv'))
 
 # Routes สำหรับระบบจัดการสมาชิก
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     from forms import RegistrationForm
     from werkzeug.security import generate_password_hash
@@ -676,23 +854,26 @@ def register():
             )
             
             s.add(new_user)
+            user_cache.bump(s)
             s.commit()
+            # id อาจเคยเป็นของผู้ใช้ที่ถูกลบไปแล้ว
+            user_cache.invalidate(new_user.id)
             
             flash('สมัครสมาชิกสำเร็จ! กรุณาเข้าสู่ระบบ', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         except Exception as e:
             flash(f'เกิดข้อผิดพลาด: {str(e)}', 'error')
     
     return render_template('register.html', form=form)
 
-@app.route('/members')
+@bp.route('/members')
 @login_required
 def members():
     # ตรวจสอบสิทธิ์ admin
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
         flash('คุณไม่มีสิทธิ์เข้าถึงหน้านี้', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     try:
         s = Session()
@@ -713,7 +894,7 @@ def members():
     except Exception as e:
         return f'<h1>Members Error</h1><p>{str(e)}</p>'
 
-@app.route('/admin/toggle_user_status', methods=['POST'])
+@bp.route('/admin/toggle_user_status', methods=['POST'])
 @login_required
 def toggle_user_status():
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
@@ -728,14 +909,16 @@ def toggle_user_status():
         user = s.query(User).get(user_id)
         if user:
             user.is_active = is_active
+            user_cache.bump(s)
             s.commit()
+            user_cache.invalidate(user_id)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'message': 'ไม่พบผู้ใช้'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/admin/toggle_user_role', methods=['POST'])
+@bp.route('/admin/toggle_user_role', methods=['POST'])
 @login_required
 def toggle_user_role():
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
@@ -750,14 +933,16 @@ def toggle_user_role():
         user = s.query(User).get(user_id)
         if user:
             user.role = role
+            user_cache.bump(s)
             s.commit()
+            user_cache.invalidate(user_id)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'message': 'ไม่พบผู้ใช้'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/admin/delete_user', methods=['POST'])
+@bp.route('/admin/delete_user', methods=['POST'])
 @login_required
 def delete_user():
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
@@ -771,24 +956,75 @@ def delete_user():
         user = s.query(User).get(user_id)
         if user:
             s.delete(user)
+            user_cache.bump(s)
             s.commit()
+            user_cache.invalidate(user_id)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'message': 'ไม่พบผู้ใช้'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@bp.route('/admin/pool-stats')
+@login_required
+def pool_stats():
+    """สถานะ connection pool สำหรับ monitoring (admin เท่านั้น)"""
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        return jsonify({'error': 'ไม่มีสิทธิ์'}), 403
+    return jsonify(database.pool_stats(engine))
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """ตัวชี้วัดรูปแบบ Prometheus (Bearer token ตาม METRICS_TOKEN หรือ login เป็น admin)"""
+    if not metrics.authorized(request, current_user):
+        return Response('ไม่มีสิทธิ์\n', status=403, mimetype='text/plain')
+    return Response(metrics.render(engine), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/admin/profiles')
+@login_required
+def profiles():
+    """โปรไฟล์ request ที่บันทึกไว้ (เปิดด้วย ?_profile=1 หรือ header X-Profile: 1)"""
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        flash('คุณไม่มีสิทธิ์เข้าถึงหน้านี้', 'error')
+        return redirect(url_for('main.dashboard'))
+    return render_template('profiles.html', profiles=profiler.recent(), enabled=profiler.PROFILER_ENABLED)
+
+@bp.route('/admin/profiles/<profile_id>')
+@login_required
+def profile_detail(profile_id):
+    """hotspot และ SQL ของโปรไฟล์หนึ่งรายการ"""
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        flash('คุณไม่มีสิทธิ์เข้าถึงหน้านี้', 'error')
+        return redirect(url_for('main.dashboard'))
+    profile = profiler.load(profile_id)
+    if profile is None:
+        flash('ไม่พบโปรไฟล์', 'error')
+        return redirect(url_for('main.profiles'))
+    return render_template('profile.html', profile=profile)
+
+@bp.route('/admin/profiles/<profile_id>/collapsed')
+@login_required
+def profile_collapsed(profile_id):
+    """stack แบบ collapsed สำหรับ speedscope.app หรือ flamegraph.pl"""
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        return Response('ไม่มีสิทธิ์\n', status=403, mimetype='text/plain')
+    profile = profiler.load(profile_id)
+    if profile is None:
+        return Response('ไม่พบโปรไฟล์\n', status=404, mimetype='text/plain')
+    return Response(profiler.collapsed_text(profile), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={profile_id}.collapsed.txt'})
+
 # CSV Import Route ใหม่
-@app.route('/csv-import', methods=['GET'])
+@bp.route('/csv-import', methods=['GET'])
 @login_required
 def csv_import_page():
     """แสดงหน้า CSV Import"""
     return render_template('csv_import.html')
 
-@app.route('/csv-import', methods=['POST'])
+@bp.route('/csv-import', methods=['POST'])
 @login_required
 def csv_import():
-    """ประมวลผลการนำเข้า CSV"""
+    """รับไฟล์ CSV แล้วส่งเข้าคิวนำเข้าเบื้องหลัง คืน job id ทันที"""
     try:
         # ตรวจสอบไฟล์
         if 'csvfile' not in request.files:
@@ -801,153 +1037,111 @@ def csv_import():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'success': False, 'message': 'กรุณาเลือกไฟล์ .csv'})
         
-        # อ่านไฟล์
-        file_content = file.read()
-        
-        # ลอง decode หลาย encoding
-        text_content = None
-        for encoding in ['utf-8-sig', 'utf-8', 'cp874', 'windows-1252', 'iso-8859-1']:
-            try:
-                text_content = file_content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if not text_content:
-            return jsonify({'success': False, 'message': 'ไม่สามารถอ่านไฟล์ได้'})
-        
-        # แยกบรรทัด
-        lines = [line.strip() for line in text_content.strip().split('\n') if line.strip()]
-        if len(lines) < 2:
-            return jsonify({'success': False, 'message': 'ไฟล์ต้องมีข้อมูลอย่างน้อย 2 บรรทัด'})
-        
-        # อ่าน header
-        headers = [h.strip().lower() for h in lines[0].split(',')]
-        
-        # ตรวจสอบคอลัมน์ที่จำเป็น
-        if 'date' not in headers or 'amount' not in headers:
-            return jsonify({'success': False, 'message': 'ไฟล์ต้องมีคอลัมน์ date และ amount'})
-        
-        # หา index ของแต่ละคอลัมน์
-        date_idx = headers.index('date')
-        amount_idx = headers.index('amount')
-        type_idx = headers.index('type') if 'type' in headers else None
-        category_idx = headers.index('category') if 'category' in headers else None
-        desc_idx = headers.index('description') if 'description' in headers else None
-        
-        # ประมวลผลข้อมูล
-        s = Session()
-        success_count = 0
-        error_count = 0
-        
-        for line_no, line in enumerate(lines[1:], 2):
-            try:
-                # แยกค่า CSV (รองรับ quotes)
-                values = []
-                current = ''
-                in_quotes = False
-                
-                for char in line:
-                    if char == '"':
-                        in_quotes = not in_quotes
-                    elif char == ',' and not in_quotes:
-                        values.append(current.strip().strip('"'))
-                        current = ''
-                    else:
-                        current += char
-                values.append(current.strip().strip('"'))
-                
-                if len(values) < max(date_idx, amount_idx) + 1:
-                    error_count += 1
-                    continue
-                
-                # ดึงข้อมูล
-                date_str = values[date_idx].strip()
-                amount_str = values[amount_idx].strip()
-                
-                if not date_str or not amount_str:
-                    error_count += 1
-                    continue
-                
-                # แปลงวันที่
-                entry_date = None
-                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d']:
-                    try:
-                        entry_date = datetime.strptime(date_str, fmt).date()
-                        break
-                    except ValueError:
-                        continue
-                
-                if not entry_date:
-                    error_count += 1
-                    continue
-                
-                # แปลงจำนวนเงิน
-                try:
-                    amount = float(amount_str.replace(',', ''))
-                    original_amount = amount
-                    amount = abs(amount)
-                except:
-                    error_count += 1
-                    continue
-                
-                # กำหนดประเภท
-                if type_idx is not None and type_idx < len(values):
-                    entry_type = values[type_idx].strip().lower()
-                    if entry_type not in ['income', 'expense']:
-                        entry_type = 'expense' if original_amount < 0 else 'income'
-                else:
-                    entry_type = 'expense' if original_amount < 0 else 'income'
-                
-                # กำหนดหมวดหมู่
-                category = 'อื่นๆ'
-                if category_idx is not None and category_idx < len(values):
-                    cat = values[category_idx].strip()
-                    if cat:
-                        category = cat
-                
-                # กำหนดรายละเอียด
-                description = ''
-                if desc_idx is not None and desc_idx < len(values):
-                    description = values[desc_idx].strip()
-                
-                # บันทึกข้อมูล
-                entry = Entry(
-                    date=entry_date,
-                    type=entry_type,
-                    category=category,
-                    description=description,
-                    amount=amount,
-                    created_by=int(current_user.get_id())
-                )
-                s.add(entry)
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                continue
-        
-        # บันทึกการเปลี่ยนแปลง
-        if success_count > 0:
-            s.commit()
-        
-        s.close()
+        mode = request.form.get('mode', bulk_loader.DEFAULT_MODE)
+        if mode not in bulk_loader.MODES:
+            return jsonify({'success': False, 'message': 'โหมดการนำเข้าไม่ถูกต้อง'})
         
+        job_id = import_jobs.submit(Session.session_factory, file.read(), file.filename,
+                                    int(current_user.get_id()), mode)
         return jsonify({
             'success': True,
-            'message': f'นำเข้าข้อมูลสำเร็จ {success_count} รายการ',
-            'success_count': success_count,
-            'error_count': error_count
-        })
+            'message': 'รับไฟล์แล้ว กำลังนำเข้าข้อมูล',
+            'job_id': job_id,
+            'status_url': url_for('main.import_job_status', job_id=job_id)
+        }), 202
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'เกิดข้อผิดพลาด: {str(e)}'})
 
-if __name__ == '__main__':
-    # Initialize database tables
-    Base.metadata.create_all(engine)
-    
-    # Create default admin user if not exists
+@bp.route('/api/import-jobs/<job_id>')
+@login_required
+def import_job_status(job_id):
+    """ความคืบหน้าของงานนำเข้า (rows parsed/inserted/rejected และ ETA)"""
+    s = Session()
+    job = s.query(ImportJob).get(job_id)
+    if not job or (job.created_by != int(current_user.get_id()) and current_user.role != 'admin'):
+        s.close()
+        return jsonify({'error': 'ไม่พบงานนำเข้า'}), 404
+    result = import_jobs.job_status(job)
+    s.close()
+    return jsonify(result)
+
+def init_db():
+    """
+    สร้าง engine, ผูก Session, ทำ migration และโหลดหมวดหมู่ (ครั้งเดียวต่อ process ครั้งถัดไปไม่ทำอะไร)
+    ใต้ gunicorn ที่ preload_app ถูกเรียกใน master ก่อน fork worker แต่ละตัวต้องเรียก after_fork()
+    เพื่อเปิด connection ของตัวเอง (ดู gunicorn.conf.py)
+    """
+    global engine
+    if engine is not None:
+        return engine
+
+    if DB_URL:
+        # Production: Use PostgreSQL on Railway
+        engine = database.create_app_engine(DB_URL)
+    else:
+        # Development: Use SQLite
+        engine = database.create_app_engine(f'sqlite:///{DB_PATH}')
+    Session.configure(bind=engine)
+    metrics.instrument(engine)
+
+    # อัปเดต schema ตอนเริ่มแอป (ปิดได้ด้วย AUTO_MIGRATE=0 แล้วใช้ flask db-upgrade แทน)
+    if os.environ.get('AUTO_MIGRATE', '1') != '0':
+        migrations.upgrade(engine)
+
+    # โหลดพจนานุกรมหมวดหมู่ไว้ในหน่วยความจำ (ข้ามถ้ายังไม่ได้ทำ migration)
+    try:
+        categories.load(Session())
+    except Exception as e:
+        print(f"⚠️  โหลดหมวดหมู่ไม่ได้: {e}")
+    finally:
+        Session.remove()
+    return engine
+
+def create_app():
+    """
+    สร้าง Flask app ใหม่ทุกครั้งที่เรียก: route จาก blueprint, Flask-Login, metrics และ profiler
+    ฐานข้อมูลตั้งค่าครั้งแรกที่เรียก (init_db) gunicorn ใช้ app_main:create_app()
+    """
+    init_db()
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    app.config['WTF_CSRF_ENABLED'] = False  # ปิด CSRF ชั่วคราวเพื่อทดสอบ
+    app.register_blueprint(bp)
+    app.teardown_appcontext(shutdown_session)
+    login_manager.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
+
+    # คอมไพล์ template ล่วงหน้า request แรกของแต่ละหน้าไม่ต้องรอ (ปิดได้ด้วย PRECOMPILE_TEMPLATES=0)
+    if os.environ.get('PRECOMPILE_TEMPLATES', '1') != '0':
+        precompile_templates(app)
+    return app
+
+def precompile_templates(app):
+    """โหลดและคอมไพล์ทุก template เข้า cache ของ Jinja คืนจำนวนที่คอมไพล์ได้"""
+    compiled = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            print(f"⚠️  คอมไพล์ template {name} ไม่ได้: {e}")
+    return compiled
+
+def after_fork():
+    """
+    เรียกใน worker หลัง fork: ทิ้ง connection ที่สืบทอดมาจาก master โดยไม่ปิด
+    (socket เดียวกันยังเป็นของ process อื่น) worker จะเปิด connection ใหม่ของตัวเองเมื่อใช้งาน
+    """
+    Session.remove()
+    if engine is not None:
+        engine.dispose(close=False)
+    database.reset_stats()
+    metrics.reset()
+
+def ensure_default_admin():
+    """สร้างผู้ใช้ admin เริ่มต้นถ้ายังไม่มี"""
     try:
         from werkzeug.security import generate_password_hash
         s = Session()
@@ -966,6 +1160,14 @@ if __name__ == '__main__':
         s.close()
     except Exception as e:
         print(f"Database setup error: {e}")
+    finally:
+        Session.remove()
+
+if __name__ == '__main__':
+    app = create_app()
+
+    # Create default admin user if not exists
+    ensure_default_admin()
     
     # Get port from environment (Railway) or use default
     port = int(os.environ.get('PORT', 8000))
@@ -0,0 +1,280 @@
+"""
+Benchmark ความเร็วของหน้าเว็บและ API ภายใน process (Flask test client ไม่ผ่านเครือข่าย)
+
+สร้างข้อมูลสังเคราะห์ตาม --size (ดู synthetic_data.py) แล้ววัดแต่ละ route หลายครั้ง
+รายงาน latency (ครั้งแรก, p50, p95, max) และจำนวน SQL statement ต่อ request
+(นับจาก event before_cursor_execute ของ engine) แล้วบันทึกเป็น JSON ที่ diff ระหว่างเวอร์ชันได้
+
+route ที่มี result cache วัดสองแบบ: warm (ใช้ cache ตามปกติ) และ cold (ล้าง cache ก่อนทุก request)
+/entries วัดหน้าแรกและหน้าที่ลึก 50% / 90% ของรายการ (ผ่าน cursor)
+การนำเข้า CSV ทั้งสองแบบวัดเป็นลำดับสุดท้าย เพราะเพิ่มแถวใหม่ (--import-rows) ลงฐานข้อมูลทุกครั้ง
+/csv-import เป็นงานเบื้องหลัง: latency คือเวลาตอบรับไฟล์ และ job_* คือเวลาจนงานเสร็จ
+
+ฐานข้อมูล SQLite ชั่วคราว หรือกำหนดเองด้วย --db-url (ถ้ามีรายการอยู่แล้วจะไม่สร้างข้อมูลเพิ่ม)
+
+    python benchmarks/bench_app.py --size 1m --json bench_1m.json
+    python benchmarks/bench_app.py --size 1m --db-url sqlite:////tmp/bench_1m.db --compare bench_1m.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, event, func
+
+from forms import INCOME_CHOICES, EXPENSE_CHOICES
+from models import Entry, ImportJob
+import migrations
+import synthetic_data
+
+CACHED_ROUTES = ('/dashboard', '/api/chart-data', '/api/available-months')
+DEEP_PAGES = (0.5, 0.9)
+
+_queries = Counter()  # thread id -> จำนวน SQL statement
+
+
+def count_query(*args):
+    _queries[threading.get_ident()] += 1
+
+
+def main_thread_queries():
+    return _queries[threading.get_ident()]
+
+
+def other_thread_queries():
+    me = threading.get_ident()
+    return sum(n for ident, n in _queries.items() if ident != me)
+
+
+def percentile(values, q):
+    """ค่าที่ตำแหน่ง q (0-1) แบบ nearest-rank"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))]
+
+
+def summarize(latencies, queries, statuses, **extra):
+    ms = [v * 1000 for v in latencies]
+    result = {
+        'requests': len(ms),
+        'first_ms': round(ms[0], 2),
+        'p50_ms': round(percentile(ms, 0.5), 2),
+        'p95_ms': round(percentile(ms, 0.95), 2),
+        'max_ms': round(max(ms), 2),
+        'queries_per_request': round(percentile(queries, 0.5), 1),
+        'queries_max': max(queries),
+        'status': sorted(set(statuses)),
+    }
+    result.update(extra)
+    return result
+
+
+def measure(client, path, iterations, before=None):
+    latencies, queries, statuses = [], [], []
+    for _ in range(iterations):
+        if before:
+            before()
+        q0 = main_thread_queries()
+        start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()  # อ่าน body ทั้งหมด (export เป็น streaming)
+        latencies.append(time.perf_counter() - start)
+        queries.append(main_thread_queries() - q0)
+        statuses.append(response.status_code)
+    return summarize(latencies, queries, statuses)
+
+
+def import_csv_bytes(rows, token):
+    """CSV สำหรับทดสอบนำเข้า รายละเอียดมี token เพื่อไม่ให้ซ้ำกับรอบก่อน (ไม่ถูกข้ามเป็นแถวซ้ำ)"""
+    out = io.StringIO()
+    out.write('date,type,category,description,amount\n')
+    choices = [('income', n) for n, _ in INCOME_CHOICES] + [('expense', n) for n, _ in EXPENSE_CHOICES]
+    for i in range(rows):
+        entry_type, category = choices[i % len(choices)]
+        out.write(f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d},{entry_type},{category},bench {token} {i},{(i % 500) + 10}.00\n")
+    return out.getvalue().encode('utf-8')
+
+
+def measure_sync_import(client, iterations, rows):
+    latencies, queries, statuses = [], [], []
+    for i in range(iterations):
+        data = {'file': (io.BytesIO(import_csv_bytes(rows, f'sync{time.time_ns()}')), 'bench.csv'), 'mode': 'skip'}
+        q0 = main_thread_queries()
+        start = time.perf_counter()
+        response = client.post('/import/csv', data=data, content_type='multipart/form-data')
+        latencies.append(time.perf_counter() - start)
+        queries.append(main_thread_queries() - q0)
+        statuses.append(response.status_code)
+    p50 = percentile(latencies, 0.5)
+    return summarize(latencies, queries, statuses, rows=rows, rows_per_sec=round(rows / p50) if p50 else None)
+
+
+def measure_async_import(client, session_factory, iterations, rows):
+    latencies, queries, statuses, job_seconds, job_queries = [], [], [], [], []
+    for i in range(iterations):
+        data = {'csvfile': (io.BytesIO(import_csv_bytes(rows, f'job{time.time_ns()}')), 'bench.csv'), 'mode': 'skip'}
+        q0, j0 = main_thread_queries(), other_thread_queries()
+        start = time.perf_counter()
+        response = client.post('/csv-import', data=data, content_type='multipart/form-data')
+        latencies.append(time.perf_counter() - start)
+        queries.append(main_thread_queries() - q0)
+        statuses.append(response.status_code)
+        job_id = response.get_json()['job_id']
+        s = session_factory()
+        while s.query(ImportJob.status).filter_by(id=job_id).scalar() not in ('done', 'failed'):
+            s.rollback()
+            time.sleep(0.01)
+        s.close()
+        job_seconds.append(time.perf_counter() - start)
+        job_queries.append(other_thread_queries() - j0)
+    p50 = percentile(job_seconds, 0.5)
+    return summarize(latencies, queries, statuses, rows=rows,
+                     job_p50_ms=round(p50 * 1000, 2), job_p95_ms=round(percentile(job_seconds, 0.95) * 1000, 2),
+                     job_queries=round(percentile(job_queries, 0.5), 1),
+                     rows_per_sec=round(rows / p50) if p50 else None)
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def prepare_database(db_url, rows, seed):
+    engine = create_engine(db_url)
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(func.count(Entry.id).select()).scalar()
+    if existing:
+        print(f"ใช้ข้อมูลที่มีอยู่ {existing:,} รายการ")
+        dataset = {'rows': existing, 'generated': False}
+    else:
+        print(f"สร้างข้อมูลสังเคราะห์ {rows:,} รายการ ...")
+        dataset = synthetic_data.generate(engine, rows, seed=seed, progress=lambda message: None)
+        dataset['generated'] = True
+        print(f"  เสร็จใน {dataset['total_seconds']:.1f} วินาที")
+    engine.dispose()
+    return dataset
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['endpoints']
+    print(f"\nเทียบกับ {baseline_path}:")
+    for name, result in report['endpoints'].items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'queries_per_request'):
+            if old.get(key):
+                changes.append(f"{key} {old[key]} -> {result[key]} ({(result[key] - old[key]) / old[key] * 100:+.0f}%)")
+        print(f"  {name:<40} " + '  '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='10k', help='10k, 1m, 10m หรือจำนวนแถว')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=30, help='จำนวน request ต่อ route')
+    parser.add_argument('--heavy-requests', type=int, default=3, help='จำนวนครั้งสำหรับ export และการนำเข้า')
+    parser.add_argument('--import-rows', type=int, default=5000)
+    parser.add_argument('--db-url')
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    parser.add_argument('--compare', help='ไฟล์ JSON ผลครั้งก่อนสำหรับเทียบ')
+    args = parser.parse_args()
+
+    db_url = args.db_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_app.db')
+    print(f"ฐานข้อมูล: {db_url}")
+    dataset = prepare_database(db_url, synthetic_data.parse_size(args.size), args.seed)
+
+    # app_main อ่าน DATABASE_URL ตอน import
+    os.environ['DATABASE_URL'] = db_url
+    import app_main
+    import cache
+    app_main.init_db()
+    app_main.ensure_default_admin()
+    event.listen(app_main.engine, 'before_cursor_execute', count_query)
+
+    client = app_main.create_app().test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    if response.status_code != 302:
+        raise SystemExit('เข้าสู่ระบบด้วย admin/admin123 ไม่ได้')
+
+    s = app_main.Session()
+    total = s.query(func.count(Entry.id)).scalar()
+    latest = s.query(func.max(Entry.date)).scalar()
+    deep = {}
+    for fraction in DEEP_PAGES:
+        offset = int(total * fraction)
+        entry = s.query(Entry).order_by(Entry.created_at.desc(), Entry.id.desc()).offset(offset).first()
+        if entry:
+            deep[fraction] = f"/entries?after={app_main.encode_cursor(entry)}&page={offset // 20 + 2}"
+    app_main.Session.remove()
+
+    def clear_cache():
+        backend = cache.get_backend()
+        if backend is not None:
+            backend.clear()
+
+    month = f"year={latest.year}&month={latest.month}" if latest else ''
+    paths = {
+        '/dashboard': '/dashboard',
+        '/api/chart-data': f'/api/chart-data?{month}',
+        '/api/available-months': '/api/available-months',
+    }
+    endpoints = {}
+    for route in CACHED_ROUTES:
+        endpoints[f'GET {route} (cache=warm)'] = measure(client, paths[route], args.requests)
+        endpoints[f'GET {route} (cache=cold)'] = measure(client, paths[route], args.requests, before=clear_cache)
+    endpoints['GET /entries (first page)'] = measure(client, '/entries', args.requests)
+    for fraction, path in deep.items():
+        endpoints[f'GET /entries (page at {fraction:.0%})'] = measure(client, path, args.requests)
+    if latest:
+        endpoints['GET /export/csv (latest month)'] = measure(
+            client, f'/export/csv?from={latest.replace(day=1).isoformat()}&to={latest.isoformat()}',
+            args.heavy_requests)
+    endpoints['GET /export/csv (all)'] = measure(client, '/export/csv', args.heavy_requests)
+    endpoints['POST /import/csv'] = measure_sync_import(client, args.heavy_requests, args.import_rows)
+    endpoints['POST /csv-import'] = measure_async_import(client, app_main.Session.session_factory,
+                                                         args.heavy_requests, args.import_rows)
+
+    print(f"\n{'route':<40} {'first':>9} {'p50':>9} {'p95':>9} {'queries':>8}")
+    for name, r in endpoints.items():
+        print(f"{name:<40} {r['first_ms']:>7.1f}ms {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+              f"{r['queries_per_request']:>8}")
+        if 'job_p50_ms' in r:
+            print(f"{'  (งานนำเข้าจนเสร็จ)':<40} {'':>9} {r['job_p50_ms']:>7.1f}ms {r['job_p95_ms']:>7.1f}ms "
+                  f"{r['job_queries']:>8}  {r['rows_per_sec']:,} แถว/วินาที")
+
+    report = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'database': app_main.engine.dialect.name,
+        'dataset': dataset,
+        'settings': {'requests': args.requests, 'heavy_requests': args.heavy_requests,
+                     'import_rows': args.import_rows},
+        'endpoints': endpoints,
+    }
+    if args.compare:
+        compare(report, args.compare)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
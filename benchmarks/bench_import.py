@@ -0,0 +1,121 @@
+"""
+Benchmark การนำเข้า CSV: เทียบแบบเดิม (session.add ทีละแถว + commit ครั้งเดียว)
+กับ bulk_loader (executemany เป็นชุด + commit ทีละชุด)
+
+ข้อมูลทดสอบได้จาก production_data.csv (~700 แถว) ทำซ้ำจนได้จำนวนแถวที่ต้องการ
+ใช้ฐานข้อมูล SQLite ชั่วคราว หรือกำหนดเองด้วย --db-url
+
+    python benchmarks/bench_import.py --rows 1000000 --batch-size 1000 --batch-size 5000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from models import Entry
+import bulk_loader
+import categories
+import migrations
+import money
+import rollup
+
+
+def load_sample():
+    with open(os.path.join(ROOT, 'production_data.csv'), encoding='utf-8-sig') as f:
+        return [
+            {'date': date.fromisoformat(r['date']), 'type': r['type'], 'category': r['category'],
+             'description': r['description'], 'amount_satang': money.to_satang(r['amount'])}
+            for r in csv.DictReader(f)
+        ]
+
+
+def scaled_rows(sample, n):
+    for i in range(n):
+        row = dict(sample[i % len(sample)])
+        row['line'] = i + 2
+        yield row
+
+
+def reset(engine):
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM entries'))
+        conn.execute(text('DELETE FROM daily_totals'))
+        conn.execute(text('DELETE FROM monthly_totals'))
+
+
+def run_orm(Session, sample, n):
+    """วิธีเดิม: สร้าง Entry ทีละแถว แล้ว commit ครั้งเดียว"""
+    s = Session()
+    deltas = rollup.new_deltas()
+    ids = categories.resolve_many(s, {(r['type'], r['category']) for r in sample})
+    for row in scaled_rows(sample, n):
+        row.pop('line')
+        row['category_id'] = ids[(row['type'], row.pop('category'))]
+        e = Entry(created_by=None, **row)
+        s.add(e)
+        rollup.add_entry(deltas, e)
+    rollup.apply_deltas(s, deltas)
+    s.commit()
+    s.close()
+    return n
+
+
+def run_bulk(Session, sample, n, batch_size):
+    s = Session()
+    report = bulk_loader.load_entries(s, scaled_rows(sample, n), None, batch_size=batch_size)
+    s.close()
+    return report.inserted
+
+
+def timed(label, fn, engine):
+    reset(engine)
+    start = time.perf_counter()
+    inserted = fn()
+    elapsed = time.perf_counter() - start
+    result = {'method': label, 'rows': inserted, 'seconds': round(elapsed, 3),
+              'rows_per_sec': round(inserted / elapsed) if elapsed else None}
+    print(f"{label:<20} {inserted:>10,} rows  {elapsed:8.2f}s  {result['rows_per_sec']:>10,} rows/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, action='append', dest='batch_sizes')
+    parser.add_argument('--orm-rows', type=int, default=50_000,
+                        help='จำนวนแถวสำหรับวิธีเดิม (ช้ามาก จึงจำกัดไว้)')
+    parser.add_argument('--db-url')
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    db_url = args.db_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_import.db')
+    engine = create_engine(db_url)
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+    sample = load_sample()
+
+    print(f"ฐานข้อมูล: {db_url}")
+    results = []
+    if args.orm_rows:
+        results.append(timed('orm (per-row add)', lambda: run_orm(Session, sample, args.orm_rows), engine))
+    for size in args.batch_sizes or [bulk_loader.DEFAULT_BATCH_SIZE]:
+        results.append(timed(f'bulk (batch={size})', lambda: run_bulk(Session, sample, args.rows, size), engine))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'db_url': db_url, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark เวลาเริ่มแอป (cold start): เวลา import ต่อโมดูล และเวลาจนได้ response แรก
+
+แต่ละรอบรัน Python process ใหม่ที่ import app_main, เรียก create_app() แล้ว GET --path ผ่าน test client
+วัดตั้งแต่สร้าง process จนได้ response แรก (รวมเวลาเริ่ม interpreter) แล้วเทียบกับงบ --budget-ms
+อีกรอบรันด้วย -X importtime แล้วสรุปโมดูลที่ใช้เวลา import มากที่สุด
+และตรวจว่าโมดูลหนัก (pandas, numpy, wtforms) ไม่ถูกโหลดตอนเริ่ม
+
+ฐานข้อมูลเป็น SQLite ชั่วคราวที่ทำ migration ไว้ก่อนแล้ว (เหมือนการ restart บน Railway)
+หรือกำหนดเองด้วย --db-url
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1500 --json startup.json
+คืนค่า exit code 1 ถ้า median เกินงบ
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'wtforms', 'flask_wtf')
+
+# รันใน process ลูก: พิมพ์เวลา (วินาทีจากเริ่ม import) และโมดูลหนักที่โหลดแล้วหลัง create_app เป็น JSON บรรทัดสุดท้าย
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import app_main
+imported = time.perf_counter()
+app = app_main.create_app()
+created = time.perf_counter()
+heavy = sorted(m for m in %r if m in sys.modules)
+response = app.test_client().get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({"status": response.status_code, "import": imported - start, "create_app": created - imported,
+                  "first_response": done - start, "heavy": heavy}))
+''' % (HEAVY_MODULES,)
+
+
+def child_env(db_url):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = db_url
+    return env
+
+
+def run_once(db_url, path):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=child_env(db_url),
+                         capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['wall'] = wall
+    return result
+
+
+def parse_importtime(stderr):
+    """แปลงผลของ -X importtime เป็น list ของ (โมดูล, ความลึก, self µs, cumulative µs)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_profile(db_url, top):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app_main; app_main.create_app()'], cwd=ROOT,
+                         env=child_env(db_url), capture_output=True, text=True, check=True)
+    rows = parse_importtime(out.stderr)
+    # โมดูลระดับบนสุด (ที่ app_main หรือโมดูลของโปรเจกต์ import โดยตรง) เรียงตาม cumulative
+    top_level = sorted((r for r in rows if r[1] <= 1 and r[0] != 'app_main'), key=lambda r: -r[3])[:top]
+    return {
+        'total_ms': round(sum(r[3] for r in rows if r[1] == 0) / 1000, 1),
+        'modules': [{'module': name, 'self_ms': round(s / 1000, 1), 'cumulative_ms': round(c / 1000, 1)}
+                    for name, _depth, s, c in top_level],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', default='/login', help='route ที่ใช้วัด response แรก')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)))
+    parser.add_argument('--top', type=int, default=15, help='จำนวนโมดูลที่แสดง')
+    parser.add_argument('--db-url')
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    db_url = args.db_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_startup.db')
+    print(f"ฐานข้อมูล: {db_url}")
+    run_once(db_url, args.path)  # ทำ migration และสร้าง .pyc ก่อน ไม่นับรอบนี้
+
+    runs = [run_once(db_url, args.path) for _ in range(args.runs)]
+    for i, r in enumerate(runs, 1):
+        print(f"รอบ {i}: import {r['import'] * 1000:7.1f} ms  create_app {r['create_app'] * 1000:7.1f} ms  response แรก {r['first_response'] * 1000:7.1f} ms  "
+              f"รวมเริ่ม process {r['wall'] * 1000:7.1f} ms  (HTTP {r['status']})")
+
+    profile = import_profile(db_url, args.top)
+    print(f"\nimport ทั้งหมด {profile['total_ms']:.1f} ms  โมดูลที่ใช้เวลามากที่สุด:")
+    for m in profile['modules']:
+        print(f"  {m['module']:<30} {m['cumulative_ms']:8.1f} ms  (self {m['self_ms']:.1f} ms)")
+
+    heavy = sorted({m for r in runs for m in r['heavy']})
+    if heavy:
+        print(f"\n⚠️  โมดูลหนักถูกโหลดตอนเริ่ม: {', '.join(heavy)}")
+
+    wall_ms = statistics.median(r['wall'] for r in runs) * 1000
+    within = wall_ms <= args.budget_ms
+    print(f"\n{'✅' if within else '❌'} time-to-first-response (median) {wall_ms:.1f} ms / งบ {args.budget_ms:.0f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'db_url': db_url,
+                'path': args.path,
+                'budget_ms': args.budget_ms,
+                'time_to_first_response_ms': round(wall_ms, 1),
+                'within_budget': within,
+                'heavy_modules_loaded': heavy,
+                'runs': [{k: (round(v * 1000, 1) if isinstance(v, float) else v) for k, v in r.items()}
+                         for r in runs],
+                'imports': profile,
+            }, f, indent=2, ensure_ascii=False)
+    return 0 if within else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
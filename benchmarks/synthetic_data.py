@@ -0,0 +1,163 @@
+"""
+สร้างข้อมูลรายการสังเคราะห์จำนวนมากสำหรับ benchmark
+
+หมวดหมู่มาจาก INCOME_CHOICES/EXPENSE_CHOICES ใน forms.py (หมวดแรก ๆ ขายบ่อยกว่า)
+จำนวนรายการต่อวันขึ้นกับฤดูกาล: ช่วงเปิดเทอม (พ.ค.-มิ.ย., พ.ย.) มากกว่าช่วงปิดเทอม (เม.ย., ต.ค.)
+วันอาทิตย์น้อยกว่าวันธรรมดา รวมแล้วได้จำนวนแถวตรงตามที่ขอ
+ข้อมูลเหมือนเดิมทุกครั้งเมื่อใช้ --seed เดียวกัน
+
+เขียนด้วย executemany ทีละชุด (ไม่ผ่าน ORM) ใน transaction เดียว โดยถอดดัชนีค้นหา (trigger ของ FTS) ออกระหว่างเขียน
+แล้วสร้าง daily_totals/monthly_totals และดัชนีค้นหาใหม่ครั้งเดียวตอนจบ
+
+    python benchmarks/synthetic_data.py --size 1m --db-url sqlite:////tmp/bench_1m.db
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from forms import INCOME_CHOICES, EXPENSE_CHOICES
+from models import Entry, EntryType
+import categories
+import migrations
+import rollup
+import search
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+CHUNK_ROWS = 100_000
+COLUMNS = ('date', 'type', 'category_id', 'description', 'amount_satang', 'created_by', 'created_at')
+INCOME_SHARE = 0.85
+
+# น้ำหนักตามเดือน (ม.ค.-ธ.ค.) ตามปฏิทินโรงเรียน และตามวันในสัปดาห์ (จันทร์-อาทิตย์)
+MONTH_WEIGHTS = (1.1, 1.0, 0.8, 0.5, 1.4, 1.5, 1.1, 1.1, 1.0, 0.6, 1.3, 0.9)
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.4)
+
+DESCRIPTIONS = ('', '', '', 'ลูกค้าประจำ', 'งานด่วน', 'นักศึกษา', 'บริษัท ABC', 'ส่งไลน์', 'เครดิต 30 วัน')
+
+
+def parse_size(value):
+    value = value.lower()
+    return SIZES[value] if value in SIZES else int(value.replace('_', ''))
+
+
+def daily_counts(rng, rows, days, end):
+    """จำนวนรายการของแต่ละวันย้อนหลัง days วันถึง end รวมกันเท่ากับ rows"""
+    dates = [end - timedelta(days=days - 1 - i) for i in range(days)]
+    weights = np.array([MONTH_WEIGHTS[d.month - 1] * WEEKDAY_WEIGHTS[d.weekday()] for d in dates])
+    # สุ่มรายวันเพิ่มเล็กน้อยให้กราฟไม่เรียบเกินจริง
+    weights *= rng.gamma(20.0, 1 / 20.0, size=days)
+    return dates, rng.multinomial(rows, weights / weights.sum())
+
+
+def category_table(rng, category_ids):
+    """(type, id, ความถี่, ราคากลางหน่วยสตางค์) ของทุกหมวดหมู่ในฟอร์ม"""
+    table = []
+    for entry_type, choices, share, price in (('income', INCOME_CHOICES, INCOME_SHARE, 80),
+                                              ('expense', EXPENSE_CHOICES, 1 - INCOME_SHARE, 1500)):
+        popularity = 1.0 / np.arange(1, len(choices) + 1)
+        popularity = popularity / popularity.sum() * share
+        for (name, _label), p in zip(choices, popularity):
+            median = max(int(price * rng.lognormal(0, 0.8)), 5) * 100
+            table.append((entry_type, category_ids[(entry_type, name)], p, median))
+    return table
+
+
+def generate_rows(rng, dates, counts, table, created_by):
+    """
+    สร้างแถวเป็นชุดละประมาณ CHUNK_ROWS แถว (tuple ตามลำดับ COLUMNS)
+    วันที่/เวลาเป็นข้อความรูปแบบเดียวกับที่ SQLAlchemy เก็บใน SQLite (PostgreSQL แปลงให้เอง)
+    """
+    probabilities = np.array([t[2] for t in table])
+    medians = np.array([t[3] for t in table])
+    codes = [EntryType.CODES[t[0]] for t in table]
+    category_ids = [t[1] for t in table]
+    batch = []
+    for d, n in zip(dates, counts):
+        n = int(n)
+        if not n:
+            continue
+        picks = rng.choice(len(table), size=n, p=probabilities)
+        amounts = np.maximum(np.round(medians[picks] * rng.lognormal(0, 0.4, size=n), -2), 100).astype(np.int64)
+        seconds = np.sort(rng.integers(8 * 3600, 20 * 3600, size=n)).astype('timedelta64[s]')
+        created = np.char.replace(np.datetime_as_string(np.datetime64(d) + seconds, unit='us'), 'T', ' ')
+        descriptions = rng.integers(0, len(DESCRIPTIONS), size=n)
+        day = d.isoformat()
+        batch.extend(
+            (day, codes[pick], category_ids[pick], DESCRIPTIONS[text], amount, created_by, created_at)
+            for pick, amount, text, created_at in zip(picks.tolist(), amounts.tolist(), descriptions.tolist(),
+                                                      created.tolist())
+        )
+        if len(batch) >= CHUNK_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(engine, rows, days=None, seed=42, end=None, created_by=None, progress=print):
+    """เพิ่มรายการสังเคราะห์ rows แถวลงฐานข้อมูล คืนค่า dict สรุป"""
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    days = days or max(min(rows // 50, 3 * 365), 30)
+    Session = sessionmaker(bind=engine)
+    s = Session()
+    categories.load(s)
+    ids = categories.resolve_many(s, [('income', n) for n, _ in INCOME_CHOICES] +
+                                  [('expense', n) for n, _ in EXPENSE_CHOICES])
+    dates, counts = daily_counts(rng, rows, days, end)
+    table = category_table(rng, ids)
+    s.close()
+
+    placeholder = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+    statement = f"INSERT INTO entries ({', '.join(COLUMNS)}) VALUES ({', '.join([placeholder] * len(COLUMNS))})"
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        search.uninstall(conn)
+        written = 0
+        for batch in generate_rows(rng, dates, counts, table, created_by):
+            conn.exec_driver_sql(statement, batch)
+            written += len(batch)
+            progress(f"  เขียนแล้ว {written:,}/{rows:,} แถว ({written / (time.perf_counter() - start):,.0f} แถว/วินาที)")
+    inserted = time.perf_counter() - start
+
+    s = Session()
+    rollup.rebuild_daily_totals(s)
+    s.close()
+    with engine.begin() as conn:
+        search.install(conn)
+    with Session() as s:
+        total = s.query(func.count(Entry.id)).scalar()
+    return {'rows': rows, 'days': days, 'seed': seed, 'from': dates[0].isoformat(), 'to': end.isoformat(),
+            'entries_total': total, 'insert_seconds': round(inserted, 2),
+            'total_seconds': round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='10k', help='10k, 1m, 10m หรือจำนวนแถว')
+    parser.add_argument('--days', type=int, help='จำนวนวันย้อนหลัง (ค่าเริ่มต้นตามขนาด สูงสุด 3 ปี)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-url')
+    args = parser.parse_args()
+
+    db_url = args.db_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'synthetic.db')
+    engine = create_engine(db_url)
+    migrations.upgrade(engine)
+    print(f"ฐานข้อมูล: {db_url}")
+    summary = generate(engine, parse_size(args.size), args.days, args.seed)
+    print(f"✅ สร้าง {summary['rows']:,} รายการ ({summary['from']} ถึง {summary['to']}) "
+          f"ใน {summary['total_seconds']:.1f} วินาที")
+
+
+if __name__ == '__main__':
+    main()
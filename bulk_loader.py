@@ -0,0 +1,213 @@
+"""
+นำเข้า entries จำนวนมากแบบเป็นชุด (batch)
+
+แต่ละชุดถูก INSERT ด้วย executemany ครั้งเดียวแล้ว commit พร้อม delta ของ daily_totals
+ถ้าชุดใดล้มเหลว จะลองทีละแถวเพื่อระบุแถวที่มีปัญหาลงในรายงาน
+
+แถวที่มี fingerprint ซึ่งมีอยู่แล้วในตาราง entries จัดการตาม mode:
+    skip     ข้ามแถวที่เคยนำเข้าแล้ว
+    replace  ลบแถวเดิมแล้วบันทึกแถวใหม่แทน
+    fail     ยกเลิกทั้งไฟล์ก่อนบันทึกถ้าพบแถวที่เคยนำเข้าแล้ว
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, date
+from sqlalchemy import insert
+
+from models import Entry
+import categories
+import rollup
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+MAX_REPORTED_ERRORS = 100
+MODES = ('skip', 'replace', 'fail')
+DEFAULT_MODE = 'skip'
+
+_stats = {'imports': 0, 'rows_inserted': 0, 'rows_rejected': 0, 'rows_skipped': 0, 'rows_replaced': 0,
+          'seconds_total': 0.0, 'last_rows_per_sec': 0.0}
+_stats_lock = threading.Lock()
+
+
+class DuplicateImportError(ValueError):
+    """mode='fail' และพบแถวที่เคยนำเข้าแล้ว"""
+
+    def __init__(self, count):
+        super().__init__(f'พบ {count} รายการที่เคยนำเข้าแล้ว ยกเลิกการนำเข้าทั้งไฟล์')
+        self.count = count
+
+
+class ImportReport:
+    """ผลการนำเข้า: จำนวนที่บันทึกได้/ถูกปฏิเสธ และข้อผิดพลาดรายบรรทัด"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.replaced = 0
+        self.batches = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'skipped': self.skipped,
+            'replaced': self.replaced,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+
+
+def validate_row(row):
+    """ตรวจแถวก่อนบันทึก คืนข้อความผิดพลาด หรือ None ถ้าถูกต้อง"""
+    if not isinstance(row.get('date'), date):
+        return 'วันที่ไม่ถูกต้อง'
+    if row.get('type') not in ('income', 'expense'):
+        return 'ประเภทต้องเป็น income หรือ expense'
+    if not row.get('category'):
+        return 'ไม่มีหมวดหมู่'
+    if len(row['category']) > 120:
+        return 'หมวดหมู่ยาวเกิน 120 ตัวอักษร'
+    if not isinstance(row.get('amount_satang'), int):
+        return 'จำนวนเงินไม่ถูกต้อง'
+    return None
+
+
+def existing_fingerprints(s, fingerprints):
+    """fingerprint ที่มีอยู่แล้วในตาราง entries (ค้นผ่านดัชนี ux_entries_fingerprint)"""
+    fingerprints = [f for f in fingerprints if f]
+    found = set()
+    for i in range(0, len(fingerprints), 500):
+        chunk = fingerprints[i:i + 500]
+        found.update(f for (f,) in s.query(Entry.fingerprint).filter(Entry.fingerprint.in_(chunk)))
+    return found
+
+
+def _insert_batch(s, batch, mode):
+    """บันทึกหนึ่งชุด คืนค่า (inserted, skipped, replaced)"""
+    # ชื่อหมวดหมู่เป็น id ผ่านพจนานุกรม หมวดหมู่ใหม่ถูกสร้างใน transaction แยกก่อนชุดนี้เขียนอะไร
+    # (ถ้า DELETE ของโหมด replace ถือ write lock ของ SQLite อยู่ transaction แยกจะต้องรอจนหมดเวลา)
+    ids = categories.resolve_many(s, {(r['type'], r['category']) for r in batch})
+    deltas = rollup.new_deltas()
+    existing = existing_fingerprints(s, [r['fingerprint'] for r in batch])
+    skipped = replaced = 0
+    if existing and mode == 'replace':
+        old = s.query(Entry).filter(Entry.fingerprint.in_(existing)).all()
+        for e in old:
+            rollup.add_entry(deltas, e, -1)
+        s.query(Entry).filter(Entry.id.in_([e.id for e in old])).delete(synchronize_session=False)
+        replaced = len(existing)
+    elif existing:
+        batch = [r for r in batch if r['fingerprint'] not in existing]
+        skipped = len(existing)
+    if batch:
+        s.execute(insert(Entry.__table__), [
+            dict({k: v for k, v in r.items() if k not in ('line', 'category')},
+                 category_id=ids[(r['type'], r['category'])])
+            for r in batch
+        ])
+    for r in batch:
+        rollup.add_values(deltas, r['date'], r['type'], r['category'], r['amount_satang'])
+    rollup.apply_deltas(s, deltas)
+    s.commit()
+    return len(batch), skipped, replaced
+
+
+def _flush(s, batch, report, mode):
+    try:
+        counts = [_insert_batch(s, batch, mode)]
+    except Exception:
+        s.rollback()
+        # หาแถวที่มีปัญหาด้วยการลองทีละแถว
+        counts = []
+        for r in batch:
+            try:
+                counts.append(_insert_batch(s, [r], mode))
+            except Exception as e:
+                s.rollback()
+                report.reject(r.get('line'), str(e).splitlines()[0])
+    for inserted, skipped, replaced in counts:
+        report.inserted += inserted
+        report.skipped += skipped
+        report.replaced += replaced
+    report.batches += 1
+
+
+def load_entries(s, rows, created_by, batch_size=None, report=None, progress=None, mode=DEFAULT_MODE):
+    """
+    บันทึก rows ลงตาราง entries เป็นชุด ๆ ละ batch_size แถว
+    rows: iterable ของ dict ที่มี date, type, category, description, amount_satang (สตางค์),
+          line (เลขบรรทัดในไฟล์) และ fingerprint (ไม่บังคับ)
+    progress: ถ้ากำหนด จะถูกเรียก progress(report) หลังบันทึกแต่ละชุด
+    mode: skip, replace หรือ fail สำหรับแถวที่เคยนำเข้าแล้ว
+    """
+    if mode not in MODES:
+        raise ValueError(f'mode ต้องเป็นหนึ่งใน {", ".join(MODES)}')
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    report = report or ImportReport()
+    if mode == 'fail':
+        # ตรวจทั้งไฟล์ก่อนบันทึกชุดแรก เพื่อไม่ให้เหลือข้อมูลครึ่งไฟล์
+        rows = list(rows)
+        duplicates = existing_fingerprints(s, [r.get('fingerprint') for r in rows])
+        if duplicates:
+            raise DuplicateImportError(len(duplicates))
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    batch = []
+    try:
+        for row in rows:
+            error = validate_row(row)
+            if error:
+                report.reject(row.get('line'), error)
+                continue
+            batch.append({
+                'line': row.get('line'),
+                'date': row['date'],
+                'type': row['type'],
+                'category': row['category'],
+                'description': row.get('description') or '',
+                'amount_satang': row['amount_satang'],
+                'created_by': created_by,
+                'created_at': now,
+                'fingerprint': row.get('fingerprint'),
+            })
+            if len(batch) >= batch_size:
+                _flush(s, batch, report, mode)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _flush(s, batch, report, mode)
+            if progress:
+                progress(report)
+    finally:
+        _record(report, time.perf_counter() - started)
+    return report
+
+
+def _record(report, seconds):
+    with _stats_lock:
+        _stats['imports'] += 1
+        _stats['rows_inserted'] += report.inserted
+        _stats['rows_rejected'] += report.rejected
+        _stats['rows_skipped'] += report.skipped
+        _stats['rows_replaced'] += report.replaced
+        _stats['seconds_total'] += seconds
+        if seconds > 0:
+            _stats['last_rows_per_sec'] = round(report.inserted / seconds, 1)
+
+
+def stats():
+    """สถิติการนำเข้าใน process นี้ (จำนวนแถวและเวลารวม)"""
+    with _stats_lock:
+        result = dict(_stats)
+    result['rows_per_sec'] = round(result['rows_inserted'] / result['seconds_total'], 1) \
+        if result['seconds_total'] else 0.0
+    return result
@@ -0,0 +1,183 @@
+"""
+cache ผลลัพธ์ของ Dashboard และ API รายงาน
+
+คีย์ประกอบด้วยชื่อ route, พารามิเตอร์ และรุ่นของข้อมูล (data_version.generation)
+ทุกการเขียน entries (เพิ่ม/แก้ไข/ลบ/นำเข้า/ลบทั้งหมด) เพิ่มรุ่นใน transaction เดียวกันผ่าน rollup
+คีย์ของรุ่นเก่าจึงไม่ถูกใช้อีกและถูกไล่ออกตาม LRU เอง
+
+เก็บผลลัพธ์ที่คำนวณแล้ว (dict ที่แปลงเป็น JSON ได้) ไม่ใช่ HTML เพราะหน้าเว็บแสดงชื่อผู้ใช้ที่ login
+ผู้เรียกต้องไม่แก้ไขค่าที่ได้จาก cache
+
+backend เลือกด้วย CACHE_BACKEND:
+    memory  (ค่าเริ่มต้น) LRU ภายใน process จำกัดขนาด CACHE_MAX_ENTRIES
+    redis   ใช้ร่วมกันระหว่าง gunicorn worker ผ่าน CACHE_URL (ต้องติดตั้งแพ็กเกจ redis)
+    none    ปิด cache
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import rollup
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+CACHE_URL = os.environ.get('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+
+MISSING = object()
+
+
+class MemoryBackend:
+    """LRU ภายใน process"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key, MISSING)
+            if value is not MISSING:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    ใช้ร่วมกันทุก worker เก็บค่าเป็น JSON พร้อม TTL
+    ขนาดรวมควบคุมด้วย maxmemory + maxmemory-policy allkeys-lru ของ Redis
+    """
+
+    name = 'redis'
+
+    def __init__(self, url=CACHE_URL, ttl=CACHE_TTL, prefix='itbs:cache:'):
+        import redis  # ติดตั้งเพิ่มเมื่อใช้ backend นี้เท่านั้น
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self._redis.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+
+    def clear(self):
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+    def size(self):
+        return sum(1 for _ in self._redis.scan_iter(self.prefix + '*'))
+
+
+_backend = MISSING
+_backend_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+
+
+def create_backend(kind=CACHE_BACKEND):
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        return RedisBackend()
+    if kind == 'memory':
+        return MemoryBackend()
+    raise ValueError(f'CACHE_BACKEND ไม่รู้จัก: {kind}')
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is MISSING:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """เปลี่ยน backend (None = ปิด cache)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def make_key(name, params, generation):
+    return f"{name}:{generation}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+def etag(name, params, generation):
+    """strong ETag ของ route name กับ params ที่รุ่นข้อมูล generation"""
+    return hashlib.sha1(make_key(name, params, generation).encode('utf-8')).hexdigest()
+
+
+def get_or_compute(s, name, params, compute, generation=None):
+    """
+    คืนผลลัพธ์ของ route name กับ params จาก cache หรือเรียก compute() แล้วเก็บไว้
+    s: session ที่ใช้อ่านรุ่นของข้อมูล (ส่ง generation มาถ้าอ่านไว้แล้ว)
+    """
+    backend = get_backend()
+    if backend is None:
+        return compute()
+    if generation is None:
+        generation = rollup.current_generation(s)
+    key = make_key(name, params, generation)
+    try:
+        value = backend.get(key)
+    except Exception as e:
+        # cache ใช้ไม่ได้ (เช่น Redis ล่ม) ให้คำนวณตรงแทน
+        print(f"cache error: {e}")
+        _count('errors')
+        return compute()
+    if value is not MISSING:
+        _count('hits')
+        return value
+    _count('misses')
+    value = compute()
+    try:
+        backend.set(key, value)
+    except Exception as e:
+        print(f"cache error: {e}")
+        _count('errors')
+    return value
+
+
+def stats():
+    """สถิติของ cache ใน process นี้"""
+    backend = get_backend()
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_ratio'] = round(result['hits'] / lookups, 4) if lookups else 0.0
+    result['backend'] = backend.name if backend else 'none'
+    result['entries'] = backend.size() if backend else 0
+    result['evictions'] = backend.evictions if backend else 0
+    return result
@@ -0,0 +1,107 @@
+"""
+พจนานุกรมหมวดหมู่ (ตาราง categories) เก็บไว้ในหน่วยความจำ
+
+entries อ้างหมวดหมู่ด้วย category_id ฟอร์มและการนำเข้าแปลงชื่อเป็น id ด้วย resolve/resolve_many
+หน้าเว็บและไฟล์ส่งออกแปลง id กลับเป็นชื่อด้วย name_of โดยไม่ต้อง JOIN
+
+หมวดหมู่ใหม่ (กรอกเองหรือจากไฟล์นำเข้า) ถูกสร้างใน transaction แยกแล้ว commit ทันที
+ถ้าการบันทึก entries ล้มเหลวภายหลัง หมวดหมู่ที่สร้างไว้ยังคงอยู่ (ไม่มีผลต่อยอดรวม)
+worker อื่นที่พบ id ที่ยังไม่รู้จักจะโหลดตารางใหม่เอง
+"""
+
+import threading
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+from models import Category
+
+# หมวดหมู่ที่เพิ่มเองเรียงต่อท้ายหมวดหมู่มาตรฐานจากฟอร์ม
+CUSTOM_SORT_ORDER = 1000
+
+_lock = threading.Lock()
+_by_id = {}   # id -> (type, name)
+_by_key = {}  # (type, name) -> id
+_bind = None
+
+
+def seed(conn):
+    """ใส่หมวดหมู่มาตรฐานจาก INCOME_CHOICES/EXPENSE_CHOICES (ข้ามที่มีอยู่แล้ว)"""
+    from forms import INCOME_CHOICES, EXPENSE_CHOICES
+    existing = {(t, n) for t, n in conn.execute(Category.__table__.select().with_only_columns(
+        Category.type, Category.name))}
+    rows = []
+    for entry_type, choices in (('income', INCOME_CHOICES), ('expense', EXPENSE_CHOICES)):
+        for order, (name, _label) in enumerate(choices):
+            if (entry_type, name) not in existing:
+                rows.append({'name': name, 'type': entry_type, 'sort_order': order})
+    if rows:
+        conn.execute(insert(Category.__table__), rows)
+    return len(rows)
+
+
+def _reload(s):
+    rows = s.query(Category.id, Category.type, Category.name).all()
+    with _lock:
+        _by_id.clear()
+        _by_key.clear()
+        for category_id, entry_type, name in rows:
+            _by_id[category_id] = (entry_type, name)
+            _by_key[(entry_type, name)] = category_id
+
+
+def load(s):
+    """โหลดพจนานุกรมทั้งหมด และจำ engine ไว้สำหรับโหลดใหม่เมื่อพบ id ที่ไม่รู้จัก"""
+    global _bind
+    _bind = s.get_bind()
+    _reload(s)
+
+
+def _reload_with(s):
+    if s is not None:
+        _reload(s)
+    elif _bind is not None:
+        with OrmSession(bind=_bind) as fresh:
+            _reload(fresh)
+
+
+def name_of(category_id, s=None):
+    """ชื่อหมวดหมู่ของ id (None ถ้าไม่มี)"""
+    item = _by_id.get(category_id)
+    if item is None and category_id is not None:
+        _reload_with(s)
+        item = _by_id.get(category_id)
+    return item[1] if item else None
+
+
+def resolve(s, entry_type, name):
+    """id ของหมวดหมู่ (entry_type, name) สร้างใหม่ถ้ายังไม่มี"""
+    category_id = _by_key.get((entry_type, name))
+    if category_id is None:
+        category_id = resolve_many(s, [(entry_type, name)])[(entry_type, name)]
+    return category_id
+
+
+def resolve_many(s, pairs):
+    """{(type, name): id} ของทุกคู่ใน pairs สร้างหมวดหมู่ที่ยังไม่มีใน transaction แยก"""
+    global _bind
+    pairs = set(pairs)
+    missing = [p for p in pairs if p not in _by_key]
+    if missing:
+        _bind = s.get_bind()
+        with OrmSession(bind=_bind) as w:
+            _reload(w)  # worker อื่นอาจสร้างไว้แล้ว
+            for entry_type, name in [p for p in missing if p not in _by_key]:
+                w.add(Category(type=entry_type, name=name, sort_order=CUSTOM_SORT_ORDER))
+                try:
+                    w.commit()
+                except IntegrityError:
+                    w.rollback()  # สร้างพร้อมกันจากอีก worker ใช้ของที่มีอยู่
+            _reload(w)
+    return {p: _by_key[p] for p in pairs}
+
+
+def stats():
+    with _lock:
+        return {'categories': len(_by_id)}
@@ -0,0 +1,108 @@
+"""
+การเชื่อมต่อฐานข้อมูล: สร้าง engine พร้อม connection pool ที่ตั้งค่าได้จาก environment
+
+    DB_POOL_SIZE          จำนวน connection ที่เปิดค้างไว้ (ค่าเริ่มต้น 5)
+    DB_MAX_OVERFLOW       connection ที่เปิดเพิ่มได้ชั่วคราวเกิน pool size (10)
+    DB_POOL_TIMEOUT       วินาทีที่รอ connection ว่างก่อน error (30)
+    DB_POOL_RECYCLE       วินาทีก่อนเปิด connection ใหม่แทนตัวเก่า (1800)
+    DB_POOL_PRE_PING      1 = ตรวจ connection ก่อนใช้ทุกครั้ง (1)
+
+SQLite ถูกตั้ง pragma ทุกครั้งที่เปิด connection:
+    journal_mode=WAL, synchronous=NORMAL, busy_timeout=SQLITE_BUSY_TIMEOUT (ms), mmap_size=SQLITE_MMAP_SIZE
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+_stats = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidations': 0,
+          'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+_stats_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool ที่จับเวลารอ connection ว่างตอน checkout"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with _stats_lock:
+                _stats['wait_seconds_total'] += waited
+                _stats['wait_seconds_max'] = max(_stats['wait_seconds_max'], waited)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _set_sqlite_pragmas(dbapi_conn, record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    cursor.close()
+
+
+def create_app_engine(url):
+    """engine ของแอปพร้อม pool ตาม environment และ pragma สำหรับ SQLite"""
+    connect_args = {}
+    sqlite = url.startswith('sqlite')
+    if sqlite:
+        connect_args['check_same_thread'] = False
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if sqlite:
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    event.listen(engine, 'connect', lambda *args: _count('connects'))
+    event.listen(engine, 'checkout', lambda *args: _count('checkouts'))
+    event.listen(engine, 'checkin', lambda *args: _count('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: _count('invalidations'))
+    return engine
+
+
+def reset_stats():
+    """ล้างตัวนับ (worker หลัง fork ไม่นับ connection ที่ master เปิดตอนเริ่ม)"""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0.0 if isinstance(_stats[key], float) else 0
+
+
+def pool_stats(engine):
+    """สถานะ pool ปัจจุบันและตัวนับสะสมตั้งแต่เริ่ม process"""
+    pool = engine.pool
+    with _stats_lock:
+        result = dict(_stats)
+    result.update({
+        'pool_size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'max_overflow': DB_MAX_OVERFLOW,
+    })
+    result['wait_seconds_avg'] = round(result['wait_seconds_total'] / result['checkouts'], 6) \
+        if result['checkouts'] else 0.0
+    return result
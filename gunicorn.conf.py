@@ -0,0 +1,80 @@
+"""
+ตั้งค่า gunicorn สำหรับรันหลาย worker: gunicorn -c gunicorn.conf.py 'app_main:create_app()'
+
+preload_app โหลด app_main ครั้งเดียวใน master (ทำ migration และโหลดหมวดหมู่ครั้งเดียว)
+แล้ว fork เป็น worker หลังจาก fork แต่ละ worker ทิ้ง connection ที่สืบทอดมา (app_main.after_fork)
+และเปิด connection ใหม่ของตัวเอง
+
+ขนาด (ตั้งได้จาก environment):
+    WEB_CONCURRENCY        จำนวน worker (ค่าเริ่มต้น จำนวน CPU + 1 สูงสุด GUNICORN_MAX_WORKERS)
+    GUNICORN_MAX_WORKERS   เพดานของค่าเริ่มต้นข้างบน (8) กันเครื่องที่รายงาน CPU ของ host ทั้งเครื่อง
+    GUNICORN_WORKER_CLASS  gthread (ค่าเริ่มต้น) หรือ sync
+    GUNICORN_THREADS       thread ต่อ worker สำหรับ gthread (4)
+    GUNICORN_TIMEOUT       วินาทีก่อน worker ที่ค้างถูก restart (120)
+
+สูตร:
+    workers = CPU + 1          request ส่วนใหญ่รอฐานข้อมูล worker เกิน CPU เล็กน้อยจึงใช้ CPU ได้เต็ม
+    threads = 2-4              dashboard/API อ่านจาก cache และที่เก็บคอลัมน์ ใช้ CPU น้อยต่อ request
+    request พร้อมกันสูงสุด = workers * threads
+    connection ต่อ worker    = threads + IMPORT_WORKERS  ต้องไม่เกิน DB_POOL_SIZE + DB_MAX_OVERFLOW
+    connection รวม           = workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)  ต้องไม่เกิน max_connections ของ PostgreSQL
+    หน่วยความจำ              = ที่เก็บคอลัมน์ (analytics.py) และ cache มีชุดของตัวเองในทุก worker
+
+งานนำเข้า CSV รันใน thread ของ worker ที่รับไฟล์ worker อื่นยังรับ request ของ dashboard ได้ตามปกติ
+จึงไม่ตั้ง max_requests (worker ที่ถูก restart ระหว่างนำเข้าจะทิ้งงานที่ค้างอยู่)
+"""
+
+import os
+import tempfile
+
+import database
+import import_jobs
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# /metrics รวมค่าจากทุก worker ผ่านไฟล์ในไดเรกทอรีนี้ (ต้องตั้งก่อน preload app_main)
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='itbs-metrics-'))
+
+GUNICORN_MAX_WORKERS = int(os.environ.get('GUNICORN_MAX_WORKERS', 8))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(_cpu_count() + 1, GUNICORN_MAX_WORKERS)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = timeout
+preload_app = True
+accesslog = '-'
+
+
+def on_starting(server):
+    import metrics
+    metrics.clear_dir()
+
+
+def when_ready(server):
+    import app_main
+    app_main.ensure_default_admin()
+    per_worker = threads + import_jobs.IMPORT_WORKERS
+    pool = database.DB_POOL_SIZE + database.DB_MAX_OVERFLOW
+    print(f"🚀 gunicorn: {workers} worker x {threads} thread ({worker_class}), "
+          f"connection สูงสุด {workers * pool}")
+    if per_worker > pool:
+        print(f"⚠️  thread ต่อ worker ({per_worker}) มากกว่า DB_POOL_SIZE + DB_MAX_OVERFLOW ({pool}) "
+              f"request อาจต้องรอ connection")
+
+
+def post_fork(server, worker):
+    import app_main
+    app_main.after_fork()
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.flush()
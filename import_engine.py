@@ -0,0 +1,233 @@
+"""
+แปลงไฟล์ CSV ที่อัปโหลดเป็น DataFrame ที่ตรวจสอบแล้วสำหรับ bulk_loader
+
+อ่านด้วย pandas.read_csv ครั้งเดียว เดารูปแบบ (ตัวคั่น, รูปแบบวันที่, ตัวคั่นหลักพัน) ครั้งเดียวต่อไฟล์
+แล้วแปลงทั้งคอลัมน์แบบ vectorized แถวที่ใช้ไม่ได้ถูกรวบรวมเป็นรายการข้อผิดพลาด
+
+คอลัมน์ที่จำเป็น: date, amount  คอลัมน์เสริม: type, category, description
+
+แต่ละแถวได้ fingerprint (sha256) จากเนื้อหาและลำดับที่ของเนื้อหาเดียวกันในไฟล์
+เพื่อให้การนำเข้าไฟล์เดิมซ้ำตรวจเจอได้ด้วยดัชนี unique แทนการสแกน entries
+"""
+
+import csv
+import hashlib
+import io
+import re
+import warnings
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+
+import money
+
+ENCODINGS = ['utf-8-sig', 'utf-8', 'cp874', 'windows-1252', 'iso-8859-1']
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d']
+DELIMITERS = ',;\t|'
+SAMPLE_ROWS = 200
+DEFAULT_CATEGORY = 'อื่นๆ'
+
+_THOUSANDS_COMMA = re.compile(r'^-?\d{1,3}(,\d{3})+$')
+_MAX_SATANG = 2 ** 63 - 1
+
+
+class ImportFormatError(ValueError):
+    """ไฟล์ทั้งไฟล์ใช้ไม่ได้ (อ่านไม่ได้, ไม่มี header ที่จำเป็น ฯลฯ)"""
+
+
+def decode(file_content):
+    # ลอง decode หลาย encoding
+    for encoding in ENCODINGS:
+        try:
+            return file_content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ImportFormatError('ไม่สามารถอ่านไฟล์ได้')
+
+
+def infer_delimiter(text_content):
+    sample = '\n'.join(text_content.splitlines()[:20])
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def infer_date_format(values):
+    """เลือกรูปแบบวันที่ที่แปลงตัวอย่างได้มากที่สุด"""
+    sample = values[values != ''].head(SAMPLE_ROWS)
+    if sample.empty:
+        return DATE_FORMATS[0]
+    scores = [pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum() for fmt in DATE_FORMATS]
+    return DATE_FORMATS[scores.index(max(scores))]
+
+
+def infer_number_format(values):
+    """คืนค่า (thousands, decimal) จากตัวอย่างคอลัมน์จำนวนเงิน"""
+    sample = values[values != ''].head(SAMPLE_ROWS)
+    both = sample[sample.str.contains(',', regex=False) & sample.str.contains('.', regex=False)]
+    if not both.empty:
+        v = both.iloc[0]
+        return (',', '.') if v.rfind('.') > v.rfind(',') else ('.', ',')
+    commas = sample[sample.str.contains(',', regex=False)]
+    if not commas.empty and not commas.str.match(_THOUSANDS_COMMA).all():
+        return ('', ',')
+    return (',', '.')
+
+
+def read_frame(text_content, delimiter):
+    # เก็บบรรทัดว่างไว้เป็นแถว เพื่อให้ลำดับแถวตรงกับ record ใน line_numbers (parse_csv ตัดออกภายหลัง)
+    options = dict(sep=delimiter, dtype=str, keep_default_na=False, skipinitialspace=True, index_col=False,
+                   skip_blank_lines=False)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', pd.errors.ParserWarning)
+            return pd.read_csv(io.StringIO(text_content), **options)
+    except pd.errors.ParserError:
+        # บางบรรทัดมีคอลัมน์เกิน header ใช้ python engine ตัดคอลัมน์ส่วนเกินทิ้ง
+        ncols = len(next(csv.reader(io.StringIO(text_content), delimiter=delimiter)))
+        return pd.read_csv(io.StringIO(text_content), engine='python',
+                           on_bad_lines=lambda fields: fields[:ncols], **options)
+
+
+def line_numbers(text_content, delimiter, rows):
+    """
+    เลขบรรทัดในไฟล์ที่แต่ละแถวข้อมูล (ไม่รวม header) เริ่มต้น
+    ปกติหนึ่งแถวคือหนึ่งบรรทัด ถ้าจำนวนไม่ตรง (มีช่องในเครื่องหมายคำพูดที่ขึ้นบรรทัดใหม่)
+    จึงไล่อ่านด้วย csv.reader ซึ่งรู้ว่าแต่ละ record จบที่บรรทัดใด
+    """
+    if text_content.count('\n') == rows:
+        return pd.RangeIndex(2, rows + 2)
+    reader = csv.reader(io.StringIO(text_content), delimiter=delimiter, skipinitialspace=True)
+    starts = []
+    previous = 0
+    for _record in reader:
+        starts.append(previous + 1)
+        previous = reader.line_num
+    if len(starts) - 1 != rows:
+        return pd.RangeIndex(2, rows + 2)
+    return pd.Index(starts[1:])
+
+
+def parse_satang(text):
+    """
+    ข้อความจำนวนเงินบาท (ตัดตัวคั่นหลักพันแล้ว ใช้ . เป็นจุดทศนิยม) เป็นสตางค์ด้วย money.to_satang
+    (Decimal ปัดครึ่งขึ้น เหมือนฟอร์มและ ORM) หรือ None ถ้าแปลงไม่ได้/ไม่ใช่จำนวนจำกัด/เกินช่วง int64
+    """
+    try:
+        satang = money.to_satang(Decimal(text))
+    except (InvalidOperation, ValueError):
+        return None
+    return satang if abs(satang) <= _MAX_SATANG else None
+
+
+def parse_csv(file_content):
+    """
+    คืนค่า (frame, errors)
+    frame: DataFrame คอลัมน์ line, date, type, category, description, amount_satang, fingerprint ที่ผ่านการตรวจแล้ว
+    errors: dict ที่มี line, message ของบรรทัดที่ใช้ไม่ได้
+    """
+    decoded = decode(file_content)
+    text_content = decoded.strip()
+    # บรรทัดว่างหน้า header ถูกตัดออกด้วย strip จึงนำมาบวกกลับในเลขบรรทัด
+    skipped = decoded[:len(decoded) - len(decoded.lstrip())].count('\n')
+    if not text_content:
+        raise ImportFormatError('ไฟล์ต้องมีข้อมูลอย่างน้อย 2 บรรทัด')
+
+    delimiter = infer_delimiter(text_content)
+    df = read_frame(text_content, delimiter)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    starts = line_numbers(text_content, delimiter, len(df))
+    # แถวที่เริ่มจากบรรทัดว่าง (หรือมีแต่ช่องว่าง) ไม่ใช่ข้อมูล บรรทัดที่มีแต่ตัวคั่นยังเป็นแถวที่ไม่มีวันที่/จำนวนเงิน
+    blank = (pd.Series(text_content.split('\n')).str.strip() == '').to_numpy()[starts - 1]
+    df.index = starts + skipped
+    df = df[~blank]
+    if df.empty:
+        raise ImportFormatError('ไฟล์ต้องมีข้อมูลอย่างน้อย 2 บรรทัด')
+    if 'date' not in df.columns or 'amount' not in df.columns:
+        raise ImportFormatError('ไฟล์ต้องมีคอลัมน์ date และ amount')
+
+    df = df.fillna('')
+    line = pd.Series(df.index, index=df.index)
+    date_str = df['date'].str.strip()
+    amount_str = df['amount'].str.strip()
+
+    # วันที่: ใช้รูปแบบที่เดาได้ก่อน แล้วลองรูปแบบอื่นเฉพาะแถวที่ยังแปลงไม่ได้
+    fmt = infer_date_format(date_str)
+    dates = pd.to_datetime(date_str, format=fmt, errors='coerce')
+    for other in DATE_FORMATS:
+        missing = dates.isna() & (date_str != '')
+        if not missing.any():
+            break
+        if other != fmt:
+            dates[missing] = pd.to_datetime(date_str[missing], format=other, errors='coerce')
+
+    # จำนวนเงิน: ตัดตัวคั่นหลักพันและแปลงจุดทศนิยมตามที่เดาได้
+    thousands, decimal = infer_number_format(amount_str)
+    cleaned = amount_str
+    if thousands:
+        cleaned = cleaned.str.replace(thousands, '', regex=False)
+    if decimal != '.':
+        cleaned = cleaned.str.replace(decimal, '.', regex=False)
+    # แปลงจากข้อความด้วย Decimal (ไม่ผ่าน float) ให้ได้สตางค์ตรงกับทางฟอร์ม เช่น 0.125 -> 13, 1.005 -> 101
+    parsed = cleaned.map(parse_satang)
+    amounts = parsed.where(parsed.notna(), 0).astype('int64')
+
+    # รวบรวมแถวที่ใช้ไม่ได้
+    empty = (date_str == '') | (amount_str == '')
+    bad_date = ~empty & dates.isna()
+    bad_amount = ~empty & ~bad_date & parsed.isna()
+    errors = []
+    for mask, message in ((empty, lambda i: 'ไม่มีวันที่หรือจำนวนเงิน'),
+                          (bad_date, lambda i: f'รูปแบบวันที่ไม่ถูกต้อง: {date_str[i]}'),
+                          (bad_amount, lambda i: f'จำนวนเงินไม่ถูกต้อง: {amount_str[i]}')):
+        errors.extend({'line': int(line[i]), 'message': message(i)} for i in df.index[mask])
+    errors.sort(key=lambda e: e['line'])
+
+    valid = ~(empty | bad_date | bad_amount)
+
+    # ประเภท: ใช้คอลัมน์ type ถ้าถูกต้อง ไม่เช่นนั้นดูจากเครื่องหมายของจำนวนเงิน
+    by_sign = pd.Series('income', index=df.index).where(amounts >= 0, 'expense')
+    if 'type' in df.columns:
+        given = df['type'].str.strip().str.lower()
+        entry_type = given.where(given.isin(['income', 'expense']), by_sign)
+    else:
+        entry_type = by_sign
+
+    category = df['category'].str.strip() if 'category' in df.columns else pd.Series('', index=df.index)
+    category = category.where(category != '', DEFAULT_CATEGORY)
+    description = df['description'].str.strip() if 'description' in df.columns else pd.Series('', index=df.index)
+
+    frame = pd.DataFrame({
+        'line': line,
+        'date': dates.dt.date,
+        'type': entry_type,
+        'category': category,
+        'description': description,
+        'amount_satang': amounts.abs(),
+    })[valid]
+    return add_fingerprints(frame), errors
+
+
+def add_fingerprints(frame):
+    """
+    เติมคอลัมน์ fingerprint = sha256(date|type|category|description|amount|n) โดย amount เป็นบาททศนิยม 2 ตำแหน่ง
+    n คือลำดับที่ของแถวที่มีเนื้อหาเหมือนกันในไฟล์ (1, 2, ...) แทนเลขบรรทัด
+    แถวซ้ำจริงในไฟล์เดียวกันจึงยังแยกกันได้ ส่วนไฟล์ที่ซ้อนทับกัน (เช่น export ของวันเดียวกัน
+    ที่มีแถวเพิ่มด้านบน) ยังได้ fingerprint เดิมแม้เลขบรรทัดจะเลื่อน
+    """
+    content = [f'{d.isoformat()}|{t}|{c}|{desc}|{money.format_baht(a)}' for d, t, c, desc, a in
+               zip(frame['date'], frame['type'], frame['category'], frame['description'], frame['amount_satang'])]
+    occurrence = pd.Series(content, dtype=object).groupby(content, sort=False).cumcount() + 1
+    fingerprints = [hashlib.sha256(f'{k}|{n}'.encode('utf-8')).hexdigest() for k, n in zip(content, occurrence)]
+    return frame.assign(fingerprint=pd.Series(fingerprints, index=frame.index, dtype=object))
+
+
+def iter_rows(frame):
+    """แปลง DataFrame เป็น dict ทีละแถวสำหรับ bulk_loader.load_entries"""
+    columns = list(frame.columns)
+    for values in frame.itertuples(index=False, name=None):
+        row = dict(zip(columns, values))
+        row['line'] = int(row['line'])
+        row['amount_satang'] = int(row['amount_satang'])
+        yield row
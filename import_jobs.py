@@ -0,0 +1,123 @@
+"""
+งานนำเข้า CSV เบื้องหลัง
+
+route รับไฟล์แล้วสร้างแถวใน import_jobs และส่งงานเข้า thread pool ภายใน process
+คืน job id ทันที หน้าเว็บ poll ความคืบหน้าจาก /api/import-jobs/<id>
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import ImportJob
+import bulk_loader
+
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 1))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # สร้างตอนใช้งานครั้งแรก เพื่อไม่ให้ thread ถูกสร้างก่อน fork ของ gunicorn
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+        return _executor
+
+
+def submit(session_factory, file_content, filename, user_id, mode=bulk_loader.DEFAULT_MODE):
+    """สร้าง job และส่งเข้าคิว คืนค่า job id"""
+    job_id = uuid.uuid4().hex
+    s = session_factory()
+    try:
+        s.add(ImportJob(id=job_id, status='queued', mode=mode, filename=filename, created_by=user_id,
+                        rows_total=max(file_content.count(b'\n'), 1)))
+        s.commit()
+    finally:
+        s.close()
+    _get_executor().submit(run_job, session_factory, job_id, file_content, user_id, mode)
+    return job_id
+
+
+def _update(session_factory, job_id, **fields):
+    s = session_factory()
+    try:
+        s.query(ImportJob).filter_by(id=job_id).update(fields)
+        s.commit()
+    finally:
+        s.close()
+
+
+def run_job(session_factory, job_id, file_content, user_id, mode=bulk_loader.DEFAULT_MODE):
+    import import_engine  # pandas โหลดเมื่อมีงานนำเข้าแรกเท่านั้น
+    _update(session_factory, job_id, status='running', started_at=datetime.utcnow())
+    s = session_factory()
+    try:
+        frame, errors = import_engine.parse_csv(file_content)
+        _update(session_factory, job_id, rows_total=len(frame) + len(errors),
+                rows_parsed=len(frame) + len(errors), rows_rejected=len(errors))
+
+        def progress(report):
+            _update(session_factory, job_id, rows_inserted=report.inserted,
+                    rows_rejected=len(errors) + report.rejected,
+                    rows_skipped=report.skipped, rows_replaced=report.replaced)
+
+        report = bulk_loader.load_entries(s, import_engine.iter_rows(frame), user_id,
+                                          progress=progress, mode=mode)
+        all_errors = (errors + report.errors)[:bulk_loader.MAX_REPORTED_ERRORS]
+        _update(session_factory, job_id, status='done', finished_at=datetime.utcnow(),
+                rows_inserted=report.inserted, rows_rejected=len(errors) + report.rejected,
+                rows_skipped=report.skipped, rows_replaced=report.replaced,
+                message=summary_message(report),
+                errors=json.dumps(all_errors, ensure_ascii=False))
+    except Exception as e:
+        s.rollback()
+        print(f"❌ IMPORT JOB {job_id} FAILED: {str(e)}")
+        _update(session_factory, job_id, status='failed', finished_at=datetime.utcnow(),
+                message=str(e))
+    finally:
+        s.close()
+
+
+def summary_message(report):
+    """ข้อความสรุปผลการนำเข้า"""
+    message = f'นำเข้าข้อมูลสำเร็จ {report.inserted} รายการ'
+    if report.replaced:
+        message += f' (แทนที่ของเดิม {report.replaced} รายการ)'
+    if report.skipped:
+        message += f' ข้ามรายการที่เคยนำเข้าแล้ว {report.skipped} รายการ'
+    return message
+
+
+def job_status(job):
+    """ข้อมูลความคืบหน้าของ job สำหรับ JSON API"""
+    processed = job.rows_inserted + job.rows_rejected + (job.rows_skipped or 0)
+    total = job.rows_total or 0
+    percent = min(100, round(processed * 100 / total)) if total else 0
+    eta = None
+    if job.status == 'running' and job.started_at and processed:
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        eta = round(max(total - processed, 0) * elapsed / processed, 1)
+    if job.status == 'done':
+        percent = 100
+    return {
+        'id': job.id,
+        'status': job.status,
+        'mode': job.mode,
+        'filename': job.filename,
+        'rows_total': total,
+        'rows_parsed': job.rows_parsed,
+        'rows_inserted': job.rows_inserted,
+        'rows_rejected': job.rows_rejected,
+        'rows_skipped': job.rows_skipped or 0,
+        'rows_replaced': job.rows_replaced or 0,
+        'percent': percent,
+        'eta_seconds': eta,
+        'message': job.message,
+        'errors': json.loads(job.errors or '[]') if job.status in ('done', 'failed') else [],
+    }
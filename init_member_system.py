@@ -2,38 +2,33 @@
 สคริปต์สำหรับอัปเดต database schema เพื่อรองรับระบบจัดการสมาชิก
 """
 
-import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from werkzeug.security import generate_password_hash
-from models import Base, User, Entry
+from models import User
+import migrations
 
-# ลบไฟล์ database เดิม
-if os.path.exists('business.db'):
-    os.remove('business.db')
-    print("ลบไฟล์ database เดิมเรียบร้อย")
-
-# สร้าง database ใหม่
+# อัปเดต schema ด้วย migration (ไม่ลบข้อมูลเดิม)
 engine = create_engine('sqlite:///business.db')
-Base.metadata.create_all(engine)
+migrations.upgrade(engine)
 
-print("สร้าง database schema ใหม่เรียบร้อย")
+print("อัปเดต database schema เรียบร้อย")
 
 # สร้าง session
 Session = sessionmaker(bind=engine)
 session = Session()
 
-# สร้างผู้ใช้ admin
-admin_user = User(
-    username='admin',
-    email='admin@itbusinessshop.com',
-    password_hash=generate_password_hash('admin123'),
-    role='admin',
-    is_active=True
-)
-
-session.add(admin_user)
-session.commit()
+# สร้างผู้ใช้ admin ถ้ายังไม่มี
+if not session.query(User).filter_by(username='admin').first():
+    admin_user = User(
+        username='admin',
+        email='admin@itbusinessshop.com',
+        password_hash=generate_password_hash('admin123'),
+        role='admin',
+        is_active=True
+    )
+    session.add(admin_user)
+    session.commit()
 
 print(f"สร้างผู้ใช้ admin เรียบร้อย:")
 print(f"  Username: admin")
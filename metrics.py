@@ -0,0 +1,478 @@
+"""
+ตัวชี้วัดของแอปในรูปแบบ Prometheus text exposition (GET /metrics)
+
+ต่อ endpoint (ชื่อ view function ของ Flask จำนวน label จึงคงที่):
+    app_http_requests_total{endpoint,method,status}
+    app_http_request_duration_seconds{endpoint,method}        histogram
+    app_db_statements_total{endpoint}                         SQL statement ที่ request ของ endpoint ส่ง
+    app_db_time_seconds_total{endpoint}                       เวลารวมที่รอฐานข้อมูล (execute + fetch ผลลัพธ์)
+SQL ที่ไม่ได้อยู่ใน request (งานนำเข้าเบื้องหลัง, migration ตอนเริ่ม) นับใน endpoint="(background)"
+นอกจากนี้มีสถานะ connection pool (database.pool_stats), hit/miss ของ cache, ที่เก็บคอลัมน์ (ถ้าโหลดแล้ว)
+และจำนวนแถว/เวลาของการนำเข้า CSV (bulk_loader.stats)
+
+ต่อ request บวกค่าใน dict ภายใต้ lock ครั้งเดียวตอนจบ ต่อ SQL statement อ่านเวลาสองครั้ง
+แล้วบวกในตัวแปรของ thread (ไม่มี lock) เวลา fetch นับด้วย cursor ที่จับเวลา fetchone/fetchmany/fetchall
+(ติดตั้งผ่าน do_connect) เพราะ SQLite และ stream แบบ yield_per ทำงานส่วนใหญ่ตอน fetch ไม่ใช่ตอน execute
+
+gunicorn หลาย worker: ตั้ง METRICS_DIR (gunicorn.conf.py ตั้งให้) แต่ละ worker เขียน snapshot
+ของตัวเองเป็นไฟล์ทุก METRICS_FLUSH_SECONDS วินาทีจาก thread เบื้องหลัง /metrics รวมค่าจากทุกไฟล์
+ไม่ว่า request จะไปถึง worker ใด ตัวนับของ worker ที่จบไปแล้วยังถูกรวม (ตัวนับไม่ลดลง)
+ส่วน gauge รวมเฉพาะ worker ที่ยังทำงานอยู่
+
+สิทธิ์: ส่ง Authorization: Bearer <METRICS_TOKEN> (สำหรับ Prometheus) หรือ login เป็น admin
+"""
+
+import glob
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+import bulk_loader
+import cache
+import categories
+import database
+import user_cache
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = '(background)'
+UNMATCHED = '(unmatched)'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_requests = {}   # (endpoint, method, status) -> จำนวน
+_durations = {}  # (endpoint, method) -> [จำนวนต่อ bucket ..., +Inf, ผลรวมวินาที]
+_sql = {}        # endpoint -> [statements, วินาที]
+_local = threading.local()
+_engine = None
+_dirty = False
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+# ---- เก็บค่า ----
+
+def begin_request():
+    _local.sql = [0, 0.0]
+    _local.statements = None
+    _local.status = None
+    _local.started = time.perf_counter()
+
+
+def note_response(response):
+    _local.status = response.status_code
+    return response
+
+
+def end_request(endpoint, method, exc=None):
+    """เรียกตอน teardown (หลัง streaming response ส่งครบ) บันทึกเวลาและ SQL ของ request"""
+    global _dirty
+    sql = getattr(_local, 'sql', None)
+    if sql is None:
+        return
+    elapsed = time.perf_counter() - _local.started
+    status = 500 if exc is not None else (_local.status or 500)
+    _local.sql = None
+    _local.statements = None
+    endpoint = endpoint or UNMATCHED
+    with _lock:
+        key = (endpoint, method, str(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        durations = _durations.get((endpoint, method))
+        if durations is None:
+            durations = _durations[(endpoint, method)] = [0] * (len(BUCKETS) + 1) + [0.0]
+        durations[bisect_left(BUCKETS, elapsed)] += 1
+        durations[-1] += elapsed
+        totals = _sql.setdefault(endpoint, [0, 0.0])
+        totals[0] += sql[0]
+        totals[1] += sql[1]
+    _dirty = True
+    if METRICS_DIR and _flusher is None:
+        _start_flusher()
+
+
+def capture_statements():
+    """
+    เก็บ [ข้อความ, วินาที] ของทุก SQL statement ใน request ปัจจุบันลง list ที่คืนไป (ใช้โดย profiler.py)
+    วินาทีรวมเวลา fetch ผลลัพธ์ของ statement นั้นด้วย
+    """
+    _local.statements = []
+    return _local.statements
+
+
+def _observe_sql(elapsed, statement, cursor=None):
+    global _dirty
+    sql = getattr(_local, 'sql', None)
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+        if _local.statements is not None:
+            item = [statement, elapsed]
+            _local.statements.append(item)
+            if isinstance(cursor, _TimedFetch):
+                cursor.metrics_item = item
+        return
+    with _lock:
+        totals = _sql.setdefault(BACKGROUND, [0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+    # ไม่เริ่ม thread ที่นี่ (master ทำ migration ก่อน fork) งานนำเข้ารันใน worker ที่รับ request แล้ว
+    _dirty = True
+
+
+def _observe_fetch(cursor, elapsed):
+    global _dirty
+    sql = getattr(_local, 'sql', None)
+    if sql is not None:
+        sql[1] += elapsed
+        item = getattr(cursor, 'metrics_item', None)
+        if item is not None:
+            item[1] += elapsed
+        return
+    with _lock:
+        _sql.setdefault(BACKGROUND, [0, 0.0])[1] += elapsed
+    _dirty = True
+
+
+class _TimedFetch:
+    """mixin ของ DBAPI cursor: บวกเวลา fetch ลงเวลา SQL ของ request (หรือ background)"""
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _observe_fetch(self, time.perf_counter() - started)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            _observe_fetch(self, time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _observe_fetch(self, time.perf_counter() - started)
+
+
+_cursor_classes = {}
+
+
+def _timed_connect_args(dialect):
+    """connect args ที่ทำให้ DBAPI connection สร้าง cursor ที่จับเวลา fetch (None ถ้าไม่รองรับ driver นี้)"""
+    driver = dialect.driver
+    if driver not in _cursor_classes:
+        if driver == 'pysqlite':
+            import sqlite3
+
+            class TimedCursor(_TimedFetch, sqlite3.Cursor):
+                pass
+
+            class TimedConnection(sqlite3.Connection):
+                def cursor(self, factory=TimedCursor):
+                    return super().cursor(factory)
+
+            _cursor_classes[driver] = {'factory': TimedConnection}
+        elif driver == 'psycopg2':
+            import psycopg2.extensions
+
+            class TimedCursor(_TimedFetch, psycopg2.extensions.cursor):
+                pass
+
+            _cursor_classes[driver] = {'cursor_factory': TimedCursor}
+        else:
+            _cursor_classes[driver] = None
+    return _cursor_classes[driver]
+
+
+def _do_connect(dialect, conn_rec, cargs, cparams):
+    extra = _timed_connect_args(dialect)
+    if extra:
+        for key, value in extra.items():
+            cparams.setdefault(key, value)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _observe_sql(time.perf_counter() - conn.info['metrics_started'].pop(), statement, cursor)
+
+
+def _handle_error(context):
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        _observe_sql(time.perf_counter() - started.pop(), context.statement)
+
+
+def instrument(engine):
+    """
+    นับ SQL statement และเวลา (execute + fetch) ของทุก statement ที่ผ่าน engine (จำ engine ไว้สำหรับสถานะ pool)
+    ต้องเรียกก่อน engine เปิด connection แรก cursor ที่จับเวลา fetch ถูกติดตั้งตอนเชื่อมต่อ
+    """
+    global _engine
+    _engine = engine
+    event.listen(engine, 'do_connect', _do_connect)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def init_app(app):
+    app.before_request(begin_request)
+    app.after_request(note_response)
+
+    @app.teardown_request
+    def _end_request(exc=None):
+        from flask import request
+        end_request(request.endpoint, request.method, exc)
+
+
+def authorized(request, user):
+    header = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and hmac.compare_digest(header, f'Bearer {METRICS_TOKEN}'):
+        return True
+    return bool(getattr(user, 'is_authenticated', False)) and getattr(user, 'role', None) == 'admin'
+
+
+# ---- snapshot และรวมค่าจากหลาย worker ----
+
+def snapshot(engine):
+    """ค่าทั้งหมดของ process นี้ในรูปที่แปลงเป็น JSON ได้"""
+    with _lock:
+        requests = [[e, m, s, n] for (e, m, s), n in _requests.items()]
+        durations = [[e, m, list(d)] for (e, m), d in _durations.items()]
+        sql = [[e, n, seconds] for e, (n, seconds) in _sql.items()]
+    analytics = sys.modules.get('analytics')  # ไม่ import เอง (NumPy) ถ้ายังไม่มีรายงาน
+    return {
+        'pid': os.getpid(),
+        'requests': requests,
+        'durations': durations,
+        'sql': sql,
+        'pool': database.pool_stats(engine) if engine is not None else None,
+        'caches': {'result': cache.stats(), 'user': user_cache.stats()},
+        'analytics': analytics.stats() if analytics else None,
+        'categories': categories.stats()['categories'],
+        'imports': bulk_loader.stats(),
+    }
+
+
+def _path(pid):
+    return os.path.join(METRICS_DIR, f'metrics-{pid}.json')
+
+
+def _start_flusher():
+    # สร้าง thread ใน worker เมื่อมีค่าแรก (หลัง fork) แล้วเขียนไฟล์ทุก METRICS_FLUSH_SECONDS ถ้ามีค่าเปลี่ยน
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+            _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        if _dirty:
+            flush()
+
+
+def flush(data=None):
+    """เขียน snapshot ของ worker นี้ลง METRICS_DIR"""
+    global _dirty
+    if not METRICS_DIR:
+        return
+    _dirty = False
+    try:
+        tmp = _path(os.getpid()) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data or snapshot(_engine), f)
+        os.replace(tmp, _path(os.getpid()))
+    except OSError as e:
+        print(f"⚠️  เขียน metrics ไม่ได้: {e}")
+
+
+def reset():
+    """ล้างตัวนับที่สืบทอดมาจาก master หลัง fork (thread เขียนไฟล์ไม่ติดมากับ fork ต้องสร้างใหม่)"""
+    global _flusher
+    _flusher = None
+    with _lock:
+        _requests.clear()
+        _durations.clear()
+        _sql.clear()
+
+
+def clear_dir():
+    """ลบ snapshot เก่า (เรียกตอน gunicorn master เริ่ม)"""
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        os.remove(path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def collect(engine):
+    """snapshot ของทุก worker (ของ process นี้ใช้ค่าปัจจุบัน)"""
+    own = snapshot(engine)
+    if not METRICS_DIR:
+        return [own]
+    flush(own)
+    snapshots = [own]
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if data.get('pid') != own['pid']:
+            data['alive'] = _alive(data['pid'])
+            snapshots.append(data)
+    return snapshots
+
+
+# ---- แสดงผล ----
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Output:
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: list ของ (labels dict, value)"""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            self.lines.append(f'{name}{_labels(**labels)} {_format(value)}')
+
+    def histogram(self, name, help_text, series):
+        """series: list ของ (labels dict, [จำนวนต่อ bucket ..., +Inf, ผลรวม])"""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} histogram')
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+                cumulative += count
+                self.lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+            self.lines.append(f'{name}_sum{_labels(**labels)} {_format(values[-1])}')
+            self.lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _add(target, key, values):
+    current = target.get(key)
+    target[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+
+def render(engine):
+    """ข้อความ /metrics รวมค่าจากทุก worker"""
+    snapshots = collect(engine)
+    live = [s for s in snapshots if s.get('alive', True)]
+
+    requests, durations, sql = {}, {}, {}
+    for snap in snapshots:
+        for e, m, status, n in snap['requests']:
+            _add(requests, (e, m, status), [n])
+        for e, m, values in snap['durations']:
+            _add(durations, (e, m), values)
+        for e, n, seconds in snap['sql']:
+            _add(sql, e, [n, seconds])
+
+    out = _Output()
+    out.metric('app_workers', 'gauge', 'Worker processes reporting metrics', [({}, len(live))])
+    out.metric('app_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status',
+               [({'endpoint': e, 'method': m, 'status': s}, v[0]) for (e, m, s), v in sorted(requests.items())])
+    out.histogram('app_http_request_duration_seconds', 'HTTP request latency including streamed body',
+                  [({'endpoint': e, 'method': m}, v) for (e, m), v in sorted(durations.items())])
+    out.metric('app_db_statements_total', 'counter', 'SQL statements executed, by endpoint',
+               [({'endpoint': e}, v[0]) for e, v in sorted(sql.items())])
+    out.metric('app_db_time_seconds_total', 'counter', 'Time spent executing SQL, by endpoint',
+               [({'endpoint': e}, v[1]) for e, v in sorted(sql.items())])
+
+    pools = [s['pool'] for s in snapshots if s.get('pool')]
+    live_pools = [s['pool'] for s in live if s.get('pool')]
+    if pools:
+        for key, name, help_text in (('checkouts', 'checkouts', 'Connections checked out from the pool'),
+                                     ('connects', 'connects', 'New DBAPI connections opened'),
+                                     ('invalidations', 'invalidations', 'Connections invalidated'),
+                                     ('wait_seconds_total', 'wait_seconds', 'Time spent waiting for a free connection')):
+            out.metric(f'app_db_pool_{name}_total', 'counter', help_text, [({}, sum(p[key] for p in pools))])
+        out.metric('app_db_pool_connections', 'gauge', 'Pooled connections by state',
+                   [({'state': 'checked_out'}, sum(p['checked_out'] for p in live_pools)),
+                    ({'state': 'checked_in'}, sum(p['checked_in'] for p in live_pools))])
+        out.metric('app_db_pool_overflow', 'gauge', 'Connections opened beyond pool size',
+                   [({}, sum(max(p['overflow'], 0) for p in live_pools))])
+        out.metric('app_db_pool_size', 'gauge', 'Configured pool size (all workers)',
+                   [({}, sum(p['pool_size'] for p in live_pools))])
+
+    hits, misses, entries, evictions = [], [], [], []
+    for name in ('result', 'user'):
+        h = sum(s['caches'][name]['hits'] for s in snapshots)
+        m = sum(s['caches'][name]['misses'] for s in snapshots)
+        hits.append(({'cache': name}, h))
+        misses.append(({'cache': name}, m))
+        entries.append(({'cache': name}, sum(s['caches'][name]['entries'] for s in live)))
+        evictions.append(({'cache': name}, sum(s['caches'][name].get('evictions', 0) for s in snapshots)))
+    out.metric('app_cache_hits_total', 'counter', 'Cache hits', hits)
+    out.metric('app_cache_misses_total', 'counter', 'Cache misses', misses)
+    out.metric('app_cache_hit_ratio', 'gauge', 'Cache hits / lookups since start',
+               [(labels, round(h / (h + m), 4) if h + m else 0.0) for (labels, h), (_l, m) in zip(hits, misses)])
+    out.metric('app_cache_entries', 'gauge', 'Entries held in cache', entries)
+    out.metric('app_cache_evictions_total', 'counter', 'Entries evicted by LRU', evictions)
+
+    stores = [s['analytics'] for s in snapshots if s.get('analytics')]
+    if stores:
+        live_stores = [s['analytics'] for s in live if s.get('analytics')]
+        out.metric('app_analytics_store_loads_total', 'counter', 'Full reloads of the column store',
+                   [({}, sum(a['loads'] for a in stores))])
+        out.metric('app_analytics_store_patches_total', 'counter', 'Incremental patches of the column store',
+                   [({}, sum(a['patches'] for a in stores))])
+        out.metric('app_analytics_store_bytes', 'gauge', 'Memory held by column store arrays',
+                   [({}, sum(a['bytes'] for a in live_stores))])
+    out.metric('app_categories', 'gauge', 'Categories in the in-memory dictionary',
+               [({}, max((s['categories'] for s in live), default=0))])
+
+    imports = [s['imports'] for s in snapshots]
+    rows = {k: sum(i[f'rows_{k}'] for i in imports) for k in ('inserted', 'rejected', 'skipped', 'replaced')}
+    seconds = sum(i['seconds_total'] for i in imports)
+    out.metric('app_imports_total', 'counter', 'CSV imports loaded', [({}, sum(i['imports'] for i in imports))])
+    out.metric('app_import_rows_total', 'counter', 'Imported CSV rows by result',
+               [({'result': k}, v) for k, v in rows.items()])
+    out.metric('app_import_duration_seconds_total', 'counter', 'Time spent loading CSV rows', [({}, seconds)])
+    out.metric('app_import_rows_per_second', 'gauge', 'Average inserted rows per second since start',
+               [({}, round(rows['inserted'] / seconds, 1) if seconds else 0.0)])
+    return out.text()
+
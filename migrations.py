@@ -0,0 +1,275 @@
+"""
+ระบบ migration ของฐานข้อมูลแบบมีเวอร์ชัน (ใช้ได้ทั้ง SQLite และ PostgreSQL)
+
+แต่ละ migration ทำงานใน transaction ของตัวเอง และบันทึกเวอร์ชันที่ทำแล้วไว้ในตาราง schema_migrations
+เรียกอัตโนมัติตอนเริ่มแอป (ปิดได้ด้วย AUTO_MIGRATE=0) หรือผ่าน CLI:
+
+    flask --app app_main db-upgrade
+    flask --app app_main db-status
+    flask --app app_main db-check
+"""
+
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select, text
+from sqlalchemy.orm import Session as OrmSession
+
+from models import Base, User, Category, Entry, EntryType, DailyTotal, MonthlyTotal, ImportJob, DataVersion
+import categories
+import rollup
+import search
+import user_cache
+
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# กุญแจสำหรับ pg_advisory_xact_lock กันหลาย worker รัน migration พร้อมกัน
+_PG_LOCK_KEY = 728301
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """ลงทะเบียนฟังก์ชัน fn(conn) เป็น migration เวอร์ชัน version"""
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return decorator
+
+
+def create_index(conn, table_name, index_name):
+    """สร้างดัชนีตามที่ประกาศไว้ใน models.py (ข้ามถ้ามีอยู่แล้ว)"""
+    table = Base.metadata.tables[table_name]
+    index = next(i for i in table.indexes if i.name == index_name)
+    index.create(conn, checkfirst=True)
+
+
+def has_column(conn, table_name, column_name):
+    return column_name in {c['name'] for c in inspect(conn).get_columns(table_name)}
+
+
+def add_column(conn, table_name, column_name):
+    """เพิ่มคอลัมน์ตามที่ประกาศไว้ใน models.py ให้ตารางที่มีอยู่แล้ว (ข้ามถ้ามีอยู่แล้ว)"""
+    if has_column(conn, table_name, column_name):
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    ddl = column.type.compile(dialect=conn.dialect)
+    if column.default is not None and column.default.is_scalar:
+        ddl += f" DEFAULT {column.default.arg!r}"
+    conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}'))
+
+
+def entries_normalized(conn):
+    """entries อยู่ในรูปแบบปัจจุบัน (category_id + type เป็นเลข) แล้วหรือยัง (ดู migration 10)"""
+    return has_column(conn, 'entries', 'category_id')
+
+
+def _type_code_sql(column_name):
+    """CASE ที่แปลงชื่อประเภทแบบเดิมเป็นรหัสตาม EntryType"""
+    return f"CASE {column_name} WHEN 'income' THEN {EntryType.CODES['income']} ELSE {EntryType.CODES['expense']} END"
+
+
+@migration(1, 'create users and entries tables')
+def _create_base_tables(conn):
+    User.__table__.create(conn, checkfirst=True)
+    # entries.category_id อ้างถึง categories จึงต้องสร้างก่อน (ข้อมูลเริ่มต้นใส่ใน migration 10)
+    Category.__table__.create(conn, checkfirst=True)
+    Entry.__table__.create(conn, checkfirst=True)
+
+
+@migration(2, 'create daily_totals rollup table')
+def _create_daily_totals(conn):
+    DailyTotal.__table__.create(conn, checkfirst=True)
+    # การสร้างตารางสรุปเขียน monthly_totals และเพิ่มตัวนับใน data_version ด้วย จึงต้องมีตารางเหล่านี้ก่อน
+    # (ข้อมูลเริ่มต้นของทั้งสองตารางใส่ใน migration 6 และ 7)
+    MonthlyTotal.__table__.create(conn, checkfirst=True)
+    DataVersion.__table__.create(conn, checkfirst=True)
+    # ตาราง entries แบบเก่า (amount แบบ Float / หมวดหมู่เป็นข้อความ) จะได้ตารางสรุปใน migration 8 หรือ 10
+    if has_column(conn, 'entries', 'amount_satang') and entries_normalized(conn):
+        s = OrmSession(bind=conn)
+        rollup.ensure_daily_totals(s)
+        s.close()
+
+
+@migration(3, 'add composite indexes on entries')
+def _add_entry_indexes(conn):
+    create_index(conn, 'entries', 'ix_entries_date_type')
+    create_index(conn, 'entries', 'ix_entries_created_at_id')
+    # entries แบบเก่ายังไม่มี category_id ดัชนีนี้สร้างใน migration 10
+    if entries_normalized(conn):
+        create_index(conn, 'entries', 'ix_entries_category_date')
+
+
+@migration(4, 'create import_jobs table')
+def _create_import_jobs(conn):
+    ImportJob.__table__.create(conn, checkfirst=True)
+
+
+@migration(5, 'add import fingerprints to entries')
+def _add_entry_fingerprints(conn):
+    # แถวเดิมมี fingerprint เป็น NULL เพราะไม่รู้ไฟล์/บรรทัดต้นทาง
+    add_column(conn, 'entries', 'fingerprint')
+    create_index(conn, 'entries', 'ux_entries_fingerprint')
+    for name in ('mode', 'rows_skipped', 'rows_replaced'):
+        add_column(conn, 'import_jobs', name)
+
+
+@migration(6, 'create data_version counter')
+def _create_data_version(conn):
+    DataVersion.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(DataVersion.id)).first() is None:
+        conn.execute(DataVersion.__table__.insert().values(id=1, generation=0))
+
+
+@migration(7, 'create monthly_totals period index')
+def _create_monthly_totals(conn):
+    MonthlyTotal.__table__.create(conn, checkfirst=True)
+    # daily_totals แบบเก่า (total เป็น Float) ถูกสร้างใหม่ใน migration 8
+    if has_column(conn, 'daily_totals', 'total_satang') and entries_normalized(conn) and \
+            conn.execute(select(MonthlyTotal.year)).first() is None:
+        s = OrmSession(bind=conn)
+        rows = rollup.rebuild_monthly_totals(s)
+        s.close()
+        print(f"📊 สร้างตาราง monthly_totals ({rows} แถว)")
+
+
+@migration(8, 'store amounts as integer satang')
+def _amounts_to_satang(conn):
+    rebuild = False
+    if has_column(conn, 'entries', 'amount'):
+        add_column(conn, 'entries', 'amount_satang')
+        conn.execute(text('UPDATE entries SET amount_satang = CAST(ROUND(amount * 100) AS BIGINT)'))
+        conn.execute(text('ALTER TABLE entries DROP COLUMN amount'))
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('ALTER TABLE entries ALTER COLUMN amount_satang SET NOT NULL'))
+        rebuild = True
+    # ตารางสรุปสร้างใหม่จาก entries แทนการแปลง total แบบ Float ที่อาจมีเศษสะสม
+    for model in (DailyTotal, MonthlyTotal):
+        if has_column(conn, model.__tablename__, 'total'):
+            model.__table__.drop(conn)
+            model.__table__.create(conn)
+            rebuild = True
+    if rebuild and entries_normalized(conn):
+        s = OrmSession(bind=conn)
+        rows = rollup.rebuild_daily_totals(s)
+        s.close()
+        print(f"📊 สร้างตารางสรุปใหม่เป็นหน่วยสตางค์ ({rows} แถว)")
+
+
+@migration(9, 'add full-text search index on entries')
+def _add_search_index(conn):
+    # ดัชนีอ่านชื่อหมวดหมู่จาก categories ตาราง entries แบบเก่าจะได้ดัชนีใน migration 10
+    if entries_normalized(conn) and search.install(conn):
+        print("🔎 สร้างดัชนีค้นหา entries เรียบร้อย")
+
+
+@migration(10, 'normalize categories and store entry type as small int')
+def _normalize_categories(conn):
+    Category.__table__.create(conn, checkfirst=True)
+    added = categories.seed(conn)
+    if added:
+        print(f"🏷️  เพิ่มหมวดหมู่มาตรฐาน {added} รายการ")
+    if entries_normalized(conn):
+        return
+
+    search.uninstall(conn)
+    # หมวดหมู่ที่กรอกเอง/นำเข้าไว้ก่อนหน้า ต่อท้ายหมวดหมู่มาตรฐาน
+    conn.execute(text(
+        f"INSERT INTO categories (name, type, sort_order) "
+        f"SELECT DISTINCT e.category, {_type_code_sql('e.type')}, {categories.CUSTOM_SORT_ORDER} FROM entries e "
+        f"WHERE NOT EXISTS (SELECT 1 FROM categories c "
+        f"WHERE c.name = e.category AND c.type = {_type_code_sql('e.type')})"
+    ))
+    # ดัชนีเดิมอ้างคอลัมน์ type/category ต้องลบก่อนลบคอลัมน์ (สร้างใหม่ด้านล่าง)
+    conn.execute(text('DROP INDEX IF EXISTS ix_entries_date_type'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_entries_category_date'))
+    add_column(conn, 'entries', 'category_id')
+    conn.execute(text(
+        f"UPDATE entries SET category_id = (SELECT c.id FROM categories c "
+        f"WHERE c.name = entries.category AND c.type = {_type_code_sql('entries.type')})"
+    ))
+    conn.execute(text('ALTER TABLE entries RENAME COLUMN type TO type_name'))
+    add_column(conn, 'entries', 'type')
+    conn.execute(text(f"UPDATE entries SET type = {_type_code_sql('type_name')}"))
+    conn.execute(text('ALTER TABLE entries DROP COLUMN type_name'))
+    conn.execute(text('ALTER TABLE entries DROP COLUMN category'))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE entries ALTER COLUMN type SET NOT NULL'))
+        conn.execute(text('ALTER TABLE entries ALTER COLUMN category_id SET NOT NULL'))
+        conn.execute(text('ALTER TABLE entries ADD CONSTRAINT entries_category_id_fkey '
+                          'FOREIGN KEY (category_id) REFERENCES categories (id)'))
+    create_index(conn, 'entries', 'ix_entries_date_type')
+    create_index(conn, 'entries', 'ix_entries_category_date')
+
+    # ตารางสรุปเก็บ type เป็นเลขแล้ว สร้างใหม่จาก entries
+    for model in (DailyTotal, MonthlyTotal):
+        model.__table__.drop(conn, checkfirst=True)
+        model.__table__.create(conn)
+    s = OrmSession(bind=conn)
+    rows = rollup.rebuild_daily_totals(s)
+    s.close()
+    print(f"📊 สร้างตารางสรุปใหม่ ({rows} แถว)")
+    if search.install(conn):
+        print("🔎 สร้างดัชนีค้นหา entries ใหม่เรียบร้อย")
+
+
+@migration(11, 'add users version counter')
+def _add_users_version(conn):
+    if conn.execute(select(DataVersion.id).where(DataVersion.id == user_cache.USERS_VERSION_ID)).first() is None:
+        conn.execute(DataVersion.__table__.insert().values(id=user_cache.USERS_VERSION_ID, generation=0))
+
+
+def _lock(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('SELECT pg_advisory_xact_lock(:k)'), {'k': _PG_LOCK_KEY})
+
+
+def _applied_versions(conn):
+    return {v for (v,) in conn.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(engine):
+    """รัน migration ที่ยังไม่ได้ทำตามลำดับเวอร์ชัน คืนค่ารายการ (version, name) ที่เพิ่งทำ"""
+    with engine.begin() as conn:
+        _lock(conn)
+        schema_migrations.create(conn, checkfirst=True)
+
+    done = []
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        with engine.begin() as conn:
+            _lock(conn)
+            if version in _applied_versions(conn):
+                continue
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        print(f"🛠️  migration {version}: {name}")
+        done.append((version, name))
+    return done
+
+
+def status(engine):
+    """รายการ (version, name, applied_at หรือ None) ของ migration ทั้งหมด"""
+    applied = {}
+    if inspect(engine).has_table('schema_migrations'):
+        with engine.connect() as conn:
+            applied = {r.version: r.applied_at for r in conn.execute(select(schema_migrations))}
+    return [(v, name, applied.get(v)) for v, name, _ in sorted(MIGRATIONS, key=lambda m: m[0])]
+
+
+def missing_indexes(engine):
+    """ดัชนีที่ประกาศใน models.py แต่ไม่มีในฐานข้อมูลจริง: [(table, index_name), ...]"""
+    insp = inspect(engine)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            missing.extend((table.name, i.name) for i in table.indexes)
+            continue
+        existing = {i['name'] for i in insp.get_indexes(table.name)}
+        missing.extend((table.name, i.name) for i in table.indexes if i.name not in existing)
+    return missing
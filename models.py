@@ -1,8 +1,11 @@
 from datetime import datetime
-from sqlalchemy import (Column, Integer, String, Date, DateTime, Float, Text, Boolean)
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import (Column, Integer, SmallInteger, BigInteger, String, Date, DateTime, Text, Boolean, Index)
+from sqlalchemy.orm import declarative_base, relationship, object_session
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy import create_engine, ForeignKey
 
+import money
+
 Base = declarative_base()
 
 class User(Base):
@@ -15,15 +18,115 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class EntryType(TypeDecorator):
+    """ประเภทรายการเก็บในฐานข้อมูลเป็นเลขจำนวนเต็มเล็ก (1 = income, 2 = expense) ใน Python เป็นข้อความเหมือนเดิม"""
+    impl = SmallInteger
+    cache_ok = True
+
+    CODES = {'income': 1, 'expense': 2}
+    NAMES = {code: name for name, code in CODES.items()}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value not in self.CODES:
+            raise ValueError(f'ประเภทต้องเป็น income หรือ expense (ได้ {value!r})')
+        return self.CODES[value]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.NAMES[value]
+
+class Category(Base):
+    """พจนานุกรมหมวดหมู่ entries อ้างถึงด้วย id แทนการเก็บชื่อซ้ำทุกแถว (ดู categories.py)"""
+    __tablename__ = 'categories'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(120), nullable=False)
+    type = Column(EntryType, nullable=False)
+    sort_order = Column(Integer, nullable=False, default=0)  # ลำดับในฟอร์ม หมวดหมู่ที่เพิ่มเองต่อท้าย
+
+    __table_args__ = (
+        Index('ux_categories_type_name', 'type', 'name', unique=True),
+    )
+
 class Entry(Base):
     __tablename__ = 'entries'
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
-    type = Column(String(10), nullable=False)  # 'income' or 'expense'
-    category = Column(String(120), nullable=False)
+    type = Column(EntryType, nullable=False)  # 'income' or 'expense'
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
     description = Column(Text, default='')
-    amount = Column(Float, nullable=False)
+    amount_satang = Column(BigInteger, nullable=False)  # จำนวนเงินหน่วยสตางค์
     created_by = Column(Integer, ForeignKey('users.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
+    fingerprint = Column(String(64))  # sha256 ของแถวที่นำเข้าจาก CSV (NULL สำหรับรายการที่กรอกเอง)
 
     user = relationship('User')
+
+    # ดัชนีสำหรับ Dashboard/กราฟ (date, type), หน้ารายการ (created_at, id) และรายงานตามหมวดหมู่
+    # ux_entries_fingerprint กันการนำเข้าแถวเดิมซ้ำ (NULL ซ้ำกันได้)
+    __table_args__ = (
+        Index('ix_entries_date_type', 'date', 'type'),
+        Index('ix_entries_created_at_id', 'created_at', 'id'),
+        Index('ix_entries_category_date', 'category_id', 'date'),
+        Index('ux_entries_fingerprint', 'fingerprint', unique=True),
+    )
+
+    @property
+    def amount(self):
+        """จำนวนเงินหน่วยบาทสำหรับฟอร์มและหน้าเว็บ (query ให้ใช้ amount_satang)"""
+        return None if self.amount_satang is None else money.to_baht(self.amount_satang)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_satang = money.to_satang(value)
+
+    @property
+    def category(self):
+        """ชื่อหมวดหมู่จาก dictionary ในหน่วยความจำ (แก้หมวดหมู่ให้ตั้ง category_id ผ่าน categories.resolve)"""
+        import categories
+        return categories.name_of(self.category_id, object_session(self))
+
+class DailyTotal(Base):
+    """ยอดสรุปรายวันต่อ (วันที่, ประเภท, หมวดหมู่) ปรับปรุงทุกครั้งที่มีการเขียน entries"""
+    __tablename__ = 'daily_totals'
+    date = Column(Date, primary_key=True)
+    type = Column(EntryType, primary_key=True)
+    category = Column(String(120), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total_satang = Column(BigInteger, nullable=False, default=0)
+
+class MonthlyTotal(Base):
+    """ดัชนีรายเดือนต่อ (ปี, เดือน, ประเภท) ปรับปรุงพร้อม daily_totals ใช้กับตัวเลือกเดือน/ปี"""
+    __tablename__ = 'monthly_totals'
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    type = Column(EntryType, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total_satang = Column(BigInteger, nullable=False, default=0)
+
+class ImportJob(Base):
+    """งานนำเข้า CSV ที่ทำงานเบื้องหลัง พร้อมความคืบหน้าสำหรับให้หน้าเว็บ poll"""
+    __tablename__ = 'import_jobs'
+    id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, done, failed
+    mode = Column(String(10), default='skip')  # skip, replace, fail (เมื่อพบแถวที่เคยนำเข้าแล้ว)
+    filename = Column(String(255))
+    created_by = Column(Integer, ForeignKey('users.id'))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    rows_total = Column(Integer, default=0)
+    rows_parsed = Column(Integer, default=0)
+    rows_inserted = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    rows_skipped = Column(Integer, default=0)
+    rows_replaced = Column(Integer, default=0)
+    message = Column(Text, default='')
+    errors = Column(Text, default='[]')  # JSON รายการข้อผิดพลาดรายบรรทัด
+
+class DataVersion(Base):
+    """ตัวนับรุ่นของข้อมูล เพิ่มขึ้นใน transaction เดียวกับการเขียน ให้ทุก worker เห็นการเปลี่ยนแปลงพร้อมกัน
+    id=1 การเขียน entries (ส่วนหนึ่งของคีย์ cache) id=2 การแก้ไขผู้ใช้ (ตรวจ snapshot ใน user_cache)"""
+    __tablename__ = 'data_version'
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
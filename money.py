@@ -0,0 +1,28 @@
+"""
+จำนวนเงินเก็บเป็นจำนวนเต็มหน่วยสตางค์ (1 บาท = 100 สตางค์)
+
+ฐานข้อมูลและการรวมยอดใช้สตางค์ทั้งหมด (SUM บนจำนวนเต็ม ไม่มีเศษทศนิยมสะสม)
+แปลงเป็นบาทเฉพาะที่ขอบระบบ: ฟอร์ม, ไฟล์นำเข้า/ส่งออก และ JSON/หน้าเว็บ
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+SATANG_PER_BAHT = 100
+
+
+def to_satang(value):
+    """แปลงจำนวนเงินบาท (Decimal, str, int, float) เป็นสตางค์ ปัดครึ่งขึ้นที่ทศนิยม 2 ตำแหน่ง"""
+    baht = value if isinstance(value, Decimal) else Decimal(str(value))
+    return int((baht * SATANG_PER_BAHT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_baht(satang):
+    """สตางค์เป็นบาท (float) สำหรับแสดงผลและ JSON"""
+    return (satang or 0) / SATANG_PER_BAHT
+
+
+def format_baht(satang):
+    """สตางค์เป็นข้อความบาทแบบทศนิยม 2 ตำแหน่งที่ตรงตัว เช่น 12345 -> '123.45'"""
+    sign = '-' if satang < 0 else ''
+    baht, rest = divmod(abs(satang), SATANG_PER_BAHT)
+    return f'{sign}{baht}.{rest:02d}'
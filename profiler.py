@@ -0,0 +1,290 @@
+"""
+โปรไฟล์ request ตามสั่ง (admin เท่านั้น)
+
+เปิดด้วย query ?_profile=1 หรือ header X-Profile: 1 ใน route ใดก็ได้ request ที่ไม่ได้ขอ
+เสียแค่การตรวจ query/header หนึ่งครั้ง (ปิดทั้งหมดได้ด้วย PROFILER_ENABLED=0)
+
+ระหว่าง request มี thread สุ่มอ่าน stack ของ thread ที่รัน request ทุก PROFILE_INTERVAL_MS
+(sys._current_frames) น้ำหนักของแต่ละ sample คือเวลาจริงตั้งแต่ sample ก่อนหน้า
+thread ที่รัน Python ล้วนคืน GIL ทุก sys.getswitchinterval() (ปกติ 5 ms) ระหว่างโปรไฟล์จึงลดค่านี้
+เหลือเท่า interval ชั่วคราว (มีผลทั้ง process จนโปรไฟล์สุดท้ายจบ)
+SQL ทุก statement มาจาก cursor ของ metrics.py (ข้อความและเวลาจริงรวม fetch ผลลัพธ์ ไม่ใช่การสุ่ม)
+จบตอน teardown จึงรวมเวลาส่ง streaming response เช่น /export/csv
+
+ผลเก็บเป็นไฟล์ JSON ใน PROFILE_DIR (ใช้ร่วมกันทุก gunicorn worker) เก็บล่าสุด PROFILE_KEEP ไฟล์:
+    hotspots   ฟังก์ชันที่ใช้เวลามากที่สุด (self และรวมฟังก์ชันที่เรียก) PROFILE_TOP อันดับ
+    sql        เวลารวมของ SQL และ statement ที่ใช้เวลามากที่สุด (จัดกลุ่มตามข้อความ)
+    collapsed  stack แบบ collapsed ("a;b;c น้ำหนัก") เปิดใน speedscope.app หรือ flamegraph.pl ได้
+ดูได้ที่ /admin/profiles
+"""
+
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import metrics
+
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '1') != '0'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'itbs-profiles'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 1))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', 25))
+
+QUERY_FLAG = '_profile'
+HEADER = 'X-Profile'
+ID_PATTERN = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{6}$')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_local = threading.local()
+_switch_lock = threading.Lock()
+_switch = {'active': 0, 'saved': None}
+_labels = {}  # code object -> ชื่อที่แสดงใน stack
+
+
+# ---- เก็บ sample ----
+
+def _short(filename):
+    if filename.startswith(ROOT + os.sep):
+        return os.path.relpath(filename, ROOT)
+    marker = filename.rfind('site-packages' + os.sep)
+    if marker >= 0:
+        return filename[marker + len('site-packages') + 1:]
+    return os.path.basename(filename)
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        # ; และช่องว่างท้ายบรรทัดมีความหมายในรูปแบบ collapsed
+        label = f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+        _labels[code] = label
+    return label
+
+
+class Sampler:
+    """thread ที่อ่าน stack ของ thread_id ทุก interval วินาที รวมเวลาต่อ stack (root ก่อน)"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        with _switch_lock:
+            if _switch['active'] == 0:
+                _switch['saved'] = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, _switch['saved']))
+            _switch['active'] += 1
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            _switch['active'] -= 1
+            if _switch['active'] == 0:
+                sys.setswitchinterval(_switch['saved'])
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + (now - last)
+            self.samples += 1
+            last = now
+
+
+# ---- hook ของ Flask ----
+
+def requested(request):
+    return request.args.get(QUERY_FLAG) not in (None, '0') or request.headers.get(HEADER) not in (None, '0')
+
+
+def _is_admin(user):
+    return bool(getattr(user, 'is_authenticated', False)) and getattr(user, 'role', None) == 'admin'
+
+
+def begin(request, user):
+    if not requested(request) or not _is_admin(user):
+        return
+    sampler = Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    _local.active = {
+        'id': f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}",
+        'path': request.full_path.rstrip('?'),
+        'method': request.method,
+        'endpoint': request.endpoint,
+        'user': user.username,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'status': None,
+        'sampler': sampler,
+        'statements': metrics.capture_statements(),
+        'started': time.perf_counter(),
+    }
+    sampler.start()
+
+
+def note_response(response):
+    active = getattr(_local, 'active', None)
+    if active is not None:
+        active['status'] = response.status_code
+        response.headers['X-Profile-Id'] = active['id']
+    return response
+
+
+def end(exc=None):
+    active = getattr(_local, 'active', None)
+    if active is None:
+        return
+    _local.active = None
+    elapsed = time.perf_counter() - active['started']
+    sampler = active['sampler']
+    sampler.stop()
+    if exc is not None:
+        active['status'] = 500
+    try:
+        save(summarize(active, sampler, elapsed))
+    except Exception as e:
+        print(f"⚠️  บันทึกโปรไฟล์ไม่ได้: {e}")
+
+
+def init_app(app):
+    if not PROFILER_ENABLED:
+        return
+    from flask import request
+    from flask_login import current_user
+
+    @app.before_request
+    def _begin_profile():
+        begin(request, current_user)
+
+    app.after_request(note_response)
+
+    @app.teardown_request
+    def _end_profile(exc=None):
+        end(exc)
+
+
+# ---- สรุปผล ----
+
+def summarize(active, sampler, elapsed):
+    """แปลง sample และ SQL ของ request เป็น dict ที่บันทึกเป็น JSON ได้"""
+    sampled = sum(sampler.stacks.values()) or 1.0
+    self_time = {}
+    total_time = {}
+    for stack, seconds in sampler.stacks.items():
+        self_time[stack[-1]] = self_time.get(stack[-1], 0.0) + seconds
+        for label in set(stack):
+            total_time[label] = total_time.get(label, 0.0) + seconds
+    hotspots = sorted(self_time, key=self_time.get, reverse=True)[:PROFILE_TOP]
+
+    statements = {}
+    for statement, seconds in active['statements']:
+        totals = statements.setdefault(' '.join(statement.split()), [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+    sql_seconds = sum(t[1] for t in statements.values())
+    top_sql = sorted(statements.items(), key=lambda item: item[1][1], reverse=True)[:PROFILE_TOP]
+
+    return {
+        'id': active['id'],
+        'path': active['path'],
+        'method': active['method'],
+        'endpoint': active['endpoint'],
+        'status': active['status'],
+        'user': active['user'],
+        'started_at': active['started_at'],
+        'duration_ms': round(elapsed * 1000, 2),
+        'samples': sampler.samples,
+        'interval_ms': PROFILE_INTERVAL_MS,
+        'sql': {
+            'statements': sum(t[0] for t in statements.values()),
+            'ms': round(sql_seconds * 1000, 2),
+            'share': round(sql_seconds / elapsed * 100, 1) if elapsed else 0.0,
+            'top': [{'statement': text, 'count': n, 'total_ms': round(total * 1000, 2),
+                     'max_ms': round(longest * 1000, 2)}
+                    for text, (n, total, longest) in top_sql],
+        },
+        'hotspots': [{'function': label,
+                      'self_ms': round(self_time[label] * 1000, 2),
+                      'total_ms': round(total_time[label] * 1000, 2),
+                      'self_pct': round(self_time[label] / sampled * 100, 1)}
+                     for label in hotspots],
+        # น้ำหนักเป็นไมโครวินาที
+        'collapsed': [f"{';'.join(stack)} {max(int(seconds * 1_000_000), 1)}"
+                      for stack, seconds in sorted(sampler.stacks.items())],
+    }
+
+
+# ---- จัดเก็บ ----
+
+def _path(profile_id):
+    return os.path.join(PROFILE_DIR, f'{profile_id}.json')
+
+
+def save(profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp = _path(profile['id']) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(profile, f, ensure_ascii=False)
+    os.replace(tmp, _path(profile['id']))
+    for old in _ids()[PROFILE_KEEP:]:
+        try:
+            os.remove(_path(old))
+        except OSError:
+            pass
+
+
+def _ids():
+    """id ของโปรไฟล์ที่เก็บไว้ ใหม่สุดก่อน (id ขึ้นต้นด้วยเวลา)"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted((n[:-5] for n in names if n.endswith('.json') and ID_PATTERN.match(n[:-5])), reverse=True)
+
+
+def load(profile_id):
+    """โปรไฟล์ตาม id หรือ None ถ้าไม่พบ"""
+    if not ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def recent():
+    """สรุปของโปรไฟล์ที่เก็บไว้ (ไม่รวม stack) ใหม่สุดก่อน"""
+    profiles = []
+    for profile_id in _ids():
+        profile = load(profile_id)
+        if profile is None:
+            continue
+        profile.pop('collapsed', None)
+        profile['top_hotspot'] = profile['hotspots'][0]['function'] if profile['hotspots'] else None
+        profiles.append(profile)
+    return profiles
+
+
+def collapsed_text(profile):
+    return '\n'.join(profile['collapsed']) + '\n'
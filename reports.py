@@ -0,0 +1,300 @@
+"""
+รายงานสรุปรายรับ-รายจ่ายตามช่วงเวลา (วัน/สัปดาห์/เดือน/ปี)
+
+คำนวณจากที่เก็บคอลัมน์ในหน่วยความจำ (analytics.py) ถ้าเปิดใช้งาน
+ไม่เช่นนั้นใช้ GROUP BY ครั้งเดียวบนตาราง daily_totals
+รองรับทั้ง SQLite (พัฒนา) และ PostgreSQL (Railway)
+"""
+
+import calendar
+from datetime import date, timedelta
+from sqlalchemy import func, cast, case, and_, Date
+
+from models import DailyTotal, MonthlyTotal, EntryType
+import money
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+MAX_BUCKETS = 5000
+TYPES = tuple(EntryType.CODES)
+
+
+def _store(s):
+    """ที่เก็บคอลัมน์ในหน่วยความจำ (None ถ้าปิดใช้งาน) import analytics/NumPy เมื่อมีรายงานแรกเท่านั้น"""
+    import analytics
+    return analytics.current(s)
+
+
+def bucket_start(d, granularity):
+    """วันแรกของช่วงที่วันที่ d สังกัดอยู่ (สัปดาห์เริ่มวันจันทร์)"""
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'year':
+        return d.replace(month=1, day=1)
+    return d
+
+
+def next_bucket(d, granularity):
+    if granularity == 'week':
+        return d + timedelta(days=7)
+    if granularity == 'month':
+        return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+    if granularity == 'year':
+        return date(d.year + 1, 1, 1)
+    return d + timedelta(days=1)
+
+
+def iter_buckets(start, end, granularity):
+    d = bucket_start(start, granularity)
+    while d <= end:
+        yield d
+        try:
+            d = next_bucket(d, granularity)
+        except (OverflowError, ValueError):
+            return  # ช่วงสุดท้ายก่อน date.max
+
+
+def bucket_expr(dialect, granularity, col):
+    """นิพจน์ SQL ที่ให้ค่าวันแรกของช่วงตาม dialect ของฐานข้อมูล"""
+    if dialect == 'postgresql':
+        if granularity == 'day':
+            return col
+        return cast(func.date_trunc(granularity, col), Date)
+    # SQLite เก็บวันที่เป็นข้อความ YYYY-MM-DD
+    if granularity == 'week':
+        return func.date(col, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', col)
+    if granularity == 'year':
+        return func.strftime('%Y-01-01', col)
+    return func.date(col)
+
+
+def aggregate_series(s, start, end, granularity='day'):
+    """
+    ยอดรายรับ/รายจ่ายแยกตามช่วง ตั้งแต่ start ถึง end
+    คืนค่า dict ที่มี buckets (วันแรกของแต่ละช่วง), incomes, expenses โดยช่วงที่ไม่มีข้อมูลเป็น 0
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity ต้องเป็นหนึ่งใน {", ".join(GRANULARITIES)}')
+    if start > end:
+        raise ValueError('วันที่เริ่มต้นต้องไม่เกินวันที่สิ้นสุด')
+
+    buckets = list(iter_buckets(start, end, granularity))
+    if len(buckets) > MAX_BUCKETS:
+        raise ValueError(f'ช่วงเวลายาวเกินไป (สูงสุด {MAX_BUCKETS} ช่วง)')
+
+    keys = [b.isoformat() for b in buckets]
+    result = {
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': keys,
+    }
+
+    store = _store(s)
+    if store is not None:
+        series = store.series(buckets, start, end)
+        result['incomes'] = [money.to_baht(v) for v in series['income']]
+        result['expenses'] = [money.to_baht(v) for v in series['expense']]
+        return result
+
+    sums = _sql_series(s, start, end, granularity)
+    result['incomes'] = [money.to_baht(sums.get((k, 'income'), 0)) for k in keys]
+    result['expenses'] = [money.to_baht(sums.get((k, 'expense'), 0)) for k in keys]
+    return result
+
+
+def _sql_series(s, start, end, granularity):
+    """{(วันแรกของช่วง YYYY-MM-DD, type): total_satang} จาก daily_totals"""
+    dialect = s.get_bind().dialect.name
+    bucket = bucket_expr(dialect, granularity, DailyTotal.date).label('bucket')
+    rows = s.query(bucket, DailyTotal.type, func.sum(DailyTotal.total_satang)).filter(
+        DailyTotal.date >= start, DailyTotal.date <= end
+    ).group_by(bucket, DailyTotal.type).all()
+    return {(str(b)[:10], t): int(v) for b, t, v in rows}
+
+
+def check_store(s, start, end):
+    """
+    เทียบยอดต่อช่วงจากที่เก็บคอลัมน์กับ SQL ทุก granularity ระหว่าง start ถึง end
+    คืน list ของ (granularity, bucket, type, store, sql) ที่ไม่ตรงกัน (ว่างถ้าตรงกันหมดหรือปิด store)
+    """
+    store = _store(s)
+    if store is None:
+        return []
+    mismatches = []
+    for granularity in GRANULARITIES:
+        buckets = list(iter_buckets(start, end, granularity))
+        series = store.series(buckets, start, end)
+        sums = _sql_series(s, start, end, granularity)
+        for i, b in enumerate(buckets):
+            for t in TYPES:
+                expected = sums.get((b.isoformat(), t), 0)
+                if series[t][i] != expected:
+                    mismatches.append((granularity, b, t, series[t][i], expected))
+    return mismatches
+
+
+def dashboard_kpis(s, today):
+    """
+    ยอดวันนี้/เดือนนี้/ปีนี้ และยอดย้อนหลัง 7 วัน ด้วย SQL statement เดียว (conditional aggregation)
+    """
+    month_start = date(today.year, today.month, 1)
+    year_start = date(today.year, 1, 1)
+    week_dates = [today - timedelta(days=i) for i in range(6, -1, -1)]
+
+    store = _store(s)
+    if store is not None:
+        values = []
+        for start in (today, month_start, year_start):
+            totals = store.range_totals(start, today)
+            values += [totals['income'][1], totals['expense'][1]]
+        series = store.series(week_dates, week_dates[0], today)
+        for i in range(7):
+            values += [series['income'][i], series['expense'][i]]
+        return _kpis_from_row(values, week_dates)
+
+    def total_when(t, *conds):
+        return func.coalesce(func.sum(case((and_(DailyTotal.type == t, *conds), DailyTotal.total_satang), else_=0)), 0)
+
+    columns = []
+    for start in (today, month_start, year_start):
+        columns.append(total_when('income', DailyTotal.date >= start))
+        columns.append(total_when('expense', DailyTotal.date >= start))
+    for d in week_dates:
+        columns.append(total_when('income', DailyTotal.date == d))
+        columns.append(total_when('expense', DailyTotal.date == d))
+
+    row = s.query(*columns).filter(
+        DailyTotal.date >= min(year_start, week_dates[0]), DailyTotal.date <= today
+    ).one()
+    return _kpis_from_row(row, week_dates)
+
+
+def _kpis_from_row(row, week_dates):
+    """row: ยอดสตางค์ income/expense ของวันนี้, เดือนนี้, ปีนี้ แล้วตามด้วย 7 วันล่าสุด"""
+    # ผลรวมเป็นสตางค์ (จำนวนเต็ม) แปลงเป็นบาทหลังลบกันแล้ว
+    kpis = {}
+    for i, prefix in enumerate(('t', 'm', 'y')):
+        inc, exp = int(row[i * 2]), int(row[i * 2 + 1])
+        kpis[f'{prefix}_inc'] = money.to_baht(inc)
+        kpis[f'{prefix}_exp'] = money.to_baht(exp)
+        kpis[f'{prefix}_net'] = money.to_baht(inc - exp)
+
+    offset = 6
+    last7 = {
+        'labels': [d.isoformat() for d in week_dates],
+        'incomes': [money.to_baht(row[offset + i * 2]) for i in range(7)],
+        'expenses': [money.to_baht(row[offset + i * 2 + 1]) for i in range(7)],
+    }
+    return kpis, last7
+
+
+def available_periods(s):
+    """
+    เดือน/ปีที่มีข้อมูล เรียงจากล่าสุด พร้อมจำนวนรายการและยอดรวม อ่านจาก monthly_totals
+    ขนาดของผลลัพธ์ขึ้นกับจำนวนเดือนที่มีข้อมูล ไม่ใช่จำนวน entries หรือจำนวนวัน
+    """
+    rows = s.query(MonthlyTotal).order_by(MonthlyTotal.year.desc(), MonthlyTotal.month.desc()).all()
+    periods = {}
+    for r in rows:
+        p = periods.setdefault((r.year, r.month), {'year': r.year, 'month': r.month, 'count': 0,
+                                                   'income': 0, 'expense': 0})
+        p['count'] += r.count
+        p[r.type] = money.to_baht(r.total_satang)
+    return list(periods.values())
+
+
+def category_breakdown(s, start, end, type=None):
+    """
+    ยอดแยกตามหมวดหมู่ระหว่าง start ถึง end เรียงจากยอดมากไปน้อย
+    คืนค่า list ของ {category, type, count, total}
+    """
+    if start > end:
+        raise ValueError('วันที่เริ่มต้นต้องไม่เกินวันที่สิ้นสุด')
+    if type is not None and type not in TYPES:
+        raise ValueError('type ต้องเป็น income หรือ expense')
+
+    store = _store(s)
+    if store is not None:
+        rows = store.category_totals(start, end, type)
+    else:
+        q = s.query(DailyTotal.category, DailyTotal.type, func.sum(DailyTotal.count),
+                    func.sum(DailyTotal.total_satang)).filter(
+            DailyTotal.date >= start, DailyTotal.date <= end
+        )
+        if type is not None:
+            q = q.filter(DailyTotal.type == type)
+        rows = q.group_by(DailyTotal.category, DailyTotal.type).all()
+
+    result = [{'category': c, 'type': t, 'count': int(n), 'total': money.to_baht(v)}
+              for c, t, n, v in rows]
+    result.sort(key=lambda r: (-r['total'], r['type'], r['category']))
+    return result
+
+
+def range_summary(s, start, end, type=None, category=None):
+    """
+    จำนวนรายการและยอดรวมของช่วงวันที่ใด ๆ (กรองตามประเภท/หมวดหมู่ได้)
+    จากที่เก็บในหน่วยความจำใช้ Fenwick tree (prefix sum สองครั้ง) ไม่เช่นนั้น SUM บน daily_totals
+    """
+    if start > end:
+        raise ValueError('วันที่เริ่มต้นต้องไม่เกินวันที่สิ้นสุด')
+    if type is not None and type not in TYPES:
+        raise ValueError('type ต้องเป็น income หรือ expense')
+
+    store = _store(s)
+    if store is not None:
+        totals = store.range_summary(start, end, category)
+    else:
+        q = s.query(DailyTotal.type, func.sum(DailyTotal.count), func.sum(DailyTotal.total_satang)).filter(
+            DailyTotal.date >= start, DailyTotal.date <= end
+        )
+        if category is not None:
+            q = q.filter(DailyTotal.category == category)
+        totals = {t: (0, 0) for t in TYPES}
+        totals.update({t: (int(n), int(v)) for t, n, v in q.group_by(DailyTotal.type)})
+
+    result = {'from': start.isoformat(), 'to': end.isoformat(), 'type': type, 'category': category}
+    for t in ([type] if type else TYPES):
+        count, total = totals[t]
+        result[t] = {'count': count, 'total': money.to_baht(total)}
+    if type is None:
+        result['net'] = money.to_baht(totals['income'][1] - totals['expense'][1])
+    return result
+
+
+def check_month(year, month):
+    """ValueError ถ้า year/month ไม่ใช่เดือนที่ใช้ได้"""
+    if not 1 <= month <= 12:
+        raise ValueError('month ต้องอยู่ระหว่าง 1 ถึง 12')
+    if not date.min.year <= year <= date.max.year:
+        raise ValueError(f'year ต้องอยู่ระหว่าง {date.min.year} ถึง {date.max.year}')
+
+
+def month_chart(s, year, month):
+    """ยอดรายวันทั้งเดือนในรูปแบบที่กราฟบน Dashboard ใช้"""
+    check_month(year, month)
+    days_in_month = calendar.monthrange(year, month)[1]
+    series = aggregate_series(s, date(year, month, 1), date(year, month, days_in_month), 'day')
+    return {
+        'labels': [f"{day}/{month}" for day in range(1, days_in_month + 1)],
+        'incomes': series['incomes'],
+        'expenses': series['expenses'],
+        'month': month,
+        'year': year,
+    }
+
+
+def dashboard_payload(s, today):
+    """ข้อมูลทั้งหมดที่หน้า Dashboard ต้องใช้ในครั้งเดียว"""
+    kpis, last7 = dashboard_kpis(s, today)
+    return {
+        'today': today.isoformat(),
+        'kpis': kpis,
+        'last7': last7,
+        'periods': available_periods(s),
+        'chart': month_chart(s, today.year, today.month),
+    }
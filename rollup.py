@@ -0,0 +1,269 @@
+"""
+ตารางสรุปยอดรายวัน (daily_totals) และรายเดือน (monthly_totals)
+
+ทุกเส้นทางที่เขียนตาราง entries (เพิ่ม/แก้ไข/ลบ/นำเข้า) ต้องส่ง delta มาที่นี่
+ภายใน transaction เดียวกัน เพื่อให้ Dashboard และรายงานอ่านจากตารางสรุป
+แทนการสแกน entries ทั้งหมด ยอดเงินทั้งหมดเป็นจำนวนเต็มหน่วยสตางค์
+"""
+
+from collections import defaultdict
+from sqlalchemy import event, func, extract, cast, Integer
+from sqlalchemy.orm import Session as OrmSession
+
+from models import Entry, Category, DailyTotal, MonthlyTotal, DataVersion
+import money
+
+# ฟังก์ชันที่จะถูกเรียกหลัง commit ที่มีการเปลี่ยนแปลง entries
+_listeners = []
+
+
+def on_commit(fn):
+    """
+    ลงทะเบียน fn(deltas, versions) ให้ถูกเรียกหลัง commit; deltas เป็น None เมื่อข้อมูลถูกล้าง/สร้างใหม่ทั้งหมด
+    versions คือ (generation ก่อน, generation หลัง) transaction นี้ ใช้ตรวจว่า delta ต่อจากข้อมูลที่ถืออยู่พอดีหรือไม่
+    """
+    _listeners.append(fn)
+    return fn
+
+
+def _mark_changed(s, deltas):
+    pending = s.info.setdefault('rollup_pending', [])
+    pending.append(deltas)
+    bump_generation(s)
+
+
+def bump_generation(s):
+    """เพิ่มตัวนับรุ่นของข้อมูลใน transaction เดียวกับการเขียน (cache ที่อิงรุ่นเดิมจะไม่ถูกใช้อีก)"""
+    s.query(DataVersion).filter(DataVersion.id == 1).update(
+        {DataVersion.generation: DataVersion.generation + 1}, synchronize_session=False
+    )
+
+
+def current_generation(s):
+    return s.query(DataVersion.generation).filter(DataVersion.id == 1).scalar() or 0
+
+
+@event.listens_for(OrmSession, 'before_commit')
+def _read_generation_before_commit(s):
+    # แถว data_version ถูกล็อกโดย UPDATE ของ transaction นี้ ค่าที่อ่านได้จึงเป็นรุ่นหลัง commit พอดี
+    if s.info.get('rollup_pending'):
+        s.info['rollup_generation'] = current_generation(s)
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _dispatch_after_commit(s):
+    pending = s.info.pop('rollup_pending', None)
+    generation = s.info.pop('rollup_generation', None)
+    if not pending:
+        return
+    versions = (generation - len(pending), generation) if generation is not None else None
+    if any(d is None for d in pending):
+        merged = None
+    else:
+        merged = new_deltas()
+        for deltas in pending:
+            for key, (count, total) in deltas.items():
+                merged[key][0] += count
+                merged[key][1] += total
+    for fn in _listeners:
+        try:
+            fn(merged, versions)
+        except Exception as e:
+            print(f"rollup listener error: {e}")
+
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _discard_after_rollback(s):
+    s.info.pop('rollup_pending', None)
+    s.info.pop('rollup_generation', None)
+
+
+def entry_key(e):
+    """คีย์ของแถวสรุปที่ entry นี้สังกัดอยู่"""
+    return (e.date, e.type, e.category)
+
+
+def new_deltas():
+    """ตัวสะสม delta: {(date, type, category): [count, total_satang]}"""
+    return defaultdict(lambda: [0, 0])
+
+
+def add_entry(deltas, e, sign=1):
+    """สะสม delta ของ entry หนึ่งรายการ (sign=-1 เมื่อเป็นการลบ)"""
+    add_values(deltas, e.date, e.type, e.category, e.amount_satang, sign)
+
+
+def add_values(deltas, d, t, c, amount_satang, sign=1):
+    """เหมือน add_entry แต่รับค่าตรง ๆ สำหรับแถวที่ไม่ได้เป็น ORM object (bulk insert)"""
+    acc = deltas[(d, t, c)]
+    acc[0] += sign
+    acc[1] += sign * int(amount_satang)
+
+
+def apply_deltas(s, deltas):
+    """เขียน delta ลง daily_totals (ยังไม่ commit ให้ผู้เรียก commit พร้อม entries)"""
+    if not deltas:
+        return
+    _mark_changed(s, deltas)
+    changes = {k: v for k, v in deltas.items() if v[0] != 0 or v[1] != 0}
+    # โหลดแถวสรุปของทุกวันที่เกี่ยวข้องในไม่กี่ query แทนการ SELECT ทีละคีย์
+    dates = sorted({k[0] for k in changes})
+    existing = {}
+    for i in range(0, len(dates), 500):
+        q = s.query(DailyTotal).filter(DailyTotal.date.in_(dates[i:i + 500])).with_for_update()
+        existing.update({entry_key(r): r for r in q})
+    for (d, t, c), (count, total) in changes.items():
+        row = existing.get((d, t, c))
+        if row is None:
+            row = DailyTotal(date=d, type=t, category=c, count=0, total_satang=0)
+            s.add(row)
+        row.count += count
+        row.total_satang += total
+        if row.count <= 0:
+            s.delete(row)
+    _apply_monthly(s, changes)
+
+
+def _apply_monthly(s, changes):
+    """รวม delta รายวันเป็นรายเดือนแล้วเขียนลง monthly_totals"""
+    monthly = new_deltas()
+    for (d, t, c), (count, total) in changes.items():
+        acc = monthly[(d.year, d.month, t)]
+        acc[0] += count
+        acc[1] += total
+    years = sorted({k[0] for k in monthly})
+    if not years:
+        return
+    q = s.query(MonthlyTotal).filter(MonthlyTotal.year.in_(years)).with_for_update()
+    existing = {(r.year, r.month, r.type): r for r in q}
+    for (y, m, t), (count, total) in monthly.items():
+        if count == 0 and total == 0:
+            continue
+        row = existing.get((y, m, t))
+        if row is None:
+            row = MonthlyTotal(year=y, month=m, type=t, count=0, total_satang=0)
+            s.add(row)
+        row.count += count
+        row.total_satang += total
+        if row.count <= 0:
+            s.delete(row)
+
+
+def record_insert(s, e):
+    deltas = new_deltas()
+    add_entry(deltas, e)
+    apply_deltas(s, deltas)
+
+
+def record_delete(s, e):
+    deltas = new_deltas()
+    add_entry(deltas, e, -1)
+    apply_deltas(s, deltas)
+
+
+def record_update(s, old, e):
+    """old คือ tuple (date, type, category, amount_satang) ก่อนแก้ไข"""
+    deltas = new_deltas()
+    d = deltas[old[:3]]
+    d[0] -= 1
+    d[1] -= int(old[3])
+    add_entry(deltas, e)
+    apply_deltas(s, deltas)
+
+
+def snapshot(e):
+    return (e.date, e.type, e.category, e.amount_satang)
+
+
+def clear(s):
+    s.query(DailyTotal).delete()
+    s.query(MonthlyTotal).delete()
+    _mark_changed(s, None)
+
+
+def rebuild_daily_totals(s):
+    """สร้างตารางสรุปใหม่ทั้งหมดจาก entries ด้วย INSERT ... SELECT ... GROUP BY"""
+    clear(s)
+    # GROUP BY บน category_id (จำนวนเต็ม) แล้วค่อย JOIN เอาชื่อหมวดหมู่ของแต่ละกลุ่ม
+    grouped = s.query(
+        Entry.date.label('date'), Entry.type.label('type'), Entry.category_id.label('category_id'),
+        func.count(Entry.id).label('count'), func.coalesce(func.sum(Entry.amount_satang), 0).label('total')
+    ).group_by(Entry.date, Entry.type, Entry.category_id).subquery()
+    select = s.query(grouped.c.date, grouped.c.type, Category.name, grouped.c.count, grouped.c.total) \
+        .join(Category, Category.id == grouped.c.category_id)
+    insert = DailyTotal.__table__.insert().from_select(
+        ['date', 'type', 'category', 'count', 'total_satang'], select
+    )
+    s.execute(insert)
+    _fill_monthly_totals(s)
+    s.commit()
+    return s.query(DailyTotal).count()
+
+
+def _fill_monthly_totals(s):
+    """เติม monthly_totals จาก daily_totals (ตารางต้องว่างอยู่ก่อน)"""
+    year = cast(extract('year', DailyTotal.date), Integer)
+    month = cast(extract('month', DailyTotal.date), Integer)
+    select = s.query(
+        year, month, DailyTotal.type, func.sum(DailyTotal.count), func.sum(DailyTotal.total_satang)
+    ).group_by(year, month, DailyTotal.type)
+    s.execute(MonthlyTotal.__table__.insert().from_select(
+        ['year', 'month', 'type', 'count', 'total_satang'], select
+    ))
+
+
+def rebuild_monthly_totals(s):
+    """สร้าง monthly_totals ใหม่จาก daily_totals"""
+    s.query(MonthlyTotal).delete()
+    _fill_monthly_totals(s)
+    s.commit()
+    return s.query(MonthlyTotal).count()
+
+
+def ensure_daily_totals(s):
+    """สร้างตารางสรุปครั้งแรกสำหรับฐานข้อมูลเดิมที่มีข้อมูลอยู่แล้ว"""
+    if s.query(DailyTotal.date).first() is None and s.query(Entry.id).first() is not None:
+        rows = rebuild_daily_totals(s)
+        print(f"📊 สร้างตาราง daily_totals ใหม่ ({rows} แถว)")
+
+
+def sums_between(s, start, end):
+    """ยอดรายรับ, รายจ่าย, กำไร (บาท) ระหว่างวันที่ start ถึง end (รวมปลายทั้งสองด้าน)"""
+    rows = s.query(DailyTotal.type, func.sum(DailyTotal.total_satang)).filter(
+        DailyTotal.date >= start, DailyTotal.date <= end
+    ).group_by(DailyTotal.type).all()
+    totals = {t: money.to_baht(v) for t, v in rows}
+    inc_sum = totals.get('income', 0)
+    exp_sum = totals.get('expense', 0)
+    return inc_sum, exp_sum, inc_sum - exp_sum
+
+
+def daily_sums(s, start, end):
+    """ยอดรายวัน {date: (income, expense)} (บาท) ระหว่าง start ถึง end"""
+    rows = s.query(DailyTotal.date, DailyTotal.type, func.sum(DailyTotal.total_satang)).filter(
+        DailyTotal.date >= start, DailyTotal.date <= end
+    ).group_by(DailyTotal.date, DailyTotal.type).all()
+    result = {}
+    for d, t, v in rows:
+        inc, exp = result.get(d, (0, 0))
+        if t == 'income':
+            inc += money.to_baht(v)
+        else:
+            exp += money.to_baht(v)
+        result[d] = (inc, exp)
+    return result
+
+
+# จำนวน entries ทั้งหมด เก็บไว้ในหน่วยความจำคู่กับรุ่นของข้อมูล (data_version ใช้ร่วมกันทุก worker
+# การเขียนจาก process อื่นจึงทำให้ค่าที่เก็บไว้ไม่ถูกใช้อีก)
+_count_cache = {}
+
+
+def total_entries(s):
+    """จำนวน entries ทั้งหมด (รวม count จาก daily_totals แทน COUNT(*) บน entries)"""
+    generation = current_generation(s)
+    cached = _count_cache.get('total')
+    if cached is None or cached[0] != generation:
+        total = int(s.query(func.coalesce(func.sum(DailyTotal.count), 0)).scalar())
+        cached = _count_cache['total'] = (generation, total)
+    return cached[1]
@@ -0,0 +1,190 @@
+"""
+ค้นหารายการจากหมวดหมู่และรายละเอียด (full-text)
+
+ภาษาไทยไม่เว้นวรรคระหว่างคำ จึงใช้ดัชนีแบบ trigram (ทุก 3 ตัวอักษร) แทนการตัดคำ:
+    SQLite      ตาราง FTS5 entries_fts (tokenize='trigram') แบบ external content อ่านข้อความจาก view
+                entry_search_text (ชื่อหมวดหมู่ + รายละเอียด) และมี trigger คอยเพิ่ม/แก้/ลบให้ตรงกับ entries
+                เรียงผลด้วย bm25
+    PostgreSQL  ดัชนี GIN แบบ pg_trgm บนรายละเอียด ค้นด้วย ILIKE ส่วนหมวดหมู่ใช้ subquery บนตาราง categories
+                (ตารางเล็ก) แล้วกรองด้วย category_id เรียงผลด้วย word_similarity
+
+คำค้นแยกด้วยช่องว่าง ทุกคำต้องพบ (AND) คำที่สั้นกว่า 3 ตัวอักษรใช้ดัชนีไม่ได้จึงกรองด้วย LIKE
+ถ้าผลลัพธ์เกิน SEARCH_RANK_LIMIT แถว การเรียงตามความเกี่ยวข้องต้องคำนวณคะแนนทุกแถว (ช้าบนข้อมูลหลักล้าน)
+จึงเรียงจากรายการล่าสุดแทน ซึ่งอ่านจากดัชนีตามลำดับ id ได้ทันที
+ถ้าฐานข้อมูลไม่มีดัชนี (SQLite ที่ไม่มี FTS5/trigram) จะค้นด้วย LIKE ทั้งหมดเรียงตามวันที่
+"""
+
+import os
+
+from sqlalchemy import table, column, literal_column, text, func, or_, and_, select
+
+from models import Entry, Category
+
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+SEARCH_RANK_LIMIT = int(os.environ.get('SEARCH_RANK_LIMIT', 5000))
+MAX_TERMS = 8
+MAX_PAGE = 500
+MIN_INDEXED_LENGTH = 3
+
+# นิพจน์เดียวกับที่ใช้สร้างดัชนีบน PostgreSQL (planner ใช้ดัชนีได้เมื่อนิพจน์ตรงกัน)
+PG_DOCUMENT = "coalesce(description, '')"
+
+_NEW_NAME = "(SELECT name FROM categories WHERE id = new.category_id)"
+_OLD_NAME = "(SELECT name FROM categories WHERE id = old.category_id)"
+
+_SQLITE_DDL = [
+    "CREATE VIEW IF NOT EXISTS entry_search_text AS SELECT e.id AS id, c.name AS category, "
+    "e.description AS description FROM entries e JOIN categories c ON c.id = e.category_id",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+    "category, description, content='entry_search_text', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN "
+    f"INSERT INTO entries_fts(rowid, category, description) VALUES (new.id, {_NEW_NAME}, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN "
+    "INSERT INTO entries_fts(entries_fts, rowid, category, description) "
+    f"VALUES ('delete', old.id, {_OLD_NAME}, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF category_id, description ON entries BEGIN "
+    "INSERT INTO entries_fts(entries_fts, rowid, category, description) "
+    f"VALUES ('delete', old.id, {_OLD_NAME}, old.description); "
+    f"INSERT INTO entries_fts(rowid, category, description) VALUES (new.id, {_NEW_NAME}, new.description); END",
+    "INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')",
+]
+
+_PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_entries_search_trgm ON entries USING gin (({PG_DOCUMENT}) gin_trgm_ops)",
+]
+
+_SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS entries_fts_ai",
+    "DROP TRIGGER IF EXISTS entries_fts_ad",
+    "DROP TRIGGER IF EXISTS entries_fts_au",
+    "DROP TABLE IF EXISTS entries_fts",
+    "DROP VIEW IF EXISTS entry_search_text",
+]
+
+_PG_DROP = [
+    "DROP INDEX IF EXISTS ix_entries_search_trgm",
+]
+
+_engines = {}  # url ของฐานข้อมูล -> 'fts5' | 'pg_trgm' | 'like'
+
+
+def install(conn):
+    """สร้างดัชนีค้นหาและ trigger คืนค่า True ถ้าสำเร็จ (ถ้าฐานข้อมูลไม่รองรับจะใช้ LIKE แทน)"""
+    ddl = _PG_DDL if conn.dialect.name == 'postgresql' else _SQLITE_DDL
+    try:
+        with conn.begin_nested():
+            for statement in ddl:
+                conn.execute(text(statement))
+    except Exception as e:
+        print(f"⚠️  สร้างดัชนีค้นหาไม่ได้ ({e}) จะค้นหาด้วย LIKE แทน")
+        return False
+    finally:
+        _engines.clear()
+    return True
+
+
+def uninstall(conn):
+    """ลบดัชนีค้นหาและ trigger (ก่อนเปลี่ยนโครงสร้างตาราง entries)"""
+    for statement in (_PG_DROP if conn.dialect.name == 'postgresql' else _SQLITE_DROP):
+        conn.execute(text(statement))
+    _engines.clear()
+
+
+def engine_name(s):
+    """วิธีค้นหาที่ฐานข้อมูลนี้รองรับ (ตรวจครั้งเดียวต่อ process)"""
+    bind = s.get_bind()
+    key = str(bind.url)
+    if key not in _engines:
+        if bind.dialect.name == 'postgresql':
+            found = s.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_entries_search_trgm'")).first()
+            _engines[key] = 'pg_trgm' if found else 'like'
+        else:
+            found = s.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'")).first()
+            _engines[key] = 'fts5' if found else 'like'
+    return _engines[key]
+
+
+def parse_terms(q):
+    return [t for t in (q or '').split()][:MAX_TERMS]
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _contains(term, description):
+    """
+    เงื่อนไข: ชื่อหมวดหมู่หรือรายละเอียดมีคำนี้
+    อ่านชื่อจากตาราง categories ใน query เดียวกัน (ไม่ใช้พจนานุกรมในหน่วยความจำ ซึ่งอาจยังไม่รู้จัก
+    หมวดหมู่ที่ worker อื่นเพิ่งสร้าง)
+    """
+    pattern = _like_pattern(term)
+    named = select(Category.id).where(Category.name.ilike(pattern, escape='\\'))
+    return or_(Entry.category_id.in_(named), description.ilike(pattern, escape='\\'))
+
+
+def search(s, q, start=None, end=None, type=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    ค้นหารายการตามคำค้น q (กรองช่วงวันที่/ประเภทได้) เรียงตามความเกี่ยวข้อง
+    คืนค่า dict: items (Entry), page, has_next, engine, ranked (False = เรียงจากรายการล่าสุด)
+    """
+    terms = parse_terms(q)
+    if not terms:
+        raise ValueError('กรุณาระบุคำค้นหา')
+    if type is not None and type not in ('income', 'expense'):
+        raise ValueError('type ต้องเป็น income หรือ expense')
+    page = min(max(page, 1), MAX_PAGE)
+
+    engine = engine_name(s)
+    indexed = [t for t in terms if len(t) >= MIN_INDEXED_LENGTH]
+    if not indexed:
+        engine = 'like'
+
+    query = s.query(Entry.id)
+    if engine == 'fts5':
+        fts = table('entries_fts', column('rowid'))
+        match = ' '.join('"' + t.replace('"', '""') + '"' for t in indexed)
+        query = query.join(fts, fts.c.rowid == Entry.id).filter(text('entries_fts MATCH :match')).params(match=match)
+        rest = [t for t in terms if len(t) < MIN_INDEXED_LENGTH]
+        order = [text('bm25(entries_fts, 2.0, 1.0)')]
+        # เรียงตาม rowid ของ FTS เอง ตารางเสมือนส่งแถวตามลำดับได้โดยไม่ต้อง sort
+        newest = fts.c.rowid.desc()
+    elif engine == 'pg_trgm':
+        document = literal_column(PG_DOCUMENT)
+        query = query.filter(and_(*(_contains(t, document) for t in terms)))
+        rest = []
+        order = [func.word_similarity(q, document).desc()]
+        newest = Entry.id.desc()
+    else:
+        rest = terms
+        order = []
+        newest = Entry.id.desc()
+
+    # นับเฉพาะผลจากดัชนีแบบมีเพดาน (ตัวกรองอื่นมีแต่ทำให้ผลลดลง) เกินเพดานแล้วไม่ต้องนับต่อ
+    ranked = bool(order) and s.query(func.count()).select_from(
+        query.limit(SEARCH_RANK_LIMIT + 1).subquery()
+    ).scalar() <= SEARCH_RANK_LIMIT
+    order = order + [Entry.date.desc(), Entry.id.desc()] if ranked else [newest]
+
+    for term in rest:
+        query = query.filter(_contains(term, Entry.description))
+    if start is not None:
+        query = query.filter(Entry.date >= start)
+    if end is not None:
+        query = query.filter(Entry.date <= end)
+    if type is not None:
+        query = query.filter(Entry.type == type)
+
+    ids = [row[0] for row in query.order_by(*order).offset((page - 1) * per_page).limit(per_page + 1)]
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    by_id = {e.id: e for e in s.query(Entry).filter(Entry.id.in_(ids))} if ids else {}
+    return {
+        'items': [by_id[i] for i in ids if i in by_id],
+        'page': page,
+        'has_next': has_next,
+        'engine': engine,
+        'ranked': ranked,
+    }
@@ -0,0 +1,34 @@
+"""
+fixture ร่วมของชุดทดสอบ: ฐานข้อมูล SQLite ชั่วคราวหนึ่งไฟล์ต่อการรัน (ทำ migration ครบ)
+แต่ละ test เริ่มจากตาราง entries และตารางสรุปที่ว่าง
+"""
+
+import os
+import tempfile
+
+# ต้องกำหนดก่อน import app_main (อ่าน DATABASE_URL ตอน import)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='itbs-test-'), 'test.db')
+os.environ.setdefault('PROFILER_ENABLED', '0')
+
+import pytest
+
+import app_main
+import rollup
+from models import Entry
+
+
+@pytest.fixture(scope='session')
+def db():
+    app_main.init_db()
+    return app_main.Session
+
+
+@pytest.fixture
+def session(db):
+    s = db()
+    yield s
+    s.rollback()
+    s.query(Entry).delete()
+    rollup.clear(s)
+    s.commit()
+    db.remove()
@@ -0,0 +1,80 @@
+"""การนำเข้า CSV: fingerprint กับโหมด skip/replace/fail และเลขบรรทัดในรายงานข้อผิดพลาด"""
+
+from datetime import date
+
+import pytest
+
+import bulk_loader
+import import_engine
+import rollup
+from models import Entry
+
+CSV = (
+    'date,type,category,description,amount\n'
+    '2024-01-01,income,ขายสินค้า,ลูกค้า A,100.00\n'
+    '2024-01-01,income,ขายสินค้า,ลูกค้า A,100.00\n'
+    '2024-01-02,expense,ค่าเช่า,,50.25\n'
+).encode('utf-8')
+
+
+def load(s, content, mode):
+    frame, errors = import_engine.parse_csv(content)
+    assert errors == []
+    return bulk_loader.load_entries(s, import_engine.iter_rows(frame), created_by=None, mode=mode)
+
+
+def test_identical_rows_in_one_file_get_distinct_fingerprints():
+    frame, _ = import_engine.parse_csv(CSV)
+    assert frame['fingerprint'].nunique() == 3
+
+
+def test_fingerprints_survive_rows_added_above():
+    frame, _ = import_engine.parse_csv(CSV)
+    header, rest = CSV.split(b'\n', 1)
+    shifted, _ = import_engine.parse_csv(header + '\n2023-12-31,income,อื่นๆ,,1\n'.encode('utf-8') + rest)
+    assert set(frame['fingerprint']) <= set(shifted['fingerprint'])
+
+
+def test_skip_mode_ignores_rows_already_imported(session):
+    first = load(session, CSV, 'skip')
+    assert (first.inserted, first.skipped) == (3, 0)
+    again = load(session, CSV, 'skip')
+    assert (again.inserted, again.skipped, again.replaced) == (0, 3, 0)
+    assert session.query(Entry).count() == 3
+
+
+def test_replace_mode_swaps_rows_and_keeps_totals(session):
+    load(session, CSV, 'skip')
+    again = load(session, CSV, 'replace')
+    assert (again.inserted, again.skipped, again.replaced) == (3, 0, 3)
+    assert session.query(Entry).count() == 3
+    assert rollup.total_entries(session) == 3
+    # แถวเดิมถูกหักออกจากตารางสรุปก่อนเพิ่มแถวใหม่ ยอดจึงไม่ซ้ำซ้อน
+    assert rollup.sums_between(session, date(2024, 1, 1), date(2024, 1, 31)) == (200.0, 50.25, 149.75)
+
+
+def test_fail_mode_rejects_whole_file_before_writing(session):
+    load(session, CSV, 'skip')
+    header, rest = CSV.split(b'\n', 1)
+    overlapping = header + '\n2024-02-01,income,ขายสินค้า,ใหม่,10\n'.encode('utf-8') + rest
+    with pytest.raises(bulk_loader.DuplicateImportError) as raised:
+        load(session, overlapping, 'fail')
+    assert raised.value.count == 3
+    assert session.query(Entry).count() == 3
+
+
+def test_fail_mode_imports_new_file(session):
+    report = load(session, CSV, 'fail')
+    assert report.inserted == 3
+
+
+@pytest.mark.parametrize('content, valid_lines, error_lines', [
+    (b'date,amount\n2024-01-01,10\n\n2024-01-02,abc\n', [2], [4]),
+    (b'\n\ndate,amount\n2024-01-01,abc\n', [], [4]),
+    (b'date,amount,description\n2024-01-01,10,"two\nlines"\n2024-01-02,abc,x\n', [2], [4]),
+    (b'date,amount\r\n2024-01-01,10\r\n   \r\n,,\r\n2024-01-02,abc\r\n', [2], [4, 5]),
+])
+def test_rows_keep_physical_line_numbers(content, valid_lines, error_lines):
+    frame, errors = import_engine.parse_csv(content)
+    assert list(frame['line']) == valid_lines
+    assert [e['line'] for e in errors] == error_lines
@@ -0,0 +1,71 @@
+"""การแบ่งหน้า /entries แบบ keyset: token ของ cursor และการเดินหน้า/ถอยหลังโดยไม่ข้ามหรือซ้ำรายการ"""
+
+import re
+from datetime import date, datetime, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app_main
+import categories
+from models import Entry, User
+
+EDIT_LINK = re.compile(r'/entry/(\d+)/edit')
+NEXT_LINK = re.compile(r'href="(/entries\?after=[^"]+)"')
+PREV_LINK = re.compile(r'href="(/entries\?before=[^"]+)"')
+
+
+def test_cursor_round_trips_created_at_and_id():
+    e = Entry(id=12345, created_at=datetime(2024, 2, 29, 23, 59, 58, 123456))
+    token = app_main.encode_cursor(e)
+    assert '=' not in token and '/' not in token and '+' not in token
+    assert app_main.decode_cursor(token) == (e.created_at, e.id)
+
+
+@pytest.mark.parametrize('token', ['!!!', 'bm9waXBl', 'MjAyNC0wMS0wMXx4', 'eHx5'])
+def test_bad_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        app_main.decode_cursor(token)
+
+
+@pytest.fixture
+def client(session):
+    if not session.query(User).filter_by(username='pager').first():
+        session.add(User(username='pager', email='pager@example.com', role='admin', is_active=True,
+                         password_hash=generate_password_hash('pager-pass')))
+        session.commit()
+    client = app_main.create_app().test_client()
+    assert client.post('/login', data={'username': 'pager', 'password': 'pager-pass'}).status_code == 302
+    return client
+
+
+def ids_on(page):
+    return [int(i) for i in dict.fromkeys(EDIT_LINK.findall(page))]
+
+
+def test_pages_cover_every_entry_once(session, client):
+    category_id = categories.resolve_many(session, [('income', 'ขายสินค้า')])[('income', 'ขายสินค้า')]
+    # รายการนำเข้าพร้อมกันมี created_at เดียวกัน ต้องแยกกันด้วย id
+    imported_at = datetime(2024, 3, 1, 12, 0, 0)
+    for i in range(55):
+        created_at = imported_at if i < 45 else imported_at + timedelta(seconds=i)
+        session.add(Entry(date=date(2024, 3, 1), type='income', category_id=category_id, description='',
+                          amount_satang=100, created_at=created_at))
+    session.commit()
+    expected = [e.id for e in session.query(Entry).order_by(Entry.created_at.desc(), Entry.id.desc())]
+
+    pages = []
+    url = '/entries'
+    while url:
+        page = client.get(url).get_data(as_text=True)
+        pages.append(ids_on(page))
+        found = NEXT_LINK.search(page)
+        url = found.group(1).replace('&amp;', '&') if found else None
+    assert [i for p in pages for i in p] == expected
+    assert all(len(p) == 20 for p in pages[:-1])
+
+    # ถอยหลังจากหน้าสุดท้ายต้องได้หน้าเดิมกลับมาตามลำดับ
+    for previous in reversed(pages[:-1]):
+        url = PREV_LINK.search(page).group(1).replace('&amp;', '&')
+        page = client.get(url).get_data(as_text=True)
+        assert ids_on(page) == previous
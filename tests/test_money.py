@@ -0,0 +1,74 @@
+"""การปัดเศษสตางค์แบบครึ่งขึ้น (ROUND_HALF_UP) ที่ฟอร์ม ORM และการนำเข้า CSV ใช้ร่วมกัน"""
+
+from decimal import Decimal, InvalidOperation
+
+import pytest
+
+import import_engine
+import money
+from models import Entry
+
+
+@pytest.mark.parametrize('baht, satang', [
+    ('10.005', 1001),
+    ('0.125', 13),
+    ('1.005', 101),
+    ('0.124', 12),
+    ('100', 10000),
+    ('0', 0),
+    ('-0.125', -13),
+    ('-1.005', -101),
+    ('-10.004', -1000),
+])
+def test_to_satang_rounds_half_up(baht, satang):
+    assert money.to_satang(baht) == satang
+    assert money.to_satang(Decimal(baht)) == satang
+
+
+def test_to_satang_uses_decimal_text_of_floats():
+    # 1.005 เป็น float คือ 1.00499999... ถ้าคูณด้วย float ตรง ๆ จะได้ 100
+    assert money.to_satang(1.005) == 101
+    assert money.to_satang(10.005) == 1001
+
+
+@pytest.mark.parametrize('value', ['NaN', 'Infinity', '-Infinity'])
+def test_to_satang_rejects_non_finite(value):
+    with pytest.raises((InvalidOperation, ValueError)):
+        money.to_satang(Decimal(value))
+
+
+def test_format_baht_round_trips():
+    for satang in (0, 1, 99, 1001, -13, 123456789):
+        assert money.to_satang(money.format_baht(satang)) == satang
+
+
+def test_entry_amount_setter_matches_to_satang():
+    e = Entry()
+    e.amount = '0.125'
+    assert e.amount_satang == 13
+    e.amount = 1.005
+    assert e.amount_satang == 101
+
+
+@pytest.mark.parametrize('text, satang', [
+    ('10.005', 1001),
+    ('0.125', 13),
+    ('1.005', 101),
+    ('-0.125', -13),
+    ('1e3', 100000),
+])
+def test_parse_satang_matches_form_path(text, satang):
+    assert import_engine.parse_satang(text) == satang
+
+
+@pytest.mark.parametrize('text', ['abc', '', 'nan', 'NaN', 'inf', '-Infinity', '1e30', '1.2.3'])
+def test_parse_satang_rejects_unusable_amounts(text):
+    assert import_engine.parse_satang(text) is None
+
+
+def test_parse_csv_reports_rejected_amounts():
+    frame, errors = import_engine.parse_csv(
+        b'date,amount\n2024-01-01,0.125\n2024-01-02,nan\n2024-01-03,-1.005\n2024-01-04,1e30\n')
+    assert list(frame['amount_satang']) == [13, 101]
+    assert list(frame['type']) == ['income', 'expense']
+    assert [e['line'] for e in errors] == [3, 5]
@@ -0,0 +1,89 @@
+"""ผลรวมช่วงวันที่จาก Fenwick tree ต้องเท่ากับ SUM บน daily_totals ทั้งก่อนและหลังแก้ไขข้อมูล"""
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import analytics
+import categories
+import reports
+import rollup
+from models import Entry
+
+FIRST_DAY = date(2024, 1, 1)
+DAYS = 120
+CATEGORIES = [('income', 'ขายสินค้า'), ('income', 'บริการ'), ('expense', 'ค่าเช่า'), ('expense', 'อื่นๆ')]
+
+
+def test_fenwick_prefix_and_range_match_cumulative_sums():
+    rng = np.random.default_rng(7)
+    daily = rng.integers(0, 1000, size=(2, 50), dtype=np.int64)
+    tree = analytics.FenwickTree(base=100, daily=daily)
+    for start, end in [(100, 149), (100, 100), (120, 130), (90, 110), (140, 200), (131, 130)]:
+        lo, hi = max(start - 100, 0), min(end - 100, 49)
+        expected = tuple(int(v) for v in daily[:, lo:hi + 1].sum(axis=1)) if lo <= hi else (0, 0)
+        assert tree.range(start, end) == expected
+
+
+def test_fenwick_add_updates_every_covering_range():
+    daily = np.zeros((2, 16), np.int64)
+    tree = analytics.FenwickTree(base=0, daily=daily)
+    tree.add(5, 1, 250)
+    tree.add(12, 2, -100)
+    assert tree.range(0, 15) == (3, 150)
+    assert tree.range(0, 4) == (0, 0)
+    assert tree.range(5, 11) == (1, 250)
+    assert tree.range(6, 12) == (2, -100)
+
+
+def add_entries(s, count, seed):
+    r = random.Random(seed)
+    ids = categories.resolve_many(s, CATEGORIES)  # ก่อนเขียน entries เหมือนฟอร์มและการนำเข้า
+    for _ in range(count):
+        entry_type, name = r.choice(CATEGORIES)
+        e = Entry(date=FIRST_DAY + timedelta(days=r.randrange(DAYS)), type=entry_type,
+                  category_id=ids[(entry_type, name)], description='')
+        e.amount_satang = r.randrange(1, 100000)
+        s.add(e)
+        s.flush()
+        rollup.record_insert(s, e)
+    s.commit()
+
+
+def sql_summary(s, start, end, category, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(analytics, 'ANALYTICS_STORE', False)
+        return reports.range_summary(s, start, end, category=category)
+
+
+def ranges():
+    r = random.Random(3)
+    yield FIRST_DAY, FIRST_DAY + timedelta(days=DAYS - 1)
+    yield FIRST_DAY - timedelta(days=30), FIRST_DAY
+    for _ in range(30):
+        start = FIRST_DAY + timedelta(days=r.randrange(-10, DAYS))
+        yield start, start + timedelta(days=r.randrange(0, 60))
+
+
+@pytest.mark.parametrize('category', [None, 'ขายสินค้า', 'ค่าเช่า', 'ไม่มีหมวดนี้'])
+def test_range_summary_matches_sql(session, monkeypatch, category):
+    add_entries(session, 300, seed=1)
+    for start, end in ranges():
+        assert reports.range_summary(session, start, end, category=category) == \
+            sql_summary(session, start, end, category, monkeypatch)
+    assert analytics.store.ranges is not None
+
+    # delta หลัง commit แก้ tree ที่สร้างไว้แล้ว (ไม่โหลดใหม่) ผลยังต้องตรงกับ SQL
+    loads, trees = analytics.store.loads, analytics.store.ranges
+    add_entries(session, 50, seed=2)
+    doomed = session.query(Entry).order_by(Entry.id).limit(20).all()
+    for e in doomed:
+        rollup.record_delete(session, e)
+        session.delete(e)
+    session.commit()
+    for start, end in ranges():
+        assert reports.range_summary(session, start, end, category=category) == \
+            sql_summary(session, start, end, category, monkeypatch)
+    assert analytics.store.loads == loads and analytics.store.ranges is trees
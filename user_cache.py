@@ -0,0 +1,103 @@
+"""
+cache ข้อมูลผู้ใช้สำหรับ Flask-Login
+
+load_user ถูกเรียกทุก request ที่ login อยู่ แทนที่จะ query ตาราง users ทุกครั้ง
+เก็บ snapshot ที่แก้ไขไม่ได้ (id, username, email, role, is_active) ไว้ใน LRU ที่มีอายุ (TTL)
+snapshot ไม่ผูกกับ session จึงไม่มี lazy load หลัง session ถูกปิด
+
+cache อยู่ภายใน process แต่ทุก snapshot ผูกกับรุ่นของตารางผู้ใช้ (data_version id=2 ใช้ร่วมกันทุก worker)
+load_user อ่านรุ่นนี้ (query ตาม primary key หนึ่งครั้ง) แล้วใช้ snapshot เฉพาะเมื่อรุ่นตรงกัน
+route ที่แก้ไขผู้ใช้ (เปิด/ปิดบัญชี, เปลี่ยนสิทธิ์, ลบ) ต้องเรียก bump(s) ก่อน commit ใน transaction เดียวกัน
+บัญชีที่ถูกปิดหรือลดสิทธิ์จึงมีผลใน request ถัดไปของทุก worker
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from models import DataVersion
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+USERS_VERSION_ID = 2
+
+
+class UserSnapshot:
+    """ข้อมูลผู้ใช้ที่จำเป็นต่อการตรวจสิทธิ์ แก้ไขไม่ได้หลังสร้าง"""
+
+    __slots__ = ('id', 'username', 'email', 'role', 'is_active')
+
+    def __init__(self, id, username, email, role, is_active):
+        for name, value in zip(self.__slots__, (id, username, email, role, is_active)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot แก้ไขไม่ได้')
+
+    @classmethod
+    def from_user(cls, user):
+        if isinstance(user, cls):
+            return user
+        return cls(user.id, user.username, user.email, user.role, bool(user.is_active))
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.id} {self.username} {self.role}>'
+
+
+_entries = OrderedDict()  # user_id -> (expires_at, generation, snapshot)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def current_generation(s):
+    """รุ่นของตารางผู้ใช้ในฐานข้อมูล"""
+    return s.query(DataVersion.generation).filter(DataVersion.id == USERS_VERSION_ID).scalar() or 0
+
+
+def bump(s):
+    """เพิ่มรุ่นของตารางผู้ใช้ใน transaction ของ s (snapshot เดิมของทุก worker จะไม่ถูกใช้อีก)"""
+    s.query(DataVersion).filter(DataVersion.id == USERS_VERSION_ID).update(
+        {DataVersion.generation: DataVersion.generation + 1}, synchronize_session=False
+    )
+
+
+def get(user_id, generation):
+    """snapshot ของผู้ใช้ หรือ None ถ้าไม่มีใน cache/หมดอายุ/เก็บไว้ก่อนรุ่น generation"""
+    now = time.monotonic()
+    with _lock:
+        item = _entries.get(user_id)
+        if item is None or item[0] < now or item[1] != generation:
+            if item is not None:
+                del _entries[user_id]
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(user_id)
+        _stats['hits'] += 1
+        return item[2]
+
+
+def remember(user, generation):
+    """เก็บ snapshot ของ user (ORM object) ที่อ่านได้ในรุ่น generation แล้วคืน snapshot นั้น"""
+    snapshot = UserSnapshot.from_user(user)
+    with _lock:
+        _entries[snapshot.id] = (time.monotonic() + USER_CACHE_TTL, generation, snapshot)
+        _entries.move_to_end(snapshot.id)
+        while len(_entries) > USER_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return snapshot
+
+
+def invalidate(user_id):
+    with _lock:
+        _entries.pop(int(user_id), None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        return dict(_stats, entries=len(_entries))